@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
+# Served through ASGI, catalog reads can run on the event loop.
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
 application = get_asgi_application()
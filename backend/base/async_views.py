@@ -0,0 +1,171 @@
+"""
+Native async read path for DRF viewsets.
+
+Under ASGI a synchronous view runs in Django's single thread-sensitive
+executor, so every catalog read queues behind the others for the whole
+request. Viewsets using ``AsyncReadMixin`` serve GET/HEAD for actions that
+have an ``a<action>`` coroutine (``alist`` and ``aretrieve`` here) on the
+event loop: authentication, permissions, caching, serialization and JSON
+rendering happen there, and only the queries go through Django's async
+ORM. Writes, other actions and non-JSON renderers keep the regular
+synchronous code path. The async path is only built with
+``ASYNC_READ_VIEWS`` on, which base.asgi does by default.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.http import Http404
+from django.utils.decorators import classonlymethod
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+async def apaginate_page_number(paginator, queryset, request, view=None):
+    """``PageNumberPagination.paginate_queryset`` reading the count and the page asynchronously."""
+    paginator.request = request
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    # Paginator.count is a cached_property: filling it in skips the sync COUNT.
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(paginator.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    paginator.page.object_list = [item async for item in paginator.page.object_list]
+
+    if django_paginator.num_pages > 1 and paginator.template is not None:
+        paginator.display_page_controls = True
+    return list(paginator.page)
+
+
+class AsyncReadMixin:
+    """
+    Put before the DRF base class; mixins that wrap ``list``/``retrieve``
+    provide ``alist``/``aretrieve`` counterparts calling ``super()`` the
+    same way. ``aprepare`` may load what serializers would otherwise
+    query lazily.
+    """
+
+    @classonlymethod
+    def as_view(cls, actions=None, **initkwargs):
+        sync_view = super().as_view(actions, **initkwargs)
+        read_action = (actions or {}).get('get')
+        # Under WSGI an async view costs an event loop thread per request:
+        # with the setting off when the URLconf loads, views stay synchronous.
+        if not settings.ASYNC_READ_VIEWS or read_action is None or not hasattr(cls, f'a{read_action}'):
+            return sync_view
+        run_sync = sync_to_async(sync_view)
+
+        async def view(request, *args, **kwargs):
+            if request.method not in READ_METHODS or not settings.ASYNC_READ_VIEWS:
+                return await run_sync(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = {**actions, 'head': actions.get('head', read_action)}
+            for method, action in self.action_map.items():
+                setattr(self, method, getattr(self, action))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        view.__name__ = sync_view.__name__
+        view.__qualname__ = sync_view.__qualname__
+        view.__doc__ = sync_view.__doc__
+        view.__module__ = sync_view.__module__
+        # What the router, schema generation and CSRF middleware read off a view.
+        for attr in ('cls', 'initkwargs', 'actions', 'csrf_exempt'):
+            setattr(view, attr, getattr(sync_view, attr))
+        return view
+
+    async def adispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            response = await getattr(self, f'a{self.action}')(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        if isinstance(self.response, Response) and getattr(request.accepted_renderer, 'format', None) == 'json':
+            # Rendering JSON needs no database, so it stays on the event loop;
+            # Django's own render step then has nothing left to do. The
+            # browsable API may query for its forms and is left to Django.
+            self.response.render()
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        if self.get_throttles():
+            # Throttles keep their history in the cache through the sync API.
+            await sync_to_async(self.check_throttles)(request)
+
+    async def aperform_authentication(self, request):
+        """``Request._authenticate``, awaiting ``aauthenticate`` where an authenticator has one."""
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, 'aauthenticate', None) or sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    async def apaginate_queryset(self, queryset):
+        paginator = self.paginator
+        if paginator is None:
+            return None
+        if hasattr(paginator, 'apaginate_queryset'):
+            return await paginator.apaginate_queryset(queryset, self.request, view=self)
+        if type(paginator).paginate_queryset is PageNumberPagination.paginate_queryset:
+            return await apaginate_page_number(paginator, queryset, self.request, view=self)
+        return await sync_to_async(paginator.paginate_queryset)(queryset, self.request, view=self)
+
+    async def aprepare(self, instances):
+        pass
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            await self.aprepare(page)
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        instances = [instance async for instance in queryset]
+        await self.aprepare(instances)
+        return Response(self.get_serializer(instances, many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        await self.aprepare([instance])
+        return Response(self.get_serializer(instance).data)
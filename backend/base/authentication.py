@@ -0,0 +1,120 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Written into tokens by users.serializers.TokenObtainPairSerializer; enough
+# for the permission classes to run without loading the user.
+TOKEN_CLAIMS = ('role', 'is_staff')
+
+
+def auth_state_key(user_id):
+    return f'auth-state:{user_id}'
+
+
+def auth_state_from_row(row):
+    """What the token checks need of a user: ``{}`` when it does not exist."""
+    if row is None:
+        return {}
+    is_active, password = row
+    return {'is_active': is_active, 'password': get_md5_hash_password(password)}
+
+
+def auth_state_queryset(user_model, user_id):
+    return user_model._default_manager.filter(
+        **{api_settings.USER_ID_FIELD: user_id}
+    ).values_list('is_active', 'password')
+
+
+def auth_state(user_model, user_id):
+    """
+    Whether the user exists and is active, and a digest of its password for
+    CHECK_REVOKE_TOKEN: cached for AUTH_STATE_CACHE_TIMEOUT seconds and
+    dropped whenever the user is saved or deleted.
+    """
+    key = auth_state_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        state = auth_state_from_row(auth_state_queryset(user_model, user_id).first())
+        cache.set(key, state, settings.AUTH_STATE_CACHE_TIMEOUT)
+    return state
+
+
+async def aauth_state(user_model, user_id):
+    key = auth_state_key(user_id)
+    state = await cache.aget(key)
+    if state is None:
+        state = auth_state_from_row(await auth_state_queryset(user_model, user_id).afirst())
+        await cache.aset(key, state, settings.AUTH_STATE_CACHE_TIMEOUT)
+    return state
+
+
+def forget_auth_state(sender, instance, **kwargs):
+    cache.delete(auth_state_key(getattr(instance, api_settings.USER_ID_FIELD)))
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """
+    simplejwt's header authentication without a query for the user row.
+    For tokens carrying ``TOKEN_CLAIMS`` the user is built from the claims
+    and the cached ``auth_state``; its other fields load together, in one
+    query, the first time something reads them. Tokens issued without the
+    claims load the user as before. ``aauthenticate`` is the same for the
+    async read views (base/async_views.py).
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return super().get_user(validated_token)
+        user_id = self.get_user_id(validated_token)
+        return self.claims_user(user_id, validated_token, auth_state(self.user_model, user_id))
+
+    async def aget_user(self, validated_token):
+        if not self.has_claims(validated_token):
+            return await sync_to_async(super().get_user)(validated_token)
+        user_id = self.get_user_id(validated_token)
+        return self.claims_user(user_id, validated_token, await aauth_state(self.user_model, user_id))
+
+    def has_claims(self, validated_token):
+        return all(claim in validated_token for claim in TOKEN_CLAIMS)
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_state(self, state, validated_token):
+        if not state:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['password']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+    def claims_user(self, user_id, validated_token, state):
+        self.check_state(state, validated_token)
+        values = {claim: validated_token[claim] for claim in TOKEN_CLAIMS}
+        values.update({api_settings.USER_ID_FIELD: user_id, 'is_active': state['is_active']})
+        # from_db wants the values in field order; every other field is deferred.
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in values]
+        user = self.user_model.from_db(
+            router.db_for_read(self.user_model), names, [values[name] for name in names]
+        )
+        user._from_token_claims = True
+        return user
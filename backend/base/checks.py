@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core import checks
+
+from .db import describe_database
+
+
+@checks.register('database_pool')
+def check_database_pool(app_configs, **kwargs):
+    messages = []
+    for alias, config in settings.DATABASES.items():
+        pool = config.get('OPTIONS', {}).get('pool')
+        if pool:
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                messages.append(checks.Error(
+                    f"DATABASES['{alias}'] enables pooling but psycopg_pool is not installed.",
+                    hint='Install psycopg-pool or unset DB_POOL.',
+                    id='base.E001',
+                ))
+            if isinstance(pool, dict) and pool.get('min_size', 0) > pool.get('max_size', 0):
+                messages.append(checks.Error(
+                    f"DATABASES['{alias}'] pool min_size is larger than max_size.",
+                    id='base.E002',
+                ))
+        messages.append(checks.Info(describe_database(alias, config), id='base.I001'))
+    return messages
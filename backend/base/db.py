@@ -0,0 +1,109 @@
+"""
+Environment-driven database settings.
+
+PostgreSQL connections are either persistent (``DB_CONN_MAX_AGE``) or
+drawn from a psycopg3 pool (``DB_POOL=true``); Django does not allow both.
+Without ``DB_ENGINE`` the project falls back to a local SQLite file, which
+is what the test suite runs against.
+
+Read replicas are listed in ``DB_REPLICAS`` (e.g. ``REPLICA1,REPLICA2``);
+each inherits the primary's settings and overrides them from its own
+``<NAME>_ENGINE``, ``<NAME>_NAME``, ``<NAME>_HOST`` ... variables.
+"""
+import os
+
+SQLITE_ENGINE = 'django.db.backends.sqlite3'
+POSTGRES_ENGINE = 'django.db.backends.postgresql'
+
+
+def env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('true', '1', 'yes')
+
+
+def env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def database_config(base_dir, prefix='DB'):
+    engine = os.getenv(f'{prefix}_ENGINE') or SQLITE_ENGINE
+    if engine == SQLITE_ENGINE:
+        return {
+            'ENGINE': engine,
+            'NAME': os.getenv(f'{prefix}_NAME') or os.path.join(base_dir, 'db.sqlite3'),
+        }
+
+    config = {
+        'ENGINE': engine,
+        'NAME': os.getenv(f'{prefix}_NAME'),
+        'USER': os.getenv(f'{prefix}_USER'),
+        'PASSWORD': os.getenv(f'{prefix}_PASSWORD'),
+        'HOST': os.getenv(f'{prefix}_HOST'),
+        'PORT': os.getenv(f'{prefix}_PORT'),
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {},
+    }
+    if engine != POSTGRES_ENGINE:
+        return config
+
+    options = config['OPTIONS']
+    options['connect_timeout'] = env_int('DB_CONNECT_TIMEOUT', 5)
+    statement_timeout = env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+    if statement_timeout:
+        options['options'] = f'-c statement_timeout={statement_timeout}'
+    if env_bool('DB_POOL'):
+        # Pooled connections are returned to the pool after each request,
+        # so persistent connections must be off.
+        config['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+            'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+            'timeout': env_int('DB_POOL_TIMEOUT', 10),
+            'max_idle': env_int('DB_POOL_MAX_IDLE', 600),
+        }
+        if config['CONN_HEALTH_CHECKS']:
+            options['pool']['check'] = check_pooled_connection
+    return config
+
+
+def replica_configs(primary):
+    replicas = {}
+    for prefix in filter(None, os.getenv('DB_REPLICAS', '').split(',')):
+        prefix = prefix.strip().upper()
+        config = {**primary, 'OPTIONS': dict(primary.get('OPTIONS', {}))}
+        for key in ('ENGINE', 'NAME', 'USER', 'PASSWORD', 'HOST', 'PORT'):
+            value = os.getenv(f'{prefix}_{key}')
+            if value:
+                config[key] = value
+        # Tests run against the primary only.
+        config['TEST'] = {'MIRROR': 'default'}
+        replicas[prefix.lower()] = config
+    return replicas
+
+
+def check_pooled_connection(connection):
+    from psycopg_pool import ConnectionPool
+    ConnectionPool.check_connection(connection)
+
+
+def describe_database(alias, config):
+    options = config.get('OPTIONS', {})
+    if config['ENGINE'] == SQLITE_ENGINE:
+        return f"{alias}: SQLite at {config['NAME']} (local fallback, no pooling)"
+    if 'pool' in options:
+        pool = options['pool']
+        connections = f"psycopg pool min={pool['min_size']} max={pool['max_size']} timeout={pool['timeout']}s"
+    elif config.get('CONN_MAX_AGE'):
+        connections = f"persistent connections, CONN_MAX_AGE={config['CONN_MAX_AGE']}s"
+    else:
+        connections = 'a new connection per request'
+    statement_timeout = options.get('options', '').rpartition('=')[2]
+    return (
+        f"{alias}: {config['ENGINE'].rsplit('.', 1)[-1]} {config.get('HOST') or 'localhost'}, "
+        f"{connections}, health checks {'on' if config.get('CONN_HEALTH_CHECKS') else 'off'}, "
+        f"statement_timeout={statement_timeout + 'ms' if statement_timeout else 'off'}"
+    )
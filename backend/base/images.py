@@ -0,0 +1,196 @@
+"""
+Resized derivatives of uploaded images.
+
+Every original gets one file per width in ``IMAGE_DERIVATIVE_WIDTHS`` and
+format in ``IMAGE_DERIVATIVE_FORMATS``, named after a hash of the original
+bytes so a derivative never changes once written and can be served with a
+far-future cache lifetime. Generation runs on a small thread pool after
+the upload's transaction commits; the model keeps a map of the generated
+names in a JSONField next to the image field.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+PIL_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+# Sent with the model as sender and ``pk`` once a derivative map is stored;
+# the update bypasses save(), so caches have to listen for this instead.
+derivatives_ready = Signal()
+
+# (model, derivatives field) pairs registered by track_derivatives(), so the
+# media sweep knows which files the derivative maps still point at.
+DERIVATIVE_FIELDS = []
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+            thread_name_prefix='image-derivatives',
+        )
+    return _executor
+
+
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    with field_file.open('rb') as file:
+        for chunk in file.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()[:24]
+
+
+def generate_derivatives(field_file):
+    """
+    Write the derivatives of ``field_file`` and return their map:
+    ``{'source': name, 'widths': {'160': {'webp': name, 'jpeg': name}, ...}}``.
+    Images are never upscaled; files that already exist are reused.
+    """
+    # Derivatives already have content-derived names; they go to the default
+    # storage whatever storage the original uses.
+    storage = default_storage
+    digest = content_hash(field_file)
+    with field_file.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    widths = [width for width in settings.IMAGE_DERIVATIVE_WIDTHS if width <= image.width]
+    widths = widths or [image.width]
+    derivatives = {}
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        names = {}
+        for fmt in settings.IMAGE_DERIVATIVE_FORMATS:
+            name = f'{DERIVATIVES_DIR}/{digest[:2]}/{digest}-{width}.{EXTENSIONS[fmt]}'
+            if not storage.exists(name):
+                output = resized.convert('RGB') if fmt == 'jpeg' else resized
+                buffer = io.BytesIO()
+                output.save(buffer, PIL_FORMATS[fmt], quality=settings.IMAGE_DERIVATIVE_QUALITY)
+                # Another worker may have written the same bytes meanwhile;
+                # storage then picks a new name, which is still valid.
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            names[fmt] = name
+        derivatives[str(width)] = names
+    return {'source': field_file.name, 'widths': derivatives}
+
+
+def build_derivatives(model, pk, field_name, derivatives_field):
+    instance = model._default_manager.filter(pk=pk).only(field_name).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    if field_file:
+        derivatives = generate_derivatives(field_file)
+        unchanged = Q(**{field_name: field_file.name})
+    else:
+        derivatives = {}
+        unchanged = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    # Only store the map if the image was not replaced in the meantime.
+    if model._default_manager.filter(unchanged, pk=pk).update(**{derivatives_field: derivatives}):
+        derivatives_ready.send(sender=model, pk=pk)
+
+
+def run_in_pool(model, pk, field_name, derivatives_field):
+    close_old_connections()
+    try:
+        build_derivatives(model, pk, field_name, derivatives_field)
+    except Exception:
+        logger.exception('Could not build %s derivatives for %s %s', field_name, model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(model, pk, field_name, derivatives_field):
+    if settings.IMAGE_DERIVATIVES_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_pool, model, pk, field_name, derivatives_field)
+        )
+    else:
+        build_derivatives(model, pk, field_name, derivatives_field)
+
+
+def track_derivatives(model, field_name, derivatives_field):
+    """Rebuild ``derivatives_field`` whenever ``field_name`` holds a new image."""
+
+    def image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+        if raw or (update_fields is not None and field_name not in update_fields):
+            return
+        current = getattr(instance, field_name).name or ''
+        derivatives = getattr(instance, derivatives_field) or {}
+        if current != derivatives.get('source', ''):
+            schedule_derivatives(sender, instance.pk, field_name, derivatives_field)
+
+    post_save.connect(
+        image_saved, sender=model, weak=False,
+        dispatch_uid=f'derivatives_{model._meta.label_lower}_{field_name}',
+    )
+    if (model, derivatives_field) not in DERIVATIVE_FIELDS:
+        DERIVATIVE_FIELDS.append((model, derivatives_field))
+
+
+def srcset(derivatives, request=None):
+    """
+    ``{'webp': 'url 160w, url 480w, ...', 'jpeg': ...}`` for an ``<img srcset>``
+    or ``<source>``; empty until the derivatives exist.
+    """
+    sets = {}
+    for width, names in sorted((derivatives or {}).get('widths', {}).items(), key=lambda item: int(item[0])):
+        for fmt, name in names.items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            sets.setdefault(fmt, []).append(f'{url} {width}w')
+    return {fmt: ', '.join(entries) for fmt, entries in sets.items()}
+
+
+def derivative_url(derivatives, width, fmt='jpeg'):
+    """URL of the smallest derivative at least ``width`` wide, else the largest one."""
+    widths = sorted((derivatives or {}).get('widths', {}).items(), key=lambda item: int(item[0]))
+    if not widths:
+        return None
+    for size, names in widths:
+        if int(size) >= width and fmt in names:
+            return default_storage.url(names[fmt])
+    return default_storage.url(widths[-1][1][fmt]) if fmt in widths[-1][1] else None
+
+
+def referenced_derivatives(names):
+    """The subset of derivative file ``names`` that a stored derivative map points at."""
+    names = set(names)
+    # Derivative names start with the digest of their original, which is
+    # enough to find the few maps that can mention them.
+    digests = {posixpath.basename(name).partition('-')[0] for name in names}
+    found = set()
+    if not digests:
+        return found
+    for model, derivatives_field in DERIVATIVE_FIELDS:
+        query = Q()
+        for digest in digests:
+            query |= Q(**{f'{derivatives_field}__icontains': digest})
+        maps = model._base_manager.filter(query).values_list(derivatives_field, flat=True)
+        for derivatives in maps.iterator():
+            for formats in (derivatives or {}).get('widths', {}).values():
+                found.update(formats.values())
+    return found & names
@@ -0,0 +1,58 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .routers import allow_replica_reads, reset_replica_reads
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from replicas. After a write the client gets a
+    short-lived cookie that pins its following reads to the primary, so it
+    always sees its own writes despite replication lag.
+
+    Works under ASGI without a thread handoff; the routing flag is a
+    context variable, which follows the ORM's calls into its worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = self.allow_replicas(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica_reads(token)
+        return self.pin_to_primary(request, response)
+
+    async def __acall__(self, request):
+        token = self.allow_replicas(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_replica_reads(token)
+        return self.pin_to_primary(request, response)
+
+    def allow_replicas(self, request):
+        pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+        return allow_replica_reads(request.method in SAFE_METHODS and not pinned)
+
+    def pin_to_primary(self, request, response):
+        if request.method not in SAFE_METHODS and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
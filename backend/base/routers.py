@@ -0,0 +1,46 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def allow_replica_reads(allowed=True):
+    """Set for the current request/task; returns a token for ``reset_replica_reads``."""
+    return _replica_reads.set(allowed)
+
+
+def reset_replica_reads(token):
+    _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to a random replica from ``DATABASE_REPLICAS`` when the
+    current request allows it (see ``ReplicaRoutingMiddleware``), and
+    everything else to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas or not _replica_reads.get():
+            return 'default'
+        # Keep related lookups and reads inside a transaction on the
+        # database the data came from.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,92 @@
+from rest_framework import serializers
+
+
+def parse_field_spec(value):
+    """
+    Turn "id,title,instructor.username" into a nested dict:
+    {'id': {}, 'title': {}, 'instructor': {'username': {}}}.
+    An empty dict means "the default fields of that serializer".
+    """
+    spec = {}
+    for path in (value or '').split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = spec
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return spec
+
+
+def sparse_fieldset_from_request(request):
+    """Return the (fields, expand) specs requested via query params."""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None, {}
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    fields = parse_field_spec(params.get('fields')) or None
+    return fields, parse_field_spec(params.get('expand'))
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets for ModelSerializers.
+
+    ``?fields=id,title,instructor.username`` keeps only the listed fields
+    (dotted names reach into nested serializers) and ``?expand=lessons``
+    adds fields named in ``Meta.expandable_fields``, which are left out by
+    default. The same can be passed in code with the ``fields`` and
+    ``expand`` keyword arguments.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        self._declared_sparse = (
+            {name: {} for name in fields} if fields is not None else None,
+            {name: {} for name in expand or ()},
+        )
+        self._requested_sparse = None
+
+    def set_sparse_fieldset(self, fields, expand):
+        self._requested_sparse = (fields or None, expand or {})
+
+    def get_sparse_fieldset(self):
+        declared_fields, declared_expand = self._declared_sparse
+        if self._requested_sparse is not None:
+            fields, expand = self._requested_sparse
+        elif self.parent is None or (
+            isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None
+        ):
+            fields, expand = sparse_fieldset_from_request(self.context.get('request'))
+        else:
+            fields, expand = None, {}
+        if declared_fields is not None:
+            fields = {
+                name: (fields or {}).get(name, {})
+                for name in declared_fields
+                if fields is None or name in fields
+            }
+        return fields, {**declared_expand, **expand}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested, expand = self.get_sparse_fieldset()
+        expandable = getattr(self.Meta, 'expandable_fields', ())
+
+        for name in list(fields):
+            if requested is not None:
+                keep = name in requested
+            else:
+                keep = name not in expandable or name in expand
+            if not keep:
+                fields.pop(name)
+                continue
+            field = fields[name]
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if isinstance(nested, DynamicFieldsMixin):
+                nested.set_sparse_fieldset(
+                    (requested or {}).get(name) or None,
+                    expand.get(name, {})
+                )
+        return fields
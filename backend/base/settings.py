@@ -2,6 +2,7 @@ from pathlib import Path
 import os 
 from dotenv import load_dotenv
 from datetime import timedelta
+from .db import database_config, env_bool, env_int, replica_configs
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -33,12 +34,14 @@ INSTALLED_APPS = [
     'djoser',
     'autoslug',
     'debug_toolbar',
+    'base',
     'users',
     'courses'
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'base.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,17 +74,56 @@ WSGI_APPLICATION = 'base.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse is env-driven, see base/db.py: DB_CONN_MAX_AGE,
+# DB_CONN_HEALTH_CHECKS, DB_STATEMENT_TIMEOUT_MS, DB_CONNECT_TIMEOUT and
+# DB_POOL with DB_POOL_MIN_SIZE/DB_POOL_MAX_SIZE/DB_POOL_TIMEOUT/DB_POOL_MAX_IDLE.
+
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+# Read replicas, see base/db.py. Safe requests read from them unless the
+# client wrote within the last REPLICA_PIN_SECONDS.
+DATABASES.update(replica_configs(DATABASES['default']))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['base.routers.PrimaryReplicaRouter']
+REPLICA_PIN_COOKIE = 'pin_primary'
+REPLICA_PIN_SECONDS = env_int('REPLICA_PIN_SECONDS', 5)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE'),
-        'NAME': os.getenv('DB_NAME'),
-        'USER': os.getenv('DB_USER'),
-        'PASSWORD': os.getenv('DB_PASSWORD'),
-        'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT'),
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Enrollments do not invalidate cached catalog bodies, so this also bounds
+# how long a course's enrollment_count can lag behind.
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+ENROLLMENT_CACHE_TIMEOUT = int(os.getenv('ENROLLMENT_CACHE_TIMEOUT', '900'))
+# How long base.authentication trusts a cached "active, same password" check
+# for a token's user; saving the user drops it at once.
+AUTH_STATE_CACHE_TIMEOUT = int(os.getenv('AUTH_STATE_CACHE_TIMEOUT', '60'))
+
+# Catalog reads (course list/detail, categories, public profiles) run as async
+# views (base/async_views.py). Off by default, as under WSGI they only add a
+# thread handoff; base.asgi turns it on unless ASYNC_READ_VIEWS is set.
+ASYNC_READ_VIEWS = env_bool('ASYNC_READ_VIEWS', False)
+LESSON_CONTENT_MAX_IDS = 200
+
+BULK_ENROLLMENT_MAX_ROWS = int(os.getenv('BULK_ENROLLMENT_MAX_ROWS', '10000'))
+
+# Watch time is persisted at most once per this many seconds of playback.
+PROGRESS_SAVE_INTERVAL = int(os.getenv('PROGRESS_SAVE_INTERVAL', '30'))
+PROGRESS_MAX_EVENTS = int(os.getenv('PROGRESS_MAX_EVENTS', '500'))
+
+# Rows younger than this are left for the next rollup run.
+ANALYTICS_ROLLUP_LAG = int(os.getenv('ANALYTICS_ROLLUP_LAG', '300'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,6 +169,35 @@ STATICFILES_DIRS = [
 MEDIA_URL = os.getenv('MEDIA_URL')
 MEDIA_ROOT = os.path.join(BASE_DIR, os.getenv('MEDIA_ROOT'))
 
+# How protected downloads are sent: 'django' streams them from a worker,
+# 'x-accel-redirect' (nginx, internal location PROTECTED_MEDIA_URL aliased
+# to MEDIA_ROOT) or 'x-sendfile' (Apache/lighttpd) hand off to the proxy.
+FILE_DELIVERY = os.getenv('FILE_DELIVERY', 'django')
+PROTECTED_MEDIA_URL = os.getenv('PROTECTED_MEDIA_URL', '/protected-media/')
+FILE_STREAM_CHUNK_SIZE = int(os.getenv('FILE_STREAM_CHUNK_SIZE', str(256 * 1024)))
+
+# Lesson resources can also be uploaded in chunks (courses/uploads.py).
+# Partial files live in UPLOAD_TEMP_DIR, which must be on the same
+# filesystem as MEDIA_ROOT so finishing an upload is a rename, not a copy.
+LESSON_RESOURCE_MAX_SIZE = env_int('LESSON_RESOURCE_MAX_SIZE', 2 * 1024 ** 3)
+UPLOAD_CHUNK_MAX_SIZE = env_int('UPLOAD_CHUNK_MAX_SIZE', 16 * 1024 ** 2)
+UPLOAD_TEMP_DIR = os.getenv('UPLOAD_TEMP_DIR') or os.path.join(MEDIA_ROOT, '.partial')
+UPLOAD_SESSION_TTL = env_int('UPLOAD_SESSION_TTL', 24 * 60 * 60)
+
+# Released files modified more recently than this are left for
+# `manage.py cleanup_media`, whose --min-age defaults to it: a transaction
+# that has not committed yet may be reusing the same content-addressed name.
+MEDIA_CLEANUP_MIN_AGE = env_int('MEDIA_CLEANUP_MIN_AGE', 60 * 60)
+
+# Resized copies of course thumbnails and profile pictures (base/images.py),
+# built on a thread pool once the upload commits unless IMAGE_DERIVATIVES_ASYNC
+# is off, in which case they are built inside the request.
+IMAGE_DERIVATIVE_WIDTHS = (160, 480, 960)
+IMAGE_DERIVATIVE_FORMATS = ('webp', 'jpeg')
+IMAGE_DERIVATIVE_QUALITY = env_int('IMAGE_DERIVATIVE_QUALITY', 82)
+IMAGE_DERIVATIVE_WORKERS = env_int('IMAGE_DERIVATIVE_WORKERS', 2)
+IMAGE_DERIVATIVES_ASYNC = env_bool('IMAGE_DERIVATIVES_ASYNC', True)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -141,7 +212,7 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',
                                  'rest_framework.renderers.BrowsableAPIRenderer'),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'base.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticatedOrReadOnly'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -199,8 +270,8 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.TokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.TokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -0,0 +1,191 @@
+"""
+Content-addressed media storage and reference-counted file deletion.
+
+Uploads to fields using ``content_addressed_storage`` are stored under the
+SHA-256 of their bytes, so the same file uploaded to many lessons exists
+once on disk. Since rows may share a file, nothing deletes it directly:
+``track_files()`` watches a model using ``TrackedFilesMixin`` and, once a row is deleted or its file
+replaced and the transaction commits, removes the old file only if no row
+of any model still refers to it. Reference counts are those queries, not a
+stored counter that could drift. They only see committed rows, so files
+modified within ``MEDIA_CLEANUP_MIN_AGE`` are kept, and ``manage.py
+cleanup_media`` sweeps whatever is left over.
+"""
+import functools
+import hashlib
+import logging
+import os
+import posixpath
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage naming files ``<upload_to>/<h[:2]>/<sha256><ext>``.
+    Saving bytes that are already stored returns the existing name.
+    """
+
+    def hashed_name(self, name, digest):
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), digest[:2], f'{digest}{extension}')
+
+    def reuse(self, name):
+        if not self.exists(name):
+            return False
+        # A fresh mtime keeps cleanup_media from sweeping a file that is
+        # being referenced again before the new row commits.
+        os.utime(self.path(name))
+        return True
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        name = self.hashed_name(name, digest.hexdigest())
+        if self.reuse(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def adopt(self, name, path):
+        """
+        Move the finished file at ``path`` into storage by renaming it, so
+        ``path`` must be on the same filesystem. Returns the stored name.
+        """
+        with open(path, 'rb') as file:
+            name = self.hashed_name(name, hashlib.file_digest(file, 'sha256').hexdigest())
+        if self.reuse(name):
+            os.remove(path)
+            return name
+        target = self.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(os.path.dirname(target), self.directory_permissions_mode)
+        os.replace(path, target)
+        if self.file_permissions_mode is not None:
+            os.chmod(target, self.file_permissions_mode)
+        return name
+
+
+def content_addressed_storage():
+    # A callable keeps MEDIA_ROOT and MEDIA_URL out of the migrations.
+    return ContentAddressedStorage()
+
+
+def file_fields():
+    """Every (model, FileField) pair of the installed apps."""
+    return [
+        (model, field)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def referenced_names(names):
+    """The subset of ``names`` that some row still points at."""
+    names = set(names)
+    found = set()
+    for model, field in file_fields():
+        if not names - found:
+            break
+        found.update(
+            model._base_manager.filter(**{f'{field.name}__in': names - found})
+            .order_by().values_list(field.name, flat=True).distinct()
+        )
+    return found
+
+
+def recently_modified(storage, name):
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_CLEANUP_MIN_AGE)
+    return storage.get_modified_time(name) > cutoff
+
+
+def delete_if_unreferenced(storage, name):
+    try:
+        if not storage.exists(name):
+            return
+        # Only committed rows are counted, and an uncommitted one may have
+        # just reused the name (see reuse()): leave that to cleanup_media.
+        if recently_modified(storage, name) or name in referenced_names([name]):
+            return
+        storage.delete(name)
+    except Exception:
+        logger.exception('Could not delete unreferenced file %s', name)
+
+
+def release_file(storage, name):
+    """Delete ``name`` after the current transaction commits, unless still referenced."""
+    if name:
+        transaction.on_commit(lambda: delete_if_unreferenced(storage, name))
+
+
+@functools.cache
+def file_attnames(model):
+    return {field.attname for field in model._meta.concrete_fields if isinstance(field, models.FileField)}
+
+
+class TrackedFilesMixin:
+    """
+    Model mixin remembering the file names a row was loaded with, so
+    ``track_files()`` can release the old file once one is replaced.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Snapshot the raw column values rather than go through the FieldFile
+        # descriptors on every instantiation. Deferred columns are not among
+        # field_names.
+        attnames = file_attnames(cls)
+        instance._loaded_files = {
+            name: value for name, value in zip(field_names, values) if name in attnames
+        }
+        return instance
+
+
+def track_files(model):
+    """Release files of ``model`` when rows are deleted or their files replaced."""
+    if not issubclass(model, TrackedFilesMixin):
+        raise TypeError(f'{model._meta.label} must inherit TrackedFilesMixin to track its files.')
+    fields = [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+    label = model._meta.label_lower
+
+    def remember(instance):
+        instance._loaded_files = {
+            field.attname: getattr(instance, field.attname).name
+            for field in fields
+            if field.attname in instance.__dict__
+        }
+
+    def file_saved(sender, instance, created=False, raw=False, **kwargs):
+        if raw:
+            return
+        # A new row has nothing to release.
+        loaded = {} if created else getattr(instance, '_loaded_files', {})
+        for field in fields:
+            old = loaded.get(field.attname)
+            if old and old != getattr(instance, field.attname).name:
+                release_file(field.storage, old)
+        remember(instance)
+
+    def file_deleted(sender, instance, **kwargs):
+        for field in fields:
+            if field.attname in instance.__dict__:
+                release_file(field.storage, getattr(instance, field.attname).name)
+
+    post_save.connect(file_saved, sender=model, weak=False, dispatch_uid=f'files_saved_{label}')
+    post_delete.connect(file_deleted, sender=model, weak=False, dispatch_uid=f'files_deleted_{label}')
@@ -0,0 +1,33 @@
+"""Helpers for the test suite and the benchmark commands."""
+import importlib
+import sys
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import clear_url_caches
+
+# URLconfs routing to AsyncReadMixin views; the root one last.
+URLCONFS = ('courses.urls', 'users.urls')
+
+
+def reload_urlconfs():
+    for name in (*URLCONFS, settings.ROOT_URLCONF):
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+    clear_url_caches()
+
+
+@contextmanager
+def async_read_views(enabled=True):
+    """
+    Serve the read views with ``ASYNC_READ_VIEWS`` set to ``enabled``, for
+    tests and benchmarks: views pick their path when the URLconf loads, so
+    the URLconfs are rebuilt on the way in and out.
+    """
+    try:
+        with override_settings(ASYNC_READ_VIEWS=enabled):
+            reload_urlconfs()
+            yield
+    finally:
+        reload_urlconfs()
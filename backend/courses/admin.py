@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from base.images import derivative_url
 from .models import *
 
 
@@ -16,6 +17,18 @@ class CourseCategoryAdmin(admin.ModelAdmin):
 admin.site.register(CourseCategory, CourseCategoryAdmin)
 
 
+class ChangelistDeferMixin:
+  """Leaves large columns the changelist never shows out of its query."""
+  changelist_defer = ()
+
+  def get_queryset(self, request):
+    queryset = super().get_queryset(request)
+    match = request.resolver_match
+    if match and match.url_name and match.url_name.endswith('_changelist'):
+      queryset = queryset.defer(*self.changelist_defer)
+    return queryset
+
+
 class LessonResourceInline(admin.TabularInline):
   model = LessonResource
   extra = 1
@@ -30,15 +43,18 @@ class LessonInline(admin.StackedInline):
   readonly_fields = ('created_at',)
   show_change_link = True
 
+  def get_queryset(self, request):
+    return super().get_queryset(request).defer('content')
+
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(ChangelistDeferMixin, admin.ModelAdmin):
   list_display = ('title', 'instructor', 'category', 'difficulty', 'price', 'is_published', 'thumbnail_preview')
   list_filter = ('category', 'difficulty', 'is_published', 'created_at')
   search_fields = ('title', 'short_description')
-  readonly_fields = ('slug', 'average_rating', 'created_at', 'updated_at', 'thumbnail_preview')
-  filter_horizontal = ('students',)
+  readonly_fields = ('slug', 'average_rating', 'enrollment_count', 'created_at', 'updated_at', 'thumbnail_preview')
   inlines = [LessonInline]
+  changelist_defer = ('full_description', 'search_vector')
 
   fieldsets = (
     (None, {
@@ -48,7 +64,7 @@ class CourseAdmin(admin.ModelAdmin):
       'fields': ('short_description', 'full_description', 'thumbnail', 'thumbnail_preview')
     }),
     ('Details', {
-      'fields': ('difficulty', 'price', 'duration_hours', 'students')
+      'fields': ('difficulty', 'price', 'duration_hours', 'enrollment_count')
     }),
     ('Status', {
       'fields': ('is_published', 'average_rating')
@@ -60,19 +76,22 @@ class CourseAdmin(admin.ModelAdmin):
 
   def thumbnail_preview(self, obj):
     if obj.thumbnail:
-      return format_html('<img src="{}" style="max-height: 100px;"/>', obj.thumbnail.url)
+      url = derivative_url(obj.thumbnail_derivatives, 160) or obj.thumbnail.url
+      return format_html('<img src="{}" style="max-height: 100px;"/>', url)
     return "-"
 
   thumbnail_preview.short_description = 'Preview'
 
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(ChangelistDeferMixin, admin.ModelAdmin):
   list_display = ('title', 'course', 'order', 'content_type', 'duration_minutes')
   list_filter = ('content_type', 'is_free')
   search_fields = ('title', 'content')
   inlines = [LessonResourceInline]
   autocomplete_fields = ['course']
+  list_select_related = ('course',)
+  changelist_defer = ('content', 'course__full_description', 'course__search_vector')
 
   fieldsets = (
     (None, {
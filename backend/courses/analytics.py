@@ -0,0 +1,193 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AggregationWatermark, CourseDailyStats, CourseReview, Enrollment
+
+RATINGS = range(1, 6)
+STAT_FIELDS = ['enrollments', 'completions', 'cohort_completions', 'revenue'] + [
+  f'rating_{rating}' for rating in RATINGS
+]
+
+
+def enrollment_rollup(rows):
+  return rows.annotate(enrollments=Count('id'), revenue=Sum('course__price'))
+
+
+def completion_rollup(rows):
+  return rows.annotate(completions=Count('id'))
+
+
+def cohort_completion_rollup(rows):
+  return rows.annotate(cohort_completions=Count('id'))
+
+
+def rating_counts():
+  return {f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS}
+
+
+def review_rollup(rows):
+  return rows.annotate(**rating_counts())
+
+
+# source name: (model, timestamp field, day field, aggregation). Each
+# source only ever sees rows whose timestamp is past its watermark, so the
+# timestamps must be set once and never move backwards; rows are counted
+# on the day of the day field. Review edits and deletes are folded into
+# rolled-up days by reaggregate_reviews().
+ROLLUP_SOURCES = {
+  'enrollments': (Enrollment, 'enrolled_at', 'enrolled_at', enrollment_rollup),
+  'completions': (Enrollment, 'completed_at', 'completed_at', completion_rollup),
+  'cohort_completions': (Enrollment, 'completed_at', 'enrolled_at', cohort_completion_rollup),
+  'reviews': (CourseReview, 'created_at', 'created_at', review_rollup),
+}
+
+
+def merge_into_rollups(totals):
+  """Add {(course_id, date): {field: value}} onto the stored daily rows."""
+  existing = {
+    (stats.course_id, stats.date): stats
+    for stats in CourseDailyStats.objects.filter(
+      course_id__in={course_id for course_id, _ in totals},
+      date__in={date for _, date in totals}
+    )
+  }
+  created, updated = [], []
+  for (course_id, date), values in totals.items():
+    stats = existing.get((course_id, date))
+    if stats is None:
+      stats = CourseDailyStats(course_id=course_id, date=date)
+      created.append(stats)
+    else:
+      updated.append(stats)
+    for field, value in values.items():
+      setattr(stats, field, getattr(stats, field) + value)
+  CourseDailyStats.objects.bulk_create(created)
+  CourseDailyStats.objects.bulk_update(updated, STAT_FIELDS)
+
+
+def aggregate_source(source, until, window=timedelta(days=7)):
+  """
+  Roll up one source from its watermark to ``until``, one window per
+  transaction, so an interrupted run resumes where it stopped.
+  Returns the number of rows aggregated.
+  """
+  model, field, day_field, rollup = ROLLUP_SOURCES[source]
+  watermark = AggregationWatermark.objects.filter(source=source).first()
+  if watermark is None:
+    first = model.objects.aggregate(first=Min(field))['first']
+    if first is None:
+      return 0
+    watermark = AggregationWatermark.objects.create(
+      source=source, processed_until=first - timedelta(microseconds=1)
+    )
+
+  processed = 0
+  start = watermark.processed_until
+  while start < until:
+    end = min(start + window, until)
+    with transaction.atomic():
+      # Locking the watermark keeps concurrent runs from counting a window twice.
+      watermark = AggregationWatermark.objects.select_for_update().get(source=source)
+      if watermark.processed_until != start:
+        start = watermark.processed_until
+        continue
+      rows = rollup(
+        model.objects.filter(**{f'{field}__gt': start, f'{field}__lte': end})
+        .order_by().values('course', day=TruncDate(day_field))
+      ).annotate(rows=Count('id'))
+      totals = {}
+      for row in rows:
+        processed += row.pop('rows')
+        key = (row.pop('course'), row.pop('day'))
+        totals[key] = {name: value or 0 for name, value in row.items()}
+      merge_into_rollups(totals)
+      watermark.processed_until = end
+      watermark.save(update_fields=['processed_until'])
+    start = end
+  return processed
+
+
+def reaggregate_reviews(course_ids, created_at):
+  """
+  Recount the ratings of the day a review was created on from the reviews
+  left, after that review was edited or deleted, for each course it was
+  or is on. Days past the reviews watermark are left to the next run.
+  """
+  watermark = (
+    AggregationWatermark.objects.filter(source='reviews')
+    .values_list('processed_until', flat=True).first()
+  )
+  if watermark is None or created_at > watermark:
+    return
+  day = timezone.localdate(created_at)
+  for course_id in course_ids:
+    counts = CourseReview.objects.filter(
+      course_id=course_id, created_at__date=day, created_at__lte=watermark
+    ).aggregate(**rating_counts())
+    CourseDailyStats.objects.filter(course_id=course_id, date=day).update(**counts)
+
+
+def aggregate_course_stats(rebuild=False):
+  """
+  Fold new enrollments, completions and reviews into CourseDailyStats.
+  Rows newer than ANALYTICS_ROLLUP_LAG seconds are left for the next run
+  so transactions still in flight are not skipped past.
+  """
+  if rebuild:
+    with transaction.atomic():
+      CourseDailyStats.objects.all().delete()
+      AggregationWatermark.objects.all().delete()
+  until = timezone.now() - timedelta(seconds=settings.ANALYTICS_ROLLUP_LAG)
+  return {source: aggregate_source(source, until) for source in ROLLUP_SOURCES}
+
+
+def instructor_analytics(instructor, start, end):
+  """Per-course and per-day figures for an instructor, read from the rollups only."""
+  stats = CourseDailyStats.objects.filter(course__instructor=instructor, date__range=(start, end))
+  sums = {field: Sum(field) for field in STAT_FIELDS}
+
+  courses = []
+  for row in stats.order_by().values('course', 'course__title').annotate(**sums).order_by('course__title'):
+    distribution = {str(rating): row[f'rating_{rating}'] for rating in RATINGS}
+    reviews = sum(distribution.values())
+    courses.append({
+      'id': row['course'],
+      'title': row['course__title'],
+      'enrollments': row['enrollments'],
+      'completions': row['completions'],
+      # Of the enrollments made in the range, the share completed so far.
+      'completion_rate': (
+        round(row['cohort_completions'] / row['enrollments'], 4) if row['enrollments'] else None
+      ),
+      'revenue': row['revenue'],
+      'reviews': reviews,
+      'average_rating': (
+        round(sum(rating * row[f'rating_{rating}'] for rating in RATINGS) / reviews, 2) if reviews else None
+      ),
+      'rating_distribution': distribution,
+    })
+
+  daily = list(
+    stats.order_by().values('date')
+    .annotate(enrollments=Sum('enrollments'), completions=Sum('completions'), revenue=Sum('revenue'))
+    .order_by('date')
+  )
+  as_of = AggregationWatermark.objects.aggregate(as_of=Min('processed_until'))['as_of']
+  return {
+    'start': start,
+    'end': end,
+    'as_of': as_of,
+    'totals': {
+      'enrollments': sum(course['enrollments'] for course in courses),
+      'completions': sum(course['completions'] for course in courses),
+      'revenue': sum((course['revenue'] for course in courses), Decimal('0')),
+    },
+    'courses': courses,
+    'daily': daily,
+  }
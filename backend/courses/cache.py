@@ -0,0 +1,235 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'catalog:version'
+# Bumped only by writes that change searchable text (see signals), so the
+# in-process search index is not rebuilt for reviews or resources.
+SEARCH_VERSION_KEY = 'search:version'
+
+
+def cached_version(key):
+  version = cache.get(key)
+  if version is None:
+    # Seed from the clock so an evicted counter never reuses an old version.
+    cache.add(key, time.time_ns(), None)
+    version = cache.get(key)
+  return version
+
+
+def bump_version(key):
+  try:
+    return cache.incr(key)
+  except ValueError:
+    cache.set(key, time.time_ns(), None)
+
+
+def catalog_version():
+  return cached_version(CATALOG_VERSION_KEY)
+
+
+async def acatalog_version():
+  version = await cache.aget(CATALOG_VERSION_KEY)
+  if version is None:
+    await cache.aadd(CATALOG_VERSION_KEY, time.time_ns(), None)
+    version = await cache.aget(CATALOG_VERSION_KEY)
+  return version
+
+
+def bump_catalog_version():
+  return bump_version(CATALOG_VERSION_KEY)
+
+
+def search_version():
+  return cached_version(SEARCH_VERSION_KEY)
+
+
+def bump_search_version():
+  return bump_version(SEARCH_VERSION_KEY)
+
+
+def enrolled_courses_key(user_id):
+  return f'enrolled-courses:{user_id}'
+
+
+def enrolled_course_ids(request):
+  """
+  Ids of the courses the requesting user is enrolled in: read once per
+  request and cached per user until one of their enrollments changes.
+  """
+  user = request.user
+  if not user.is_authenticated:
+    return frozenset()
+  ids = getattr(request, '_enrolled_course_ids', None)
+  if ids is None:
+    key = enrolled_courses_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+      from .models import Enrollment
+      ids = frozenset(Enrollment.objects.filter(student=user).values_list('course_id', flat=True))
+      cache.set(key, ids, settings.ENROLLMENT_CACHE_TIMEOUT)
+    request._enrolled_course_ids = ids
+  return ids
+
+
+async def aenrolled_course_ids(request):
+  user = request.user
+  if not user.is_authenticated:
+    return frozenset()
+  ids = getattr(request, '_enrolled_course_ids', None)
+  if ids is None:
+    key = enrolled_courses_key(user.pk)
+    ids = await cache.aget(key)
+    if ids is None:
+      from .models import Enrollment
+      ids = frozenset([
+        course_id async for course_id in
+        Enrollment.objects.filter(student=user).values_list('course_id', flat=True)
+      ])
+      await cache.aset(key, ids, settings.ENROLLMENT_CACHE_TIMEOUT)
+    request._enrolled_course_ids = ids
+  return ids
+
+
+def forget_enrolled_courses(user_ids):
+  cache.delete_many([enrolled_courses_key(user_id) for user_id in user_ids])
+
+
+def catalog_cache_key(request, per_user, version=None):
+  if not per_user:
+    segment = 'all'
+  elif request.user.is_authenticated:
+    segment = f'user:{request.user.pk}'
+  else:
+    segment = 'anon'
+  query = sorted(request.query_params.lists())
+  raw = f'{request.get_host()}|{request.path}|{query}'
+  digest = hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+  if version is None:
+    version = catalog_version()
+  return f'catalog:{version}:{segment}:{digest}'
+
+
+class CatalogCacheMixin:
+  """
+  Caches the serialized data of public read actions. Entries are keyed by
+  the catalog version, which signals bump on every catalog write, so stale
+  entries are never read and simply expire. ``personalize`` adjusts a
+  cached body for the requesting user before it is returned, and
+  ``response.cache_entry`` identifies the body it was built from.
+  """
+  cached_actions = ('list', 'retrieve')
+  cache_per_user = False
+
+  def list(self, request, *args, **kwargs):
+    return self.cached_response(super().list, request, *args, **kwargs)
+
+  def retrieve(self, request, *args, **kwargs):
+    return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+  def cached_response(self, handler, request, *args, **kwargs):
+    if self.action not in self.cached_actions:
+      return handler(request, *args, **kwargs)
+    key = catalog_cache_key(request, self.cache_per_user)
+    entry = cache.get(key)
+    if entry is not None:
+      data, filled = entry
+      response = Response(self.personalize(request, data), headers={'X-Cache': 'HIT'})
+    else:
+      response = handler(request, *args, **kwargs)
+      if response.status_code != 200:
+        return response
+      filled = time.time_ns()
+      cache.set(key, (response.data, filled), settings.CATALOG_CACHE_TIMEOUT)
+      response['X-Cache'] = 'MISS'
+    response.cache_entry = f'{key}|{filled}'
+    return response
+
+  async def alist(self, request, *args, **kwargs):
+    return await self.acached_response(super().alist, request, *args, **kwargs)
+
+  async def aretrieve(self, request, *args, **kwargs):
+    return await self.acached_response(super().aretrieve, request, *args, **kwargs)
+
+  async def acached_response(self, handler, request, *args, **kwargs):
+    if self.action not in self.cached_actions:
+      return await handler(request, *args, **kwargs)
+    key = catalog_cache_key(request, self.cache_per_user, await acatalog_version())
+    entry = await cache.aget(key)
+    if entry is not None:
+      data, filled = entry
+      response = Response(await self.apersonalize(request, data), headers={'X-Cache': 'HIT'})
+    else:
+      response = await handler(request, *args, **kwargs)
+      if response.status_code != 200:
+        return response
+      filled = time.time_ns()
+      await cache.aset(key, (response.data, filled), settings.CATALOG_CACHE_TIMEOUT)
+      response['X-Cache'] = 'MISS'
+    response.cache_entry = f'{key}|{filled}'
+    return response
+
+  def personalize(self, request, data):
+    return data
+
+  async def apersonalize(self, request, data):
+    return self.personalize(request, data)
+
+
+def course_payloads(data):
+  if isinstance(data, dict):
+    return data['results'] if isinstance(data.get('results'), list) else [data]
+  return data
+
+
+def overlay_enrollment_status(data, enrolled_ids):
+  """Set ``enrollment_status`` on the course payloads in ``data`` from the user's enrolled ids."""
+  for course in course_payloads(data):
+    if 'enrollment_status' in course:
+      course['enrollment_status'] = course['id'] in enrolled_ids
+  return data
+
+
+class ConditionalGetMixin:
+  """
+  ETag for cached list and retrieve responses, taken from the cache entry
+  the body came from (see ``CatalogCacheMixin``) rather than from live
+  rows, so the validator never runs ahead of a body that lags behind
+  them. A matching ``If-None-Match`` on a cache hit returns 304 without
+  touching the database.
+  """
+
+  def list(self, request, *args, **kwargs):
+    return self.conditional_response(request, super().list(request, *args, **kwargs))
+
+  def retrieve(self, request, *args, **kwargs):
+    return self.conditional_response(request, super().retrieve(request, *args, **kwargs))
+
+  async def alist(self, request, *args, **kwargs):
+    return self.conditional_response(request, await super().alist(request, *args, **kwargs))
+
+  async def aretrieve(self, request, *args, **kwargs):
+    return self.conditional_response(request, await super().aretrieve(request, *args, **kwargs))
+
+  def personal_validator(self, data):
+    """The parts of ``data`` personalized after it was read from the cache."""
+    return ''
+
+  def entity_tag(self, request, entry, data):
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    raw = f'{entry}|{user}|{self.personal_validator(data)}'
+    return 'W/"%s"' % hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+  def conditional_response(self, request, response):
+    entry = getattr(response, 'cache_entry', None)
+    if entry is None:
+      return response
+    etag = self.entity_tag(request, entry, response.data)
+    response = get_conditional_response(request, etag=etag) or response
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,138 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+  """
+  Return (start, end) for a single ``bytes=`` range, None when the header
+  should be ignored (absent, malformed or several ranges: the whole file is
+  sent instead) and False when the range cannot be satisfied.
+  """
+  match = RANGE_RE.match((header or '').strip())
+  if not match:
+    return None
+  first, last = match.groups()
+  if not first and not last:
+    return None
+  if not first:
+    length = int(last)
+    if not length:
+      return False
+    return max(size - length, 0), size - 1
+  start = int(first)
+  end = min(int(last), size - 1) if last else size - 1
+  if start >= size or start > end:
+    return False
+  return start, end
+
+
+class RangeFileWrapper:
+  """Iterates ``length`` bytes of ``file`` from ``start``; closed by the response."""
+
+  def __init__(self, file, start, length, chunk_size):
+    self.file = file
+    self.start = start
+    self.length = length
+    self.chunk_size = chunk_size
+
+  def __iter__(self):
+    self.file.seek(self.start)
+    remaining = self.length
+    while remaining > 0:
+      chunk = self.file.read(min(self.chunk_size, remaining))
+      if not chunk:
+        break
+      remaining -= len(chunk)
+      yield chunk
+
+  def close(self):
+    self.file.close()
+
+
+def file_validators(field_file, fallback_modified):
+  storage = field_file.storage
+  try:
+    modified = storage.get_modified_time(field_file.name).timestamp()
+  except (NotImplementedError, OSError):
+    modified = fallback_modified.timestamp()
+  size = field_file.size
+  digest = hashlib.md5(f'{field_file.name}:{size}:{modified}'.encode(), usedforsecurity=False).hexdigest()
+  return size, f'"{digest}"', int(modified)
+
+
+def content_disposition(filename):
+  return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+def accel_response(field_file, filename):
+  """Let the front proxy send the bytes (and handle ranges) itself."""
+  response = HttpResponse(content_type=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+  if settings.FILE_DELIVERY == 'x-accel-redirect':
+    response['X-Accel-Redirect'] = f"{settings.PROTECTED_MEDIA_URL.rstrip('/')}/{quote(field_file.name)}"
+  else:
+    response['X-Sendfile'] = field_file.path
+  response['Content-Disposition'] = content_disposition(filename)
+  return response
+
+
+def serve_file(request, field_file, fallback_modified, filename=None):
+  """
+  Download response for a FileField. With ``FILE_DELIVERY`` set to
+  ``x-accel-redirect`` (nginx) or ``x-sendfile`` (Apache, lighttpd) the
+  proxy streams the file; otherwise it is streamed from storage in
+  ``FILE_STREAM_CHUNK_SIZE`` chunks, honouring Range and If-Range. Only
+  single ranges are served; anything else gets the whole file.
+  """
+  filename = filename or os.path.basename(field_file.name)
+  if settings.FILE_DELIVERY in ('x-accel-redirect', 'x-sendfile'):
+    return accel_response(field_file, filename)
+
+  size, etag, last_modified = file_validators(field_file, fallback_modified)
+  response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+  if response is not None:
+    return response
+
+  byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+  if_range = request.META.get('HTTP_IF_RANGE')
+  if byte_range is not None and if_range:
+    # A stale If-Range means the client's partial copy is outdated: send it all.
+    if if_range.startswith(('"', 'W/')):
+      fresh = if_range == etag
+    else:
+      fresh = parse_http_date_safe(if_range) == last_modified
+    if not fresh:
+      byte_range = None
+
+  if byte_range is False:
+    response = HttpResponse(status=416)
+    response['Content-Range'] = f'bytes */{size}'
+    return response
+
+  content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  if byte_range:
+    start, end = byte_range
+    response = StreamingHttpResponse(
+      RangeFileWrapper(field_file.open('rb'), start, end - start + 1, settings.FILE_STREAM_CHUNK_SIZE),
+      status=206,
+      content_type=content_type
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Content-Disposition'] = content_disposition(filename)
+  else:
+    response = FileResponse(field_file.open('rb'), as_attachment=True, filename=filename, content_type=content_type)
+    response.block_size = settings.FILE_STREAM_CHUNK_SIZE
+  response['Accept-Ranges'] = 'bytes'
+  response['ETag'] = etag
+  response['Last-Modified'] = http_date(last_modified)
+  return response
@@ -0,0 +1,111 @@
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from users.models import User
+from .cache import bump_catalog_version, forget_enrolled_courses
+from .models import Course, Enrollment, popularity_weight
+
+ENROLLED = 'enrolled'
+ALREADY_ENROLLED = 'already_enrolled'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+def read_identifiers(csv_file):
+  """First column of every non-empty row; a header row is skipped."""
+  if isinstance(csv_file.read(0), bytes):
+    csv_file = io.TextIOWrapper(csv_file, encoding='utf-8-sig')
+  identifiers = []
+  for row in csv.reader(csv_file):
+    if row and row[0].strip():
+      identifiers.append(row[0].strip())
+  if identifiers and not identifiers[0].isdigit() and '@' not in identifiers[0]:
+    identifiers = identifiers[1:]
+  return identifiers
+
+
+def bulk_enroll(course, identifiers, batch_size=1000):
+  """
+  Enroll users given by id or email in one pass: one query resolves the
+  users, one finds existing enrollments, inserts go out in batches and
+  the course counters are updated once. Returns one result per input.
+  """
+  identifiers = [str(identifier).strip() for identifier in identifiers]
+  ids = {int(value) for value in identifiers if value.isdigit()}
+  emails = {value.lower() for value in identifiers if '@' in value}
+
+  users = (
+    User.objects.annotate(email_lower=Lower('email'))
+    .filter(Q(pk__in=ids) | Q(email_lower__in=emails)).only('id', 'email')
+  )
+  by_id = {}
+  by_email = {}
+  for user in users:
+    by_id[user.pk] = user
+    by_email[user.email.lower()] = user
+
+  already = set(
+    Enrollment.objects.filter(course=course, student_id__in=by_id)
+    .values_list('student_id', flat=True)
+  )
+
+  results = []
+  new_ids = []
+  for value in identifiers:
+    if value.isdigit():
+      user = by_id.get(int(value))
+    elif '@' in value:
+      user = by_email.get(value.lower())
+    else:
+      results.append({'input': value, 'status': INVALID, 'student': None})
+      continue
+    if user is None:
+      status = NOT_FOUND
+    elif user.pk in already:
+      status = ALREADY_ENROLLED
+    else:
+      status = ENROLLED
+      already.add(user.pk)
+      new_ids.append(user.pk)
+    results.append({'input': value, 'status': status, 'student': user.pk if user else None})
+
+  if new_ids:
+    with transaction.atomic():
+      # bulk_create skips Enrollment.save() and its signals, so the
+      # counters and cache version are updated here.
+      created = Enrollment.objects.bulk_create(
+        [Enrollment(course=course, student_id=pk) for pk in new_ids],
+        batch_size=batch_size,
+        ignore_conflicts=True
+      )
+      # ignore_conflicts skips rows enrolled since the check above without
+      # saying which: count only rows carrying the enrolled_at this insert
+      # stamped on them, not ones enrolled meanwhile by someone else.
+      stamped = {enrollment.student_id: enrollment.enrolled_at for enrollment in created}
+      inserted = {
+        student_id: enrolled_at
+        for student_id, enrolled_at in Enrollment.objects.filter(course=course, student_id__in=new_ids)
+        .values_list('student_id', 'enrolled_at')
+        if stamped[student_id] == enrolled_at
+      }
+      Course.adjust_enrollments(
+        course.pk, enrollments=len(inserted),
+        popularity=sum(popularity_weight(enrolled_at) for enrolled_at in inserted.values())
+      )
+    transaction.on_commit(bump_catalog_version)
+    forget_enrolled_courses(new_ids)
+    for result in results:
+      if result['status'] == ENROLLED and result['student'] not in inserted:
+        result['status'] = ALREADY_ENROLLED
+  return results
+
+
+def summarize(results):
+  summary = {ENROLLED: 0, ALREADY_ENROLLED: 0, NOT_FOUND: 0, INVALID: 0}
+  for result in results:
+    summary[result['status']] += 1
+  return summary
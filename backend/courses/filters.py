@@ -0,0 +1,175 @@
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+
+from django.db.models import Case, CharField, Count, Q, Value, When
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Course
+
+PRICE_BANDS = (
+  ('free', Q(price=0)),
+  ('under_50', Q(price__gt=0, price__lt=50)),
+  ('50_to_100', Q(price__gte=50, price__lt=100)),
+  ('100_plus', Q(price__gte=100)),
+)
+DURATION_BANDS = (
+  ('under_2', Q(duration_hours__lt=2)),
+  ('2_to_5', Q(duration_hours__gte=2, duration_hours__lt=5)),
+  ('5_to_10', Q(duration_hours__gte=5, duration_hours__lt=10)),
+  ('10_plus', Q(duration_hours__gte=10)),
+)
+RATING_THRESHOLDS = (4.5, 4.0, 3.5, 3.0)
+
+# Each ordering is backed by an index on Course.
+COURSE_ORDERINGS = {
+  'newest': ('-created_at', '-id'),
+  'popular': ('-popularity_score', '-id'),
+  'rating': ('-average_rating', '-id'),
+}
+
+# Query params owned by each facet; a facet is counted with every
+# filter applied except its own, so its other values stay selectable.
+FACET_PARAMS = {
+  'difficulty': ('difficulty',),
+  'category': ('category',),
+  'price_band': ('price_band', 'min_price', 'max_price'),
+  'duration': ('duration', 'min_duration', 'max_duration'),
+  'rating': ('min_rating',),
+}
+
+
+def split_param(params, name):
+  return [value for value in params.get(name, '').split(',') if value]
+
+
+def parse_number(params, name, cast):
+  value = params.get(name)
+  if value in (None, ''):
+    return None
+  try:
+    return cast(value)
+  except (ValueError, InvalidOperation):
+    raise ValidationError({name: 'A valid number is required.'})
+
+
+def band_filter(params, name, bands):
+  selected = split_param(params, name)
+  unknown = set(selected) - {band for band, _ in bands}
+  if unknown:
+    raise ValidationError({name: f"Unknown value(s): {', '.join(sorted(unknown))}."})
+  condition = Q()
+  for band, band_condition in bands:
+    if band in selected:
+      condition |= band_condition
+  return condition
+
+
+def filter_courses(queryset, params, exclude=()):
+  params = {key: value for key, value in params.items() if key not in exclude}
+  filters = Q()
+  difficulties = split_param(params, 'difficulty')
+  if difficulties:
+    filters &= Q(difficulty__in=difficulties)
+  categories = split_param(params, 'category')
+  if categories:
+    if not all(category.isdigit() for category in categories):
+      raise ValidationError({'category': 'Expected a comma-separated list of category ids.'})
+    filters &= Q(category_id__in=categories)
+  filters &= band_filter(params, 'price_band', PRICE_BANDS)
+  filters &= band_filter(params, 'duration', DURATION_BANDS)
+  for name, lookup, cast in (
+    ('min_price', 'price__gte', Decimal),
+    ('max_price', 'price__lte', Decimal),
+    ('min_duration', 'duration_hours__gte', int),
+    ('max_duration', 'duration_hours__lte', int),
+    ('min_rating', 'average_rating__gte', float),
+  ):
+    value = parse_number(params, name, cast)
+    if value is not None:
+      filters &= Q(**{lookup: value})
+  return queryset.filter(filters)
+
+
+def band_case(bands):
+  return Case(
+    *[When(condition, then=Value(band)) for band, condition in bands],
+    output_field=CharField()
+  )
+
+
+def grouped_counts(queryset, field):
+  rows = queryset.order_by().values(field).annotate(count=Count('pk'))
+  return {row[field]: row['count'] for row in rows}
+
+
+def course_facets(queryset, params):
+  """One grouped query per facet over the filtered catalog."""
+  def base(facet):
+    return filter_courses(queryset, params, exclude=FACET_PARAMS[facet])
+
+  difficulty = grouped_counts(base('difficulty'), 'difficulty')
+  categories = (
+    base('category').order_by().values('category', 'category__name')
+    .annotate(count=Count('pk')).order_by('category__name')
+  )
+  price = grouped_counts(base('price_band').annotate(band=band_case(PRICE_BANDS)), 'band')
+  duration = grouped_counts(base('duration').annotate(band=band_case(DURATION_BANDS)), 'band')
+  rating = base('rating').aggregate(**{
+    f'rating_{index}': Count('pk', filter=Q(average_rating__gte=threshold))
+    for index, threshold in enumerate(RATING_THRESHOLDS)
+  })
+  return {
+    'difficulty': [
+      {'value': value, 'label': label, 'count': difficulty.get(value, 0)}
+      for value, label in Course.DIFFICULTY_LEVELS
+    ],
+    'category': [
+      {'value': row['category'], 'label': row['category__name'], 'count': row['count']}
+      for row in categories
+    ],
+    'price_band': [
+      {'value': band, 'count': price.get(band, 0)} for band, _ in PRICE_BANDS
+    ],
+    'duration': [
+      {'value': band, 'count': duration.get(band, 0)} for band, _ in DURATION_BANDS
+    ],
+    'rating': [
+      {'value': threshold, 'count': rating[f'rating_{index}']}
+      for index, threshold in enumerate(RATING_THRESHOLDS)
+    ],
+  }
+
+
+class CourseFilterBackend(BaseFilterBackend):
+  def filter_queryset(self, request, queryset, view):
+    return filter_courses(queryset, request.query_params)
+
+
+def course_ordering(params):
+  ordering = params.get('ordering') or 'newest'
+  if ordering not in COURSE_ORDERINGS:
+    raise ValidationError({'ordering': f"Expected one of: {', '.join(COURSE_ORDERINGS)}."})
+  return COURSE_ORDERINGS[ordering]
+
+
+class CourseOrderingBackend(BaseFilterBackend):
+  def filter_queryset(self, request, queryset, view):
+    return queryset.order_by(*course_ordering(request.query_params))
+
+
+class FacetedListMixin:
+  """Adds a ``facets`` block to list responses when ``?facets=true``."""
+
+  def list(self, request, *args, **kwargs):
+    response = super().list(request, *args, **kwargs)
+    if request.query_params.get('facets') in ('1', 'true') and response.status_code == 200:
+      response.data['facets'] = course_facets(self.queryset, request.query_params)
+    return response
+
+  async def alist(self, request, *args, **kwargs):
+    response = await super().alist(request, *args, **kwargs)
+    if request.query_params.get('facets') in ('1', 'true') and response.status_code == 200:
+      response.data['facets'] = await sync_to_async(course_facets)(self.queryset, request.query_params)
+    return response
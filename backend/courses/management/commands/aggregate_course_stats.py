@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.analytics import aggregate_course_stats
+
+
+class Command(BaseCommand):
+  help = 'Fold enrollments, completions and reviews since the last run into the daily course rollups.'
+
+  def add_arguments(self, parser):
+    parser.add_argument(
+      '--rebuild', action='store_true',
+      help='Drop the rollups and watermarks and aggregate everything again.'
+    )
+
+  def handle(self, *args, **options):
+    processed = aggregate_course_stats(rebuild=options['rebuild'])
+    summary = ', '.join(f'{count} {source}' for source, count in processed.items())
+    self.stdout.write(self.style.SUCCESS(f'Aggregated {summary}.'))
@@ -0,0 +1,146 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+
+from base.testing import async_read_views
+from courses.models import Course, CourseCategory, Lesson
+from users.models import User
+
+MODES = (
+  ('wsgi', 'threads through the WSGI handler, sync views'),
+  ('asgi-sync', 'ASGI, catalog views on the sync path'),
+  ('asgi-async', 'ASGI, async catalog views'),
+)
+
+
+class Command(BaseCommand):
+  help = (
+    'Load the catalog read endpoints (course list and detail, categories, public '
+    'profiles) concurrently through the WSGI handler and through the ASGI handler '
+    'with and without the async read views, and compare throughput and latency. '
+    'Requests run in process against the configured database and cache.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode.')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--uncached', action='store_true', help='Bypass the catalog response cache.')
+    parser.add_argument(
+      '--seed', type=int, default=0,
+      help='Create this many courses for the run and delete them afterwards.'
+    )
+
+  def seed(self, count):
+    instructor = User.objects.create_user(username='benchmark-async-instructor', role=User.Role.INSTRUCTOR)
+    category = CourseCategory.objects.create(name='Async benchmark catalog')
+    for number in range(count):
+      course = Course.objects.create(
+        title=f'Async benchmark course {number}', instructor=instructor, category=category,
+        short_description='Short', full_description='Full description', difficulty='beginner',
+        is_published=True
+      )
+      Lesson.objects.bulk_create([
+        Lesson(course=course, title=f'Lesson {order}', order=order, content_type='article',
+               content='Lesson body', duration_minutes=10)
+        for order in range(1, 6)
+      ])
+    return instructor, category
+
+  def endpoints(self):
+    course = Course.objects.filter(is_published=True).order_by('pk').values_list('pk', flat=True).first()
+    username = User.objects.order_by('pk').values_list('username', flat=True).first()
+    if course is None or username is None:
+      raise CommandError('The catalog is empty; pass --seed to generate one.')
+    return (
+      ('course list', '/api/v1/courses/'),
+      ('course detail', f'/api/v1/courses/{course}/'),
+      ('categories', '/api/v1/course-categories/'),
+      ('profile', f'/api/v1/profiles/{username}/'),
+    )
+
+  def run_threads(self, url, total, concurrency):
+    local = threading.local()
+    lock = threading.Lock()
+    latencies = []
+
+    def request(_):
+      if not hasattr(local, 'client'):
+        local.client = Client()
+      start = time.perf_counter()
+      status = local.client.get(url).status_code
+      elapsed = time.perf_counter() - start
+      with lock:
+        latencies.append(elapsed)
+      return status
+
+    def close_connections(_):
+      connections.close_all()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+      statuses = list(executor.map(request, range(total)))
+      list(executor.map(close_connections, range(concurrency)))
+    return statuses, latencies
+
+  async def run_tasks(self, url, total, concurrency):
+    client = AsyncClient()
+    jobs = iter(range(total))
+    statuses, latencies = [], []
+
+    async def worker():
+      for _ in jobs:
+        start = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start)
+        statuses.append(response.status_code)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses, latencies
+
+  def measure(self, mode, url, options):
+    total, concurrency = options['requests'], options['concurrency']
+    start = time.perf_counter()
+    # Views pick their path when the URLconf loads, as each deployment would.
+    with async_read_views(mode == 'asgi-async'):
+      if mode == 'wsgi':
+        statuses, latencies = self.run_threads(url, total, concurrency)
+      else:
+        statuses, latencies = asyncio.run(self.run_tasks(url, total, concurrency))
+    elapsed = time.perf_counter() - start
+    failed = sum(status != 200 for status in statuses)
+    if failed:
+      raise CommandError(f'{failed} of {total} requests to {url} failed ({mode}).')
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return total / elapsed, statistics.median(latencies), statistics.quantiles(latencies, n=20)[-1]
+
+  def handle(self, *args, **options):
+    seeded = self.seed(options['seed']) if options['seed'] else None
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+    if options['uncached']:
+      overrides['CATALOG_CACHE_TIMEOUT'] = 0
+    try:
+      with override_settings(**overrides):
+        endpoints = self.endpoints()
+        self.stdout.write(
+          f"{options['requests']} requests per endpoint, {options['concurrency']} concurrent, "
+          f"catalog cache {'off' if options['uncached'] else 'on'}"
+        )
+        for mode, description in MODES:
+          self.stdout.write(f'  {mode}: {description}')
+        self.stdout.write(f"{'endpoint':<15} {'mode':<11} {'req/s':>9} {'p50':>9} {'p95':>9}")
+        for label, url in endpoints:
+          for mode, _ in MODES:
+            rate, p50, p95 = self.measure(mode, url, options)
+            self.stdout.write(f'{label:<15} {mode:<11} {rate:>9.1f} {p50:>7.2f}ms {p95:>7.2f}ms')
+    finally:
+      if seeded:
+        instructor, category = seeded
+        Course.objects.filter(category=category).delete()
+        category.delete()
+        instructor.delete()
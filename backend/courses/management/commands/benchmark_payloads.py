@@ -0,0 +1,92 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from courses.models import Course, CourseCategory, Lesson
+from courses.serializers import CourseListSerializer, LessonOutlineSerializer, LessonSerializer
+from users.models import User
+from users.serializers import UserSummarySerializer
+
+
+class FullCourseSerializer(CourseListSerializer):
+  lessons = LessonSerializer(many=True, read_only=True)
+
+
+class Rollback(Exception):
+  pass
+
+
+class Command(BaseCommand):
+  help = (
+    'Compare memory and response size of the course list with full lessons and '
+    'descriptions against lesson outlines with the heavy columns deferred.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--courses', type=int, default=50)
+    parser.add_argument('--lessons', type=int, default=20, help='Lessons per course.')
+    parser.add_argument('--content-kb', type=int, default=20, help='Size of each lesson body.')
+    parser.add_argument(
+      '--existing', action='store_true',
+      help='Measure the current catalog instead of a generated one (rolled back afterwards).'
+    )
+
+  def seed(self, options):
+    instructor = User.objects.create_user(username='benchmark-instructor', role=User.Role.INSTRUCTOR)
+    category = CourseCategory.objects.create(name='Benchmark catalog')
+    body = ('lorem ipsum dolor sit amet ' * 40 * options['content_kb'])[:options['content_kb'] * 1024]
+    for number in range(options['courses']):
+      course = Course.objects.create(
+        title=f'Benchmark course {number}', instructor=instructor, category=category,
+        short_description='Short', full_description=body, difficulty='beginner', is_published=True
+      )
+      Lesson.objects.bulk_create([
+        Lesson(course=course, title=f'Lesson {order}', order=order, content_type='article',
+               content=body, duration_minutes=10)
+        for order in range(1, options['lessons'] + 1)
+      ])
+    return Course.objects.filter(category=category)
+
+  def full(self, courses):
+    queryset = courses.select_related('instructor', 'category').prefetch_related(
+      Prefetch('lessons', queryset=Lesson.objects.prefetch_related('resources'))
+    )
+    return FullCourseSerializer(queryset, many=True, expand=['full_description', 'lessons']).data
+
+  def outline(self, courses):
+    queryset = (
+      courses.select_related('instructor', 'category')
+      .defer('full_description', 'search_vector', *UserSummarySerializer.deferred_fields('instructor'))
+      .prefetch_related(Prefetch('lessons', queryset=Lesson.objects.only(*LessonOutlineSerializer.COLUMNS)))
+    )
+    return CourseListSerializer(queryset, many=True, expand=['lessons']).data
+
+  def measure(self, label, build, courses):
+    tracemalloc.start()
+    start = time.perf_counter()
+    data = build(courses)
+    payload = JSONRenderer().render(data)
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    self.stdout.write(
+      f'{label:<10} {elapsed:>9.1f}ms {peak / 2 ** 20:>10.2f}MiB {len(payload) / 2 ** 10:>12.1f}KiB'
+    )
+
+  def handle(self, *args, **options):
+    try:
+      with transaction.atomic():
+        courses = Course.objects.all() if options['existing'] else self.seed(options)
+        self.stdout.write(
+          f'{courses.count()} courses, {Lesson.objects.filter(course__in=courses).count()} lessons'
+        )
+        self.stdout.write(f"{'payload':<10} {'time':>11} {'peak memory':>13} {'JSON size':>15}")
+        self.measure('full', self.full, courses)
+        self.measure('outline', self.outline, courses)
+        raise Rollback
+    except Rollback:
+      pass
@@ -0,0 +1,47 @@
+import statistics
+import time
+
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.search import search_courses, uses_postgres
+
+DEFAULT_QUERIES = ['python', 'web development', 'data science', 'beginner guide', 'react hooks']
+
+
+class Command(BaseCommand):
+  help = 'Time ranked course search against the icontains scan the admin uses.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('queries', nargs='*', default=DEFAULT_QUERIES)
+    parser.add_argument('--repeat', type=int, default=20)
+
+  def time_calls(self, func, repeat):
+    timings = []
+    for _ in range(repeat):
+      start = time.perf_counter()
+      result = func()
+      timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+  def icontains(self, query):
+    condition = Q()
+    for term in query.split():
+      condition &= Q(title__icontains=term) | Q(short_description__icontains=term)
+    return list(Course.objects.filter(condition).values_list('pk', flat=True)[:50])
+
+  def handle(self, *args, **options):
+    repeat = options['repeat']
+    engine = 'postgres tsvector' if uses_postgres() else 'in-process inverted index'
+    self.stdout.write(f'{Course.objects.count()} courses, engine: {engine}, {repeat} runs per query')
+    search_courses('warm up')
+    self.stdout.write(f"{'query':<20} {'search p50':>11} {'p95':>8} {'hits':>5} {'icontains p50':>14} {'hits':>5}")
+    for query in options['queries']:
+      search_timings, ranked = self.time_calls(lambda: search_courses(query, limit=50), repeat)
+      scan_timings, scanned = self.time_calls(lambda: self.icontains(query), repeat)
+      self.stdout.write(
+        f'{query[:20]:<20} {statistics.median(search_timings):>9.2f}ms '
+        f'{statistics.quantiles(search_timings, n=20)[-1]:>6.2f}ms {len(ranked):>5} '
+        f'{statistics.median(scan_timings):>12.2f}ms {len(scanned):>5}'
+      )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollments import bulk_enroll, read_identifiers, summarize
+from courses.models import Course
+
+
+class Command(BaseCommand):
+  help = 'Enroll many users, given by id or email, into one course.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('course', help='Course id or slug.')
+    parser.add_argument('students', nargs='*', help='User ids or emails.')
+    parser.add_argument('--csv', help='CSV file with a user id or email in the first column.')
+
+  def handle(self, *args, **options):
+    lookup = {'pk': options['course']} if options['course'].isdigit() else {'slug': options['course']}
+    try:
+      course = Course.objects.get(**lookup)
+    except Course.DoesNotExist:
+      raise CommandError(f"Course {options['course']} does not exist.")
+
+    identifiers = list(options['students'])
+    if options['csv']:
+      with open(options['csv'], newline='', encoding='utf-8-sig') as csv_file:
+        identifiers += read_identifiers(csv_file)
+    if not identifiers:
+      raise CommandError('Give student ids/emails or --csv.')
+
+    results = bulk_enroll(course, identifiers)
+    for result in results:
+      if result['status'] != 'enrolled':
+        self.stdout.write(f"{result['input']}: {result['status']}")
+    summary = ', '.join(f'{count} {status}' for status, count in summarize(results).items())
+    self.stdout.write(self.style.SUCCESS(f'{course}: {summary}'))
@@ -0,0 +1,123 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from base.images import DERIVATIVES_DIR, referenced_derivatives
+from base.storage import referenced_names
+from courses.uploads import expire_sessions
+
+
+def walk_media(root, after=(), skip=(), prefix=()):
+  """
+  Yield ``(parts, entry)`` for files under ``root`` in sorted order,
+  ``parts`` being the relative path split on '/'. Only files sorting after
+  ``after`` are yielded and directories entirely before it, or listed in
+  ``skip``, are not read.
+  """
+  try:
+    entries = sorted(os.scandir(os.path.join(root, *prefix)), key=lambda entry: entry.name)
+  except FileNotFoundError:
+    return
+  for entry in entries:
+    parts = prefix + (entry.name,)
+    if entry.is_dir(follow_symlinks=False):
+      if parts >= after[:len(parts)] and parts not in skip:
+        yield from walk_media(root, after, skip, parts)
+    elif entry.is_file(follow_symlinks=False) and parts > after:
+      yield parts, entry
+
+
+class Command(BaseCommand):
+  help = (
+    'Delete files under MEDIA_ROOT that no row refers to. Files are checked in '
+    'batches and the last checked path is saved, so an interrupted run resumes.'
+  )
+
+  def add_arguments(self, parser):
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument(
+      '--min-age', type=int, default=settings.MEDIA_CLEANUP_MIN_AGE,
+      help='Leave files modified in the last N seconds alone (uploads not committed yet).'
+    )
+    parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted.')
+    parser.add_argument('--restart', action='store_true', help='Ignore the saved position.')
+    parser.add_argument(
+      '--state', default=os.path.normpath(settings.MEDIA_ROOT) + '.cleanup',
+      help='File holding the last checked path.'
+    )
+
+  def read_state(self, options):
+    if options['restart'] or not os.path.exists(options['state']):
+      return ()
+    with open(options['state']) as file:
+      position = file.read().strip()
+    if position:
+      self.stdout.write(f'Resuming after {position}')
+    return tuple(position.split('/')) if position else ()
+
+  def write_state(self, options, parts):
+    if options['dry_run']:
+      return
+    with open(options['state'], 'w') as file:
+      file.write('/'.join(parts))
+
+  def sweep(self, batch, options):
+    names = {'/'.join(parts): entry for parts, entry in batch}
+    derivatives = [name for name in names if name.startswith(f'{DERIVATIVES_DIR}/')]
+    referenced = referenced_names(names) | referenced_derivatives(derivatives)
+    deleted = freed = 0
+    for name in sorted(set(names) - referenced):
+      entry = names[name]
+      size = entry.stat(follow_symlinks=False).st_size
+      if options['dry_run']:
+        self.stdout.write(f'Would delete {name}')
+      else:
+        try:
+          os.remove(entry.path)
+        except FileNotFoundError:
+          continue
+      deleted += 1
+      freed += size
+    return deleted, freed
+
+  def handle(self, *args, **options):
+    root = settings.MEDIA_ROOT
+    # Partial chunked uploads have no row pointing at them until finalized.
+    partial = os.path.relpath(settings.UPLOAD_TEMP_DIR, root)
+    skip = set() if partial.startswith('..') else {tuple(partial.split(os.sep))}
+    if not options['dry_run']:
+      expired = expire_sessions()
+      if expired:
+        self.stdout.write(f'Dropped {expired} expired upload sessions.')
+
+    cutoff = time.time() - options['min_age']
+    after = self.read_state(options)
+    scanned = deleted = freed = 0
+    batch = []
+
+    def flush():
+      nonlocal deleted, freed
+      removed, size = self.sweep(batch, options)
+      deleted += removed
+      freed += size
+      self.write_state(options, batch[-1][0])
+      batch.clear()
+
+    for parts, entry in walk_media(root, after, skip):
+      scanned += 1
+      if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+        continue
+      batch.append((parts, entry))
+      if len(batch) >= options['batch_size']:
+        flush()
+    if batch:
+      flush()
+    if not options['dry_run'] and os.path.exists(options['state']):
+      os.remove(options['state'])
+
+    verb = 'Would delete' if options['dry_run'] else 'Deleted'
+    self.stdout.write(self.style.SUCCESS(
+      f'Checked {scanned} files. {verb} {deleted} unreferenced files ({freed / 2 ** 20:.1f} MiB).'
+    ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from base.images import build_derivatives
+from courses.models import Course
+from users.models import User
+
+IMAGE_FIELDS = (
+  (Course, 'thumbnail', 'thumbnail_derivatives'),
+  (User, 'profile_picture', 'profile_picture_derivatives'),
+)
+
+
+class Command(BaseCommand):
+  help = 'Build missing resized copies of course thumbnails and profile pictures.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('--force', action='store_true', help='Rebuild derivatives that already exist.')
+
+  def handle(self, *args, **options):
+    for model, field_name, derivatives_field in IMAGE_FIELDS:
+      rows = (
+        model.objects.exclude(Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True}))
+        .order_by('pk').values_list('pk', field_name, derivatives_field)
+      )
+      built = 0
+      for pk, name, derivatives in rows.iterator():
+        if options['force'] or (derivatives or {}).get('source') != name:
+          build_derivatives(model, pk, field_name, derivatives_field)
+          built += 1
+      self.stdout.write(self.style.SUCCESS(f'Built derivatives for {built} {model._meta.verbose_name_plural}.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import Course, CourseReviewSummary
+
+
+class Command(BaseCommand):
+  help = 'Recompute denormalized course counters from their source tables to repair drift.'
+
+  def handle(self, *args, **options):
+    updated = Course.recompute_rating_counters()
+    self.stdout.write(self.style.SUCCESS(f'Recomputed rating counters for {updated} courses.'))
+    updated = Course.recompute_enrollment_counters()
+    self.stdout.write(self.style.SUCCESS(f'Recomputed enrollment counters for {updated} courses.'))
+    updated = CourseReviewSummary.rebuild()
+    self.stdout.write(self.style.SUCCESS(f'Rebuilt review summaries for {updated} courses.'))
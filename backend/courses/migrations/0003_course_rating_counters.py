@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:03
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseReview = apps.get_model('courses', 'CourseReview')
+    reviews = CourseReview.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    Course.objects.update(
+        rating_sum=Coalesce(
+            Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+            0, output_field=IntegerField()
+        ),
+        rating_count=Coalesce(
+            Subquery(reviews.annotate(total=Count('id')).values('total')),
+            0, output_field=IntegerField()
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_alter_course_options_alter_lesson_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:08
+
+import django.contrib.postgres.search
+from django.db import migrations
+from django.db.models import CharField, OuterRef, Subquery
+
+INDEX_NAME = 'course_search_vector_gin'
+SEARCH_CONFIG = 'english'
+
+
+def fill_search_vectors(apps):
+    # A frozen copy of courses.search.refresh_search_vectors at this point.
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchVector
+
+    Course = apps.get_model('courses', 'Course')
+    CourseCategory = apps.get_model('courses', 'CourseCategory')
+    Lesson = apps.get_model('courses', 'Lesson')
+    category_name = Subquery(
+        CourseCategory.objects.filter(pk=OuterRef('category_id')).values('name')[:1],
+        output_field=CharField()
+    )
+    lesson_titles = Subquery(
+        Lesson.objects.filter(course=OuterRef('pk')).order_by().values('course')
+        .annotate(titles=StringAgg('title', ' ')).values('titles'),
+        output_field=CharField()
+    )
+    Course.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('short_description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('full_description', weight='C', config=SEARCH_CONFIG)
+        + SearchVector(lesson_titles, weight='D', config=SEARCH_CONFIG)
+    ))
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON courses_course USING gin (search_vector)'
+    )
+    fill_search_vectors(apps)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # GIN indexes only exist on PostgreSQL; other backends use the
+        # in-process index in courses.search.
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:16
+
+from django.conf import settings
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+POPULARITY_HALF_LIFE_SECONDS = 14 * 86400
+
+
+def fill_enrollment_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    counts = (
+        Enrollment.objects.order_by().values('course')
+        .annotate(total=Count('id'), completed=Count('id', filter=Q(completed_at__isnull=False)))
+    )
+    scores = defaultdict(float)
+    for course_id, enrolled_at in Enrollment.objects.values_list('course_id', 'enrolled_at').iterator():
+        elapsed = (enrolled_at - POPULARITY_EPOCH).total_seconds()
+        scores[course_id] += 2.0 ** (elapsed / POPULARITY_HALF_LIFE_SECONDS)
+    Course.objects.bulk_update(
+        [
+            Course(
+                pk=row['course'],
+                enrollment_count=row['total'],
+                completion_count=row['completed'],
+                popularity_score=scores[row['course']],
+            )
+            for row in counts
+        ],
+        ['enrollment_count', 'completion_count', 'popularity_score'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_course_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='completion_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='popularity_score',
+            field=models.FloatField(default=0.0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-popularity_score', '-id'], name='course_popularity_idx'),
+        ),
+        migrations.RunPython(fill_enrollment_counters, migrations.RunPython.noop),
+    ]
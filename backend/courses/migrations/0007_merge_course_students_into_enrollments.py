@@ -0,0 +1,103 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+BATCH_SIZE = 1000
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+POPULARITY_HALF_LIFE_SECONDS = 14 * 86400
+
+
+def copy_students_to_enrollments(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    CourseStudent = Course.students.through
+
+    # Walk the M2M table by primary key so memory stays flat; pairs that
+    # already have an Enrollment are skipped by the unique constraint.
+    last_pk = 0
+    while True:
+        batch = list(
+            CourseStudent.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'course_id', 'user_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        Enrollment.objects.bulk_create(
+            [Enrollment(course_id=course_id, student_id=user_id) for _, course_id, user_id in batch],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1][0]
+
+    counts = (
+        Enrollment.objects.order_by().values('course')
+        .annotate(total=Count('id'), completed=Count('id', filter=Q(completed_at__isnull=False)))
+    )
+    scores = defaultdict(float)
+    for course_id, enrolled_at in Enrollment.objects.values_list('course_id', 'enrolled_at').iterator():
+        elapsed = (enrolled_at - POPULARITY_EPOCH).total_seconds()
+        scores[course_id] += 2.0 ** (elapsed / POPULARITY_HALF_LIFE_SECONDS)
+    Course.objects.bulk_update(
+        [
+            Course(
+                pk=row['course'],
+                enrollment_count=row['total'],
+                completion_count=row['completed'],
+                popularity_score=scores[row['course']],
+            )
+            for row in counts
+        ],
+        ['enrollment_count', 'completion_count', 'popularity_score'],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def copy_enrollments_to_students(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    CourseStudent = Course.students.through
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Enrollment.objects.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'course_id', 'student_id')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        CourseStudent.objects.bulk_create(
+            [CourseStudent(course_id=course_id, user_id=student_id) for _, course_id, student_id in batch],
+            ignore_conflicts=True,
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_enrollment_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_students_to_enrollments, copy_enrollments_to_students),
+        # Enrollment becomes the only table: drop the auto-created M2M table
+        # and point the field at Enrollment as its through model.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RemoveField(
+                    model_name='course',
+                    name='students',
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='course',
+                    name='students',
+                    field=models.ManyToManyField(blank=True, related_name='courses_enrolled', through='courses.Enrollment', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+LATEST_REVIEWS = 10
+
+
+def fill_review_summaries(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    CourseReview = apps.get_model('courses', 'CourseReview')
+    CourseReviewSummary = apps.get_model('courses', 'CourseReviewSummary')
+
+    summaries = {
+        pk: CourseReviewSummary(course_id=pk, latest_review_ids=[])
+        for pk in Course.objects.values_list('pk', flat=True)
+    }
+    for row in CourseReview.objects.order_by().values('course_id', 'rating').annotate(total=Count('id')):
+        setattr(summaries[row['course_id']], f"rating_{row['rating']}", row['total'])
+    latest = CourseReview.objects.order_by('course_id', '-created_at', '-id').values_list('course_id', 'id')
+    for course_id, review_id in latest.iterator():
+        ids = summaries[course_id].latest_review_ids
+        if len(ids) < LATEST_REVIEWS:
+            ids.append(review_id)
+    CourseReviewSummary.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_course_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseReviewSummary',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_summary', serialize=False, to='courses.course')),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('latest_review_ids', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='coursereview',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='review_course_cursor_idx'),
+        ),
+        migrations.RunPython(fill_review_summaries, migrations.RunPython.noop),
+    ]
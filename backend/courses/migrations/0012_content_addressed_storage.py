@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:58
+
+import base.storage
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=base.storage.content_addressed_storage, upload_to='course_thumbnails/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])]),
+        ),
+        migrations.AlterField(
+            model_name='lessonresource',
+            name='file',
+            field=models.FileField(help_text='Allowed formats: PDF, ZIP, DOCX, PPTX, TXT', storage=base.storage.content_addressed_storage, upload_to='lesson_resources/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'zip', 'docx', 'pptx', 'txt'])]),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursedailystats',
+            name='cohort_completions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
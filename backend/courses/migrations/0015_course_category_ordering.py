@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 13:15
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_course_daily_stats_cohort_completions'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='coursecategory',
+            options={'ordering': ['name']},
+        ),
+    ]
@@ -1,20 +1,56 @@
-from django.db import models
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, FloatField, DecimalField, IntegerField, OuterRef, Subquery, Sum, Count, Value
+from django.db.models.functions import Cast, Coalesce, NullIf, Round
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
+from django.contrib.postgres.search import SearchVectorField
 from autoslug import AutoSlugField
+from base.storage import TrackedFilesMixin, content_addressed_storage
 from users.models import User
 
 
+def average_rating_expression(rating_sum, rating_count):
+  average = Cast(rating_sum, FloatField()) / NullIf(rating_count, 0)
+  rounded = Round(Cast(average, DecimalField(max_digits=4, decimal_places=1)), 1)
+  return Coalesce(rounded, Value(0.0), output_field=FloatField())
+
+
+# Popularity is a sum of per-enrollment weights that double every half-life.
+# Scaling every course by the same decay factor never changes their order,
+# so the stored score can be indexed and sorted without periodic rewrites.
+# A double overflows past 2 ** 1024, so one weight overflows 1024 half-lives
+# (about 39 years) after the epoch, in April 2064; a course's summed score
+# reaches that log2(enrollments) half-lives sooner, e.g. mid-2063 for a
+# million enrollments. Before then, move the epoch forward and run
+# recompute_course_stats, which rebuilds every score from enrolled_at.
+POPULARITY_EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+POPULARITY_HALF_LIFE_DAYS = 14
+
+
+def popularity_weight(moment):
+  elapsed = (moment - POPULARITY_EPOCH).total_seconds()
+  return 2.0 ** (elapsed / (POPULARITY_HALF_LIFE_DAYS * 86400))
+
+
 class CourseCategory(models.Model):
   name = models.CharField(max_length=100, unique=True)
   description = models.TextField(blank=True)
 
+  class Meta:
+    ordering = ['name']
+
   def __str__(self):
     return self.name
 
 
-class Course(models.Model):
+class Course(TrackedFilesMixin, models.Model):
   DIFFICULTY_LEVELS = (
     ('beginner', 'Beginner'),
     ('intermediate', 'Intermediate'),
@@ -37,9 +73,9 @@ class Course(models.Model):
   )
   students = models.ManyToManyField(
     User,
+    through='Enrollment',
     related_name='courses_enrolled',
-    blank=True,
-    limit_choices_to={'role': User.Role.STUDENT}
+    blank=True
   )
   category = models.ForeignKey(
     CourseCategory,
@@ -68,16 +104,25 @@ class Course(models.Model):
   )
   thumbnail = models.ImageField(
     upload_to='course_thumbnails/',
+    storage=content_addressed_storage,
     validators=[
       FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png']),
     ],
     blank=True,
     null=True
   )
+  # {'source': thumbnail name, 'widths': {'160': {'webp': name, 'jpeg': name}, ...}}
+  thumbnail_derivatives = models.JSONField(default=dict, blank=True, editable=False)
   average_rating = models.FloatField(
     default=0.0,
     validators=[MinValueValidator(0.0), MaxValueValidator(5.0)]
   )
+  rating_sum = models.PositiveIntegerField(default=0, editable=False)
+  rating_count = models.PositiveIntegerField(default=0, editable=False)
+  search_vector = SearchVectorField(null=True, editable=False)
+  enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+  completion_count = models.PositiveIntegerField(default=0, editable=False)
+  popularity_score = models.FloatField(default=0.0, editable=False)
 
   class Meta:
     ordering = ['-created_at']
@@ -86,23 +131,102 @@ class Course(models.Model):
       models.Index(fields=['difficulty']),
       models.Index(fields=['average_rating']),
       models.Index(fields=['category']),
+      models.Index(fields=['-created_at', '-id'], name='course_created_cursor_idx'),
+      models.Index(fields=['-popularity_score', '-id'], name='course_popularity_idx'),
     ]
     verbose_name = 'Course'
     verbose_name_plural = 'Courses'
 
+  # Maintained by UPDATE statements; never written back from a possibly stale instance.
+  DERIVED_FIELDS = (
+    'rating_sum', 'rating_count', 'average_rating', 'search_vector',
+    'enrollment_count', 'completion_count', 'popularity_score', 'thumbnail_derivatives',
+  )
+
   def __str__(self):
     return self.title
 
+  def save(self, *args, **kwargs):
+    if not self._state.adding and kwargs.get('update_fields') is None:
+      deferred = self.get_deferred_fields()
+      kwargs['update_fields'] = [
+        field.attname for field in self._meta.concrete_fields
+        if not field.primary_key
+        and field.attname not in deferred
+        and field.name not in self.DERIVED_FIELDS
+      ]
+    super().save(*args, **kwargs)
+
+  @classmethod
+  def adjust_rating(cls, course_id, sum_delta, count_delta):
+    rating_sum = F('rating_sum') + sum_delta
+    rating_count = F('rating_count') + count_delta
+    cls.objects.filter(pk=course_id).update(
+      rating_sum=rating_sum,
+      rating_count=rating_count,
+      average_rating=average_rating_expression(rating_sum, rating_count)
+    )
+
+  @classmethod
+  def recompute_rating_counters(cls, queryset=None):
+    reviews = CourseReview.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    rating_sum = Coalesce(
+      Subquery(reviews.annotate(total=Sum('rating')).values('total')),
+      0, output_field=IntegerField()
+    )
+    rating_count = Coalesce(
+      Subquery(reviews.annotate(total=Count('id')).values('total')),
+      0, output_field=IntegerField()
+    )
+    queryset = cls.objects.all() if queryset is None else queryset
+    return queryset.update(
+      rating_sum=rating_sum,
+      rating_count=rating_count,
+      average_rating=average_rating_expression(rating_sum, rating_count)
+    )
+
+  @classmethod
+  def adjust_enrollments(cls, course_id, enrollments=0, completions=0, popularity=0.0):
+    cls.objects.filter(pk=course_id).update(
+      enrollment_count=F('enrollment_count') + enrollments,
+      completion_count=F('completion_count') + completions,
+      popularity_score=F('popularity_score') + popularity
+    )
+
+  @classmethod
+  def recompute_enrollment_counters(cls, queryset=None, batch_size=1000):
+    queryset = cls.objects.all() if queryset is None else queryset
+    enrollments = Enrollment.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    updated = queryset.update(
+      enrollment_count=Coalesce(
+        Subquery(enrollments.annotate(total=Count('id')).values('total')),
+        0, output_field=IntegerField()
+      ),
+      completion_count=Coalesce(
+        Subquery(
+          enrollments.filter(completed_at__isnull=False)
+          .annotate(total=Count('id')).values('total')
+        ),
+        0, output_field=IntegerField()
+      ),
+      popularity_score=0.0
+    )
+    # Weights are exponentials, which not every backend can compute in
+    # SQL, so stream the enrollment dates and write the sums in batches.
+    scores = defaultdict(float)
+    rows = Enrollment.objects.filter(course__in=queryset).order_by().values_list('course_id', 'enrolled_at')
+    for course_id, enrolled_at in rows.iterator(chunk_size=batch_size):
+      scores[course_id] += popularity_weight(enrolled_at)
+    cls.objects.bulk_update(
+      [cls(pk=pk, popularity_score=score) for pk, score in scores.items()],
+      ['popularity_score'],
+      batch_size=batch_size
+    )
+    return updated
+
   def update_average_rating(self):
-    reviews = self.reviews.all()
-    if reviews.exists():
-      self.average_rating = round(
-        sum([r.rating for r in reviews]) / reviews.count(),
-        1
-      )
-    else:
-      self.average_rating = 0.0
-    self.save()
+    Course.recompute_rating_counters(Course.objects.filter(pk=self.pk))
+    self.refresh_from_db(fields=['rating_sum', 'rating_count', 'average_rating'])
 
 
 class Lesson(models.Model):
@@ -137,7 +261,7 @@ class Lesson(models.Model):
   def __str__(self):
     return f"{self.course.title} - {self.order}. {self.title}"
 
-class LessonResource(models.Model):
+class LessonResource(TrackedFilesMixin, models.Model):
   lesson = models.ForeignKey(
     'Lesson',
     on_delete=models.CASCADE,
@@ -145,6 +269,7 @@ class LessonResource(models.Model):
   )
   file = models.FileField(
     upload_to='lesson_resources/',
+    storage=content_addressed_storage,
     validators=[
       FileExtensionValidator(
         allowed_extensions=['pdf', 'zip', 'docx', 'pptx', 'txt']
@@ -165,6 +290,37 @@ class LessonResource(models.Model):
     return self.name or self.file.name
 
 
+class UploadSession(models.Model):
+  """
+  A lesson resource being uploaded in chunks (see courses/uploads.py).
+  ``received`` bytes have been written to ``part_path``; finalizing moves
+  the file into storage and links the created ``resource``.
+  """
+  id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+  owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+  lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='upload_sessions')
+  name = models.CharField(max_length=255)
+  filename = models.CharField(max_length=255)
+  size = models.PositiveBigIntegerField()
+  received = models.PositiveBigIntegerField(default=0)
+  resource = models.OneToOneField(
+    LessonResource,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='upload_session'
+  )
+  created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+  def __str__(self):
+    return f"{self.filename} ({self.received}/{self.size})"
+
+  @property
+  def part_path(self):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f'{self.pk}.part')
+
+
 class Enrollment(models.Model):
   student = models.ForeignKey(
     User,
@@ -190,11 +346,56 @@ class Enrollment(models.Model):
     indexes = [
       models.Index(fields=['enrolled_at']),
       models.Index(fields=['progress']),
+      models.Index(fields=['completed_at']),
+      models.Index(fields=['student', '-enrolled_at', '-id'], name='enrollment_student_cursor_idx'),
     ]
 
   def __str__(self):
     return f"{self.student.username} enrolled in {self.course.title}"
 
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    instance._loaded_completed = instance.__dict__.get('completed_at') is not None
+    return instance
+
+  def save(self, *args, **kwargs):
+    adding = self._state.adding
+    was_completed = getattr(self, '_loaded_completed', False)
+    completed = self.completed_at is not None
+    with transaction.atomic():
+      super().save(*args, **kwargs)
+      if adding:
+        Course.adjust_enrollments(
+          self.course_id, enrollments=1, completions=int(completed),
+          popularity=popularity_weight(self.enrolled_at)
+        )
+      elif completed != was_completed:
+        Course.adjust_enrollments(self.course_id, completions=1 if completed else -1)
+    self._loaded_completed = completed
+
+
+class LessonCompletion(models.Model):
+  enrollment = models.ForeignKey(
+    Enrollment,
+    on_delete=models.CASCADE,
+    related_name='lesson_completions'
+  )
+  lesson = models.ForeignKey(
+    Lesson,
+    on_delete=models.CASCADE,
+    related_name='completions'
+  )
+  seconds_watched = models.PositiveIntegerField(default=0)
+  completed_at = models.DateTimeField(null=True, blank=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    unique_together = ('enrollment', 'lesson')
+
+  def __str__(self):
+    return f"{self.enrollment} - {self.lesson.title}"
+
 
 class CourseReview(models.Model):
   student = models.ForeignKey(
@@ -217,16 +418,209 @@ class CourseReview(models.Model):
   class Meta:
     unique_together = ('student', 'course')
     ordering = ['-created_at']
+    indexes = [
+      models.Index(fields=['created_at']),
+      models.Index(fields=['student', '-created_at', '-id'], name='review_student_cursor_idx'),
+      models.Index(fields=['course', '-created_at', '-id'], name='review_course_cursor_idx'),
+    ]
 
   def __str__(self):
     return f"Review by {self.student} for {self.course}"
 
+  @classmethod
+  def from_db(cls, db, field_names, values):
+    instance = super().from_db(db, field_names, values)
+    instance._loaded_rating = (instance.__dict__.get('course_id'), instance.__dict__.get('rating'))
+    return instance
+
   def save(self, *args, **kwargs):
-    super().save(*args, **kwargs)
-    self.course.update_average_rating()
+    adding = self._state.adding
+    old_course_id, old_rating = getattr(self, '_loaded_rating', (None, None))
+    with transaction.atomic():
+      super().save(*args, **kwargs)
+      if adding:
+        Course.adjust_rating(self.course_id, self.rating, 1)
+        CourseReviewSummary.review_added(self)
+      elif old_course_id is None or old_rating is None:
+        Course.recompute_rating_counters(Course.objects.filter(pk=self.course_id))
+        CourseReviewSummary.rebuild([self.course_id])
+      elif old_course_id != self.course_id:
+        Course.adjust_rating(old_course_id, -old_rating, -1)
+        Course.adjust_rating(self.course_id, self.rating, 1)
+        CourseReviewSummary.review_removed(old_course_id, self.pk, old_rating)
+        CourseReviewSummary.rebuild([self.course_id])
+      elif old_rating != self.rating:
+        Course.adjust_rating(self.course_id, self.rating - old_rating, 0)
+        CourseReviewSummary.rating_changed(self.course_id, old_rating, self.rating)
+    self._loaded_rating = (self.course_id, self.rating)
+
+
+class CourseReviewSummary(models.Model):
+  """
+  Star histogram and newest review ids of a course, updated with every
+  review write so course pages never aggregate the reviews table.
+  """
+  LATEST_REVIEWS = 10
+
+  course = models.OneToOneField(
+    Course,
+    on_delete=models.CASCADE,
+    primary_key=True,
+    related_name='review_summary'
+  )
+  rating_1 = models.PositiveIntegerField(default=0)
+  rating_2 = models.PositiveIntegerField(default=0)
+  rating_3 = models.PositiveIntegerField(default=0)
+  rating_4 = models.PositiveIntegerField(default=0)
+  rating_5 = models.PositiveIntegerField(default=0)
+  latest_review_ids = models.JSONField(default=list)
+
+  def __str__(self):
+    return f"Review summary for {self.course_id}"
+
+  @property
+  def histogram(self):
+    return {str(rating): getattr(self, f'rating_{rating}') for rating in range(1, 6)}
+
+  @property
+  def review_count(self):
+    return sum(self.histogram.values())
+
+  @classmethod
+  def latest_ids(cls, course_id):
+    return list(
+      CourseReview.objects.filter(course_id=course_id).order_by('-created_at', '-id')
+      .values_list('id', flat=True)[:cls.LATEST_REVIEWS]
+    )
+
+  @classmethod
+  def review_added(cls, review):
+    with transaction.atomic():
+      summary, created = cls.objects.select_for_update().get_or_create(course_id=review.course_id)
+      if created:
+        # First summary for this course: build it from the table, which
+        # already holds this review.
+        cls.rebuild([review.course_id])
+        return
+      field = f'rating_{review.rating}'
+      setattr(summary, field, getattr(summary, field) + 1)
+      summary.latest_review_ids = [review.pk] + [
+        pk for pk in summary.latest_review_ids if pk != review.pk
+      ][:cls.LATEST_REVIEWS - 1]
+      summary.save()
+
+  @classmethod
+  def review_removed(cls, course_id, review_id, rating):
+    with transaction.atomic():
+      # Never create a summary here: the course itself may be mid-delete.
+      summary = cls.objects.select_for_update().filter(course_id=course_id).first()
+      if summary is None:
+        return
+      field = f'rating_{rating}'
+      setattr(summary, field, max(getattr(summary, field) - 1, 0))
+      if review_id in summary.latest_review_ids:
+        summary.latest_review_ids = cls.latest_ids(course_id)
+      summary.save()
+
+  @classmethod
+  def rating_changed(cls, course_id, old_rating, new_rating):
+    cls.objects.filter(course_id=course_id).update(**{
+      f'rating_{old_rating}': F(f'rating_{old_rating}') - 1,
+      f'rating_{new_rating}': F(f'rating_{new_rating}') + 1,
+    })
+
+  @classmethod
+  def rebuild(cls, course_ids=None):
+    """Recompute summaries from the reviews table; all courses by default."""
+    reviews = CourseReview.objects.order_by()
+    courses = Course.objects.all()
+    if course_ids is not None:
+      reviews = reviews.filter(course_id__in=course_ids)
+      courses = courses.filter(pk__in=course_ids)
+    summaries = {pk: cls(course_id=pk) for pk in courses.values_list('pk', flat=True)}
+    for row in reviews.values('course_id', 'rating').annotate(total=Count('id')):
+      setattr(summaries[row['course_id']], f"rating_{row['rating']}", row['total'])
+    latest = reviews.order_by('course_id', '-created_at', '-id').values_list('course_id', 'id')
+    for course_id, review_id in latest.iterator():
+      ids = summaries[course_id].latest_review_ids
+      if len(ids) < cls.LATEST_REVIEWS:
+        ids.append(review_id)
+    cls.objects.bulk_create(
+      summaries.values(),
+      update_conflicts=True,
+      unique_fields=['course'],
+      update_fields=[f'rating_{rating}' for rating in range(1, 6)] + ['latest_review_ids'],
+      batch_size=1000
+    )
+    return len(summaries)
+
+
+class CourseDailyStats(models.Model):
+  """
+  Per-course, per-day rollup filled by the aggregate_course_stats command;
+  analytics read from here instead of scanning enrollments and reviews.
+  """
+  course = models.ForeignKey(
+    Course,
+    on_delete=models.CASCADE,
+    related_name='daily_stats'
+  )
+  date = models.DateField()
+  enrollments = models.PositiveIntegerField(default=0)
+  completions = models.PositiveIntegerField(default=0)
+  # Completions of the enrollments made on this day, whenever they completed.
+  cohort_completions = models.PositiveIntegerField(default=0)
+  # Course price at aggregation time times that day's enrollments.
+  revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+  rating_1 = models.PositiveIntegerField(default=0)
+  rating_2 = models.PositiveIntegerField(default=0)
+  rating_3 = models.PositiveIntegerField(default=0)
+  rating_4 = models.PositiveIntegerField(default=0)
+  rating_5 = models.PositiveIntegerField(default=0)
+
+  class Meta:
+    unique_together = ('course', 'date')
+    ordering = ['date']
+    verbose_name_plural = 'Course daily stats'
+
+  def __str__(self):
+    return f"{self.course} on {self.date}"
+
+
+class AggregationWatermark(models.Model):
+  """Timestamp up to which a rollup source has been aggregated."""
+  source = models.CharField(max_length=50, unique=True)
+  processed_until = models.DateTimeField()
+
+  def __str__(self):
+    return f"{self.source} until {self.processed_until}"
+
+
+def deleted_with_course(origin):
+  """
+  Whether a delete started from courses (``origin`` of the delete signals):
+  rows cascading from them need no per-row bookkeeping on their course.
+  """
+  if isinstance(origin, models.QuerySet):
+    return origin.model is Course
+  return isinstance(origin, Course)
+
+
+@receiver(post_delete, sender=Enrollment)
+def remove_enrollment_counters(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  Course.adjust_enrollments(
+    instance.course_id,
+    enrollments=-1,
+    completions=-1 if instance.completed_at is not None else 0,
+    popularity=-popularity_weight(instance.enrolled_at)
+  )
 
-  def delete(self, *args, **kwargs):
-    course = self.course
-    super().delete(*args, **kwargs)
-    course.update_average_rating()
 
+@receiver(post_delete, sender=CourseReview)
+def remove_review_rating(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  Course.adjust_rating(instance.course_id, -instance.rating, -1)
+  CourseReviewSummary.review_removed(instance.course_id, instance.pk, instance.rating)
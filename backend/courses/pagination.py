@@ -0,0 +1,157 @@
+import binascii
+import json
+import operator
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+
+from base.async_views import apaginate_page_number
+
+
+def keyset_filter(ordering, position, backwards=False):
+  """
+  Rows strictly after ``position`` (one value per ``ordering`` field) in
+  that ordering, or strictly before it with ``backwards``: the row-value
+  comparison ``(a, b) < (x, y)`` spelled ``a < x OR (a = x AND b < y)``.
+  """
+  branches = []
+  equal = Q()
+  for field, value in zip(ordering, position):
+    name = field.lstrip('-')
+    descending = field.startswith('-') != backwards
+    branches.append(equal & Q(**{f"{name}__{'lt' if descending else 'gt'}": value}))
+    equal &= Q(**{name: value})
+  return reduce(operator.or_, branches)
+
+
+class KeysetCursorPagination(CursorPagination):
+  """
+  Keyset pagination over every field of ``ordering``, whose last field
+  must be unique (``-id``). Unlike DRF's CursorPagination, which keys on the
+  first field and pages through ties with an offset capped at 1000, any
+  number of rows with the same score can be walked.
+  """
+
+  def __init__(self, ordering):
+    self.ordering = tuple(ordering)
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.request = request
+    self.page_size = self.get_page_size(request)
+    if not self.page_size:
+      return None
+    self.base_url = request.build_absolute_uri()
+    self.fields = [self.model_field(queryset.model, field) for field in self.ordering]
+    self.reverse, position = self.decode_cursor(request) or (False, None)
+
+    if self.reverse:
+      queryset = queryset.order_by(*(
+        field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering
+      ))
+    else:
+      queryset = queryset.order_by(*self.ordering)
+    if position is not None:
+      queryset = queryset.filter(keyset_filter(self.ordering, position, backwards=self.reverse))
+
+    results = list(queryset[:self.page_size + 1])
+    has_more = len(results) > self.page_size
+    self.page = results[:self.page_size]
+    if self.reverse:
+      self.page.reverse()
+    # Coming from a cursor means there is something on the other side.
+    self.has_next = has_more if not self.reverse else position is not None
+    self.has_previous = has_more if self.reverse else position is not None
+    self.display_page_controls = self.has_next or self.has_previous
+    return self.page
+
+  def model_field(self, model, field):
+    name = field.lstrip('-')
+    try:
+      return model._meta.get_field(name)
+    except FieldDoesNotExist:
+      return model._meta.pk if name == 'pk' else None
+
+  def decode_cursor(self, request):
+    encoded = request.query_params.get(self.cursor_query_param)
+    if encoded is None:
+      return None
+    try:
+      cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+      values = cursor['p']
+      if len(values) != len(self.ordering):
+        raise ValueError
+      position = [
+        field.to_python(value) if field is not None else value
+        for field, value in zip(self.fields, values)
+      ]
+      return bool(cursor.get('r')), position
+    except (TypeError, ValueError, KeyError, binascii.Error, ValidationError):
+      raise NotFound(self.invalid_cursor_message)
+
+  def encode_cursor(self, instance, reverse):
+    values = []
+    for field in self.ordering:
+      value = getattr(instance, field.lstrip('-'))
+      # Full precision: truncated timestamps would skip or repeat rows.
+      values.append(value.isoformat() if isinstance(value, datetime) else value)
+    cursor = {'p': values, 'r': 1} if reverse else {'p': values}
+    encoded = urlsafe_b64encode(json.dumps(cursor, default=str).encode()).decode('ascii')
+    return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+  def get_next_link(self):
+    if not self.has_next or not self.page:
+      return None
+    return self.encode_cursor(self.page[-1], reverse=False)
+
+  def get_previous_link(self):
+    if not self.has_previous or not self.page:
+      return None
+    return self.encode_cursor(self.page[0], reverse=True)
+
+
+class OptionalCursorPagination(PageNumberPagination):
+  """
+  Page-number pagination by default; ``?pagination=cursor`` (or following a
+  ``?cursor=`` link) switches to keyset pagination over the view's
+  ``cursor_ordering``, which needs no COUNT(*) and no OFFSET scan.
+  """
+  cursor_param = 'cursor'
+  mode_param = 'pagination'
+
+  def uses_cursor(self, request):
+    return (
+      request.query_params.get(self.mode_param) == 'cursor'
+      or self.cursor_param in request.query_params
+    )
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.cursor_paginator = None
+    if self.uses_cursor(request):
+      self.cursor_paginator = KeysetCursorPagination(view.cursor_ordering)
+      page = self.cursor_paginator.paginate_queryset(queryset, request, view)
+      self.display_page_controls = self.cursor_paginator.display_page_controls
+      return page
+    return super().paginate_queryset(queryset, request, view)
+
+  async def apaginate_queryset(self, queryset, request, view=None):
+    if self.uses_cursor(request):
+      return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+    self.cursor_paginator = None
+    return await apaginate_page_number(self, queryset, request, view)
+
+  def get_paginated_response(self, data):
+    if self.cursor_paginator is not None:
+      return self.cursor_paginator.get_paginated_response(data)
+    return super().get_paginated_response(data)
+
+  def to_html(self):
+    if self.cursor_paginator is not None:
+      return self.cursor_paginator.to_html()
+    return super().to_html()
@@ -1,5 +1,6 @@
 from rest_framework import permissions
 from django.contrib.auth import get_user_model
+from .cache import enrolled_course_ids
 
 User = get_user_model()
 
@@ -25,4 +26,23 @@ class IsLessonResourceCourseOwner(permissions.BasePermission):
     message = 'You must be the instructor of the course to modify this resource.'
 
     def has_object_permission(self, request, view, obj):
-        return obj.lesson.course.instructor == request.user
\ No newline at end of file
+        return obj.lesson.course.instructor == request.user
+
+def can_view_lesson(request, lesson):
+    """Free lessons are public; the rest need an enrollment (or to teach the course)."""
+    if lesson.is_free:
+        return True
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    return (
+        user.is_staff
+        or lesson.course.instructor_id == user.pk
+        or lesson.course_id in enrolled_course_ids(request)
+    )
+
+class CanViewLessonContent(permissions.BasePermission):
+    message = 'Enroll in this course to view this lesson.'
+
+    def has_object_permission(self, request, view, obj):
+        return can_view_lesson(request, obj)
@@ -0,0 +1,180 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Course, Enrollment, Lesson, LessonCompletion
+
+# A lesson watched this far through counts as completed.
+WATCHED_COMPLETION_RATIO = 0.9
+HUNDRED = Decimal('100.00')
+
+
+def coalesce_events(events):
+  """Fold a batch of events into one {lesson_id: (seconds, completed)} entry per lesson."""
+  lessons = {}
+  for event in events:
+    seconds, completed = lessons.get(event['lesson'], (0, False))
+    lessons[event['lesson']] = (
+      max(seconds, event.get('seconds_watched', 0)),
+      completed or event.get('completed', False)
+    )
+  return lessons
+
+
+def lesson_weight(field):
+  # Lessons without a duration still count for something.
+  return Sum(Greatest(field, Value(1)))
+
+
+def recompute_progress(enrollment_ids):
+  """
+  Recompute progress for the given enrollments in one aggregate query:
+  the duration of completed lessons over the duration of the course.
+  Returns the ids of enrollments that became complete.
+  """
+  done = (
+    LessonCompletion.objects.filter(enrollment=OuterRef('pk'), completed_at__isnull=False)
+    .order_by().values('enrollment')
+    .annotate(total=lesson_weight('lesson__duration_minutes')).values('total')
+  )
+  total = (
+    Lesson.objects.filter(course=OuterRef('course_id'))
+    .order_by().values('course')
+    .annotate(total=lesson_weight('duration_minutes')).values('total')
+  )
+  enrollments = Enrollment.objects.filter(pk__in=enrollment_ids).annotate(
+    done_weight=Coalesce(Subquery(done), 0),
+    total_weight=Coalesce(Subquery(total), 0)
+  ).only('id', 'course_id', 'progress', 'completed_at')
+
+  now = timezone.now()
+  changed = []
+  newly_completed = []
+  for enrollment in enrollments:
+    if enrollment.total_weight:
+      progress = min(
+        HUNDRED,
+        (Decimal(enrollment.done_weight) * 100 / enrollment.total_weight).quantize(Decimal('0.01'))
+      )
+    else:
+      progress = Decimal('0.00')
+    completed_at = enrollment.completed_at
+    if progress == HUNDRED and completed_at is None:
+      completed_at = now
+      newly_completed.append(enrollment)
+    if progress != enrollment.progress or completed_at != enrollment.completed_at:
+      enrollment.progress = progress
+      enrollment.completed_at = completed_at
+      changed.append(enrollment)
+
+  # bulk_update skips Enrollment.save(), so completion counters are
+  # adjusted here, once per course.
+  Enrollment.objects.bulk_update(changed, ['progress', 'completed_at'])
+  for course_id, completions in Counter(e.course_id for e in newly_completed).items():
+    Course.adjust_enrollments(course_id, completions=completions)
+  return [enrollment.pk for enrollment in newly_completed]
+
+
+def merge_conflicting_inserts(created):
+  """
+  Rows of ``created`` that a concurrent ingest inserted first were skipped
+  by ``ignore_conflicts``: return the stored rows that lack what ours add,
+  with the larger watch time and the earlier completion, to be updated.
+  """
+  wanted = {(completion.enrollment_id, completion.lesson_id): completion for completion in created}
+  stored = LessonCompletion.objects.select_for_update().filter(
+    enrollment_id__in={key[0] for key in wanted}, lesson_id__in={key[1] for key in wanted}
+  )
+  merged = []
+  for row in stored:
+    ours = wanted.get((row.enrollment_id, row.lesson_id))
+    if ours is None:
+      continue
+    seconds = max(row.seconds_watched, ours.seconds_watched)
+    completed_at = row.completed_at or ours.completed_at
+    if seconds != row.seconds_watched or completed_at != row.completed_at:
+      row.seconds_watched, row.completed_at, row.updated_at = seconds, completed_at, ours.updated_at
+      merged.append(row)
+  return merged
+
+
+def ingest_progress(student, events):
+  """
+  Apply a batch of progress events for one student.
+
+  Events are coalesced per lesson before touching the database. Watch
+  time is only written when it has advanced by PROGRESS_SAVE_INTERVAL
+  seconds or completes the lesson, so player heartbeats mostly end up as
+  no-ops, and progress is only recomputed for enrollments in which a
+  lesson was newly completed.
+  """
+  lessons = coalesce_events(events)
+  lesson_rows = {
+    pk: (course_id, duration)
+    for pk, course_id, duration in Lesson.objects.filter(pk__in=lessons).order_by()
+    .values_list('pk', 'course_id', 'duration_minutes')
+  }
+  enrollments = dict(
+    Enrollment.objects.filter(student=student, course_id__in={row[0] for row in lesson_rows.values()})
+    .values_list('course_id', 'pk')
+  )
+  accepted = {
+    lesson_id: enrollments[course_id]
+    for lesson_id, (course_id, _) in lesson_rows.items()
+    if course_id in enrollments
+  }
+  ignored = sorted(set(lessons) - set(accepted))
+  if not accepted:
+    return {'enrollments': [], 'ignored': ignored}
+
+  existing = {
+    completion.lesson_id: completion
+    for completion in LessonCompletion.objects.filter(
+      enrollment_id__in=set(accepted.values()), lesson_id__in=accepted
+    )
+  }
+  now = timezone.now()
+  interval = settings.PROGRESS_SAVE_INTERVAL
+  created, updated, completed_in = [], [], set()
+  for lesson_id, enrollment_id in accepted.items():
+    seconds, completed = lessons[lesson_id]
+    duration = lesson_rows[lesson_id][1] * 60
+    completed = completed or (duration > 0 and seconds >= duration * WATCHED_COMPLETION_RATIO)
+    completion = existing.get(lesson_id)
+    if completion is None:
+      completion = LessonCompletion(enrollment_id=enrollment_id, lesson_id=lesson_id, updated_at=now)
+      created.append(completion)
+    elif (
+      seconds - completion.seconds_watched >= interval
+      or (completed and completion.completed_at is None)
+    ):
+      updated.append(completion)
+    else:
+      continue
+    completion.seconds_watched = max(seconds, completion.seconds_watched)
+    if completed and completion.completed_at is None:
+      completion.completed_at = now
+      completed_in.add(enrollment_id)
+    completion.updated_at = now
+
+  if created or updated:
+    with transaction.atomic():
+      LessonCompletion.objects.bulk_create(created, ignore_conflicts=True)
+      if created:
+        updated += merge_conflicting_inserts(created)
+      LessonCompletion.objects.bulk_update(updated, ['seconds_watched', 'completed_at', 'updated_at'])
+      if completed_in:
+        recompute_progress(completed_in)
+
+  return {
+    'enrollments': list(
+      Enrollment.objects.filter(pk__in=set(accepted.values()))
+      .values('id', 'course', 'progress', 'completed_at')
+    ),
+    'ignored': ignored,
+  }
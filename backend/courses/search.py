@@ -0,0 +1,168 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import CharField, OuterRef, Subquery
+
+from .cache import search_version
+from .models import Course, CourseCategory, Lesson
+
+SEARCH_CONFIG = 'english'
+MAX_RESULTS = 1000
+
+# Field weights, highest first; mirrors the PostgreSQL A/B/C/D weights.
+FIELD_WEIGHTS = {
+  'title': ('A', 1.0),
+  'short_description': ('B', 0.4),
+  'category_name': ('B', 0.4),
+  'full_description': ('C', 0.2),
+  'lesson_titles': ('D', 0.1),
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+STOP_WORDS = frozenset(
+  'a an and are as at be by for from in into is it of on or the to with'.split()
+)
+
+
+def uses_postgres():
+  return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+  return [
+    token for token in TOKEN_RE.findall((text or '').lower())
+    if token not in STOP_WORDS
+  ]
+
+
+def search_document_expressions():
+  from django.contrib.postgres.aggregates import StringAgg
+
+  category_name = Subquery(
+    CourseCategory.objects.filter(pk=OuterRef('category_id')).values('name')[:1],
+    output_field=CharField()
+  )
+  lesson_titles = Subquery(
+    Lesson.objects.filter(course=OuterRef('pk')).order_by().values('course')
+    .annotate(titles=StringAgg('title', ' ')).values('titles'),
+    output_field=CharField()
+  )
+  return {
+    'title': 'title',
+    'short_description': 'short_description',
+    'category_name': category_name,
+    'full_description': 'full_description',
+    'lesson_titles': lesson_titles,
+  }
+
+
+def refresh_search_vectors(queryset=None):
+  """Rebuild the stored search_vector column (PostgreSQL only)."""
+  if not uses_postgres():
+    return 0
+  from django.contrib.postgres.search import SearchVector
+
+  vector = None
+  for name, expression in search_document_expressions().items():
+    part = SearchVector(expression, weight=FIELD_WEIGHTS[name][0], config=SEARCH_CONFIG)
+    vector = part if vector is None else vector + part
+  queryset = Course.objects.all() if queryset is None else queryset
+  return queryset.update(search_vector=vector)
+
+
+def postgres_search(query, limit):
+  from django.contrib.postgres.search import SearchQuery, SearchRank
+
+  search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+  return list(
+    Course.objects.filter(is_published=True, search_vector=search_query)
+    .annotate(rank=SearchRank('search_vector', search_query))
+    .order_by('-rank', '-created_at')
+    .values_list('pk', 'rank')[:limit]
+  )
+
+
+class InvertedIndex:
+  """
+  In-process inverted index used when the database has no full-text
+  search. Postings map a token to {course_id: weighted term frequency};
+  results are ranked with a BM25-style score over those frequencies.
+  """
+  k1 = 1.2
+
+  def __init__(self):
+    self.postings = defaultdict(dict)
+    self.created = {}
+
+  @classmethod
+  def build(cls):
+    index = cls()
+    documents = defaultdict(dict)
+    courses = Course.objects.filter(is_published=True).values_list(
+      'pk', 'created_at', 'title', 'short_description', 'full_description', 'category__name'
+    )
+    for pk, created_at, title, short, full, category in courses.iterator():
+      index.created[pk] = created_at
+      documents[pk].update(
+        title=title, short_description=short, full_description=full, category_name=category
+      )
+    lessons = Lesson.objects.filter(course__is_published=True).order_by().values_list('course_id', 'title')
+    for course_id, title in lessons.iterator():
+      document = documents[course_id]
+      document['lesson_titles'] = f"{document.get('lesson_titles', '')} {title}"
+    for pk, document in documents.items():
+      index.add(pk, document)
+    return index
+
+  def add(self, pk, document):
+    for name, text in document.items():
+      weight = FIELD_WEIGHTS[name][1]
+      for token in tokenize(text):
+        postings = self.postings[token]
+        postings[pk] = postings.get(pk, 0.0) + weight
+
+  def search(self, query, limit):
+    terms = tokenize(query)
+    if not terms:
+      return []
+    total = len(self.created) or 1
+    scores = None
+    for term in dict.fromkeys(terms):
+      postings = self.postings.get(term, {})
+      idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+      term_scores = {pk: idf * tf * (self.k1 + 1) / (tf + self.k1) for pk, tf in postings.items()}
+      if scores is None:
+        scores = term_scores
+      else:
+        scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+      if not scores:
+        return []
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], -self.created[item[0]].timestamp()))
+    return ranked[:limit]
+
+
+_index_lock = threading.Lock()
+_index = None
+_index_version = None
+
+
+def get_inverted_index():
+  global _index, _index_version
+  version = search_version()
+  with _index_lock:
+    if _index is None or _index_version != version:
+      _index = InvertedIndex.build()
+      _index_version = version
+    return _index
+
+
+def search_courses(query, limit=MAX_RESULTS):
+  """Return [(course_id, score), ...] best match first."""
+  if not query or not query.strip():
+    return []
+  if uses_postgres():
+    return postgres_search(query, limit)
+  return get_inverted_index().search(query, limit)
@@ -1,6 +1,14 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import reverse
 from rest_framework import serializers
-from .models import CourseCategory, Course, Lesson, LessonResource, Enrollment, CourseReview
-from users.serializers import UserSerializer
+from .models import (
+  CourseCategory, Course, Lesson, LessonResource, Enrollment, CourseReview, CourseReviewSummary, UploadSession
+)
+from .uploads import validate_resource_filename, validate_resource_size
+from base.images import srcset
+from base.serializers import DynamicFieldsMixin
+from users.serializers import UserSummarySerializer
 
 
 class CourseCategorySerializer(serializers.ModelSerializer):
@@ -11,13 +19,61 @@ class CourseCategorySerializer(serializers.ModelSerializer):
 
 
 class LessonResourceSerializer(serializers.ModelSerializer):
+  download_url = serializers.SerializerMethodField()
+
   class Meta:
     model = LessonResource
-    fields = ['id', 'name', 'file', 'uploaded_at']
+    fields = ['id', 'name', 'file', 'download_url', 'uploaded_at']
     read_only_fields = ['id', 'uploaded_at']
+    # Files are only handed out through the gated download action.
+    extra_kwargs = {
+      'file': {'write_only': True}
+    }
+
+  def get_download_url(self, obj):
+    url = reverse('lessonresource-download', args=[obj.pk])
+    request = self.context.get('request')
+    return request.build_absolute_uri(url) if request else url
+
+  def validate_file(self, value):
+    try:
+      validate_resource_size(value.size)
+    except DjangoValidationError as error:
+      raise serializers.ValidationError(error.messages)
+    return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+  offset = serializers.IntegerField(source='received', read_only=True)
+  max_chunk_size = serializers.SerializerMethodField()
+  resource = LessonResourceSerializer(read_only=True)
+
+  class Meta:
+    model = UploadSession
+    fields = ['id', 'lesson', 'name', 'filename', 'size', 'offset', 'max_chunk_size', 'resource', 'created_at']
+    read_only_fields = ['id', 'created_at']
 
+  def get_max_chunk_size(self, obj):
+    return settings.UPLOAD_CHUNK_MAX_SIZE
 
-class LessonSerializer(serializers.ModelSerializer):
+  def validate_filename(self, value):
+    try:
+      validate_resource_filename(value)
+    except DjangoValidationError as error:
+      raise serializers.ValidationError(error.messages)
+    return value
+
+  def validate_size(self, value):
+    if value < 1:
+      raise serializers.ValidationError('Empty files cannot be uploaded.')
+    try:
+      validate_resource_size(value)
+    except DjangoValidationError as error:
+      raise serializers.ValidationError(error.messages)
+    return value
+
+
+class LessonSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
   resources = LessonResourceSerializer(many=True, read_only=True)
 
   class Meta:
@@ -30,11 +86,22 @@ class LessonSerializer(serializers.ModelSerializer):
     read_only_fields = ['id', 'created_at']
 
 
-class CourseSerializer(serializers.ModelSerializer):
-  instructor = UserSerializer(read_only=True)
+class LessonOutlineSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+  """Lesson without its body or resources, for course pages and lesson lists."""
+  COLUMNS = ('id', 'course_id', 'order', 'title', 'content_type', 'duration_minutes', 'is_free')
+
+  class Meta:
+    model = Lesson
+    fields = ['id', 'order', 'title', 'content_type', 'duration_minutes', 'is_free']
+    read_only_fields = fields
+
+
+class CourseSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+  instructor = UserSummarySerializer(read_only=True)
   category = CourseCategorySerializer(read_only=True)
-  lessons = LessonSerializer(many=True, read_only=True)
+  lessons = LessonOutlineSerializer(many=True, read_only=True)
   thumbnail_url = serializers.SerializerMethodField()
+  thumbnail_srcset = serializers.SerializerMethodField()
   enrollment_status = serializers.SerializerMethodField()
 
   class Meta:
@@ -42,17 +109,16 @@ class CourseSerializer(serializers.ModelSerializer):
     fields = [
       'id', 'title', 'slug', 'instructor', 'category',
       'short_description', 'full_description', 'difficulty',
-      'price', 'duration_hours', 'thumbnail', 'thumbnail_url',
+      'price', 'duration_hours', 'thumbnail', 'thumbnail_url', 'thumbnail_srcset',
       'average_rating', 'is_published', 'created_at', 'lessons',
-      'enrollment_status', 'students'
+      'enrollment_status', 'enrollment_count'
     ]
     read_only_fields = [
       'id', 'slug', 'average_rating', 'created_at',
-      'instructor', 'enrollment_status'
+      'instructor', 'enrollment_status', 'enrollment_count'
     ]
     extra_kwargs = {
-      'thumbnail': {'write_only': True},
-      'students': {'read_only': True}
+      'thumbnail': {'write_only': True}
     }
 
   def get_thumbnail_url(self, obj):
@@ -60,13 +126,32 @@ class CourseSerializer(serializers.ModelSerializer):
       return obj.thumbnail.url
     return None
 
+  def get_thumbnail_srcset(self, obj):
+    if obj.thumbnail:
+      return srcset(obj.thumbnail_derivatives)
+    return {}
+
   def get_enrollment_status(self, obj):
+    if hasattr(obj, 'is_enrolled'):
+      return obj.is_enrolled
     request = self.context.get('request')
     if request and request.user.is_authenticated:
       return obj.enrollments.filter(student=request.user).exists()
     return False
 
 
+class CourseListSerializer(CourseSerializer):
+  class Meta(CourseSerializer.Meta):
+    fields = [
+      'id', 'title', 'slug', 'instructor', 'category',
+      'short_description', 'full_description', 'difficulty',
+      'price', 'duration_hours', 'thumbnail_url', 'thumbnail_srcset', 'average_rating',
+      'enrollment_count', 'is_published', 'created_at', 'lessons',
+      'enrollment_status'
+    ]
+    expandable_fields = ['full_description', 'lessons']
+
+
 class CourseCreateUpdateSerializer(serializers.ModelSerializer):
   class Meta:
     model = Course
@@ -77,13 +162,13 @@ class CourseCreateUpdateSerializer(serializers.ModelSerializer):
 
 
 class EnrollmentSerializer(serializers.ModelSerializer):
-  student = UserSerializer(read_only=True)
+  student = UserSummarySerializer(read_only=True)
   course = serializers.PrimaryKeyRelatedField(read_only=True)
 
   class Meta:
     model = Enrollment
     fields = ['id', 'student', 'course', 'enrolled_at', 'progress', 'completed_at']
-    read_only_fields = ['id', 'enrolled_at']
+    read_only_fields = ['id', 'enrolled_at', 'progress', 'completed_at']
 
 
 class EnrollmentCreateSerializer(serializers.ModelSerializer):
@@ -99,8 +184,37 @@ class EnrollmentCreateSerializer(serializers.ModelSerializer):
     return data
 
 
+class BulkEnrollmentSerializer(serializers.Serializer):
+  students = serializers.ListField(
+    child=serializers.CharField(max_length=254),
+    required=False,
+    help_text='User ids or emails.'
+  )
+  file = serializers.FileField(required=False, help_text='CSV with a user id or email in the first column.')
+
+  def validate(self, data):
+    if not data.get('students') and not data.get('file'):
+      raise serializers.ValidationError("Provide a list of students or a CSV file")
+    return data
+
+
+class ProgressEventSerializer(serializers.Serializer):
+  lesson = serializers.IntegerField(min_value=1)
+  completed = serializers.BooleanField(default=False)
+  seconds_watched = serializers.IntegerField(min_value=0, default=0)
+
+
+class ProgressBatchSerializer(serializers.Serializer):
+  events = ProgressEventSerializer(many=True, allow_empty=False)
+
+  def validate_events(self, events):
+    if len(events) > settings.PROGRESS_MAX_EVENTS:
+      raise serializers.ValidationError(f"At most {settings.PROGRESS_MAX_EVENTS} events per batch")
+    return events
+
+
 class CourseReviewSerializer(serializers.ModelSerializer):
-  student = UserSerializer(read_only=True)
+  student = UserSummarySerializer(read_only=True)
 
   class Meta:
     model = CourseReview
@@ -121,12 +235,42 @@ class CourseReviewSerializer(serializers.ModelSerializer):
     return data
 
 
+class CourseReviewSummarySerializer(serializers.ModelSerializer):
+  class Meta:
+    model = CourseReviewSummary
+    fields = ['review_count', 'histogram']
+
+
 class CourseDetailSerializer(CourseSerializer):
+  review_summary = serializers.SerializerMethodField()
   reviews = serializers.SerializerMethodField()
 
   class Meta(CourseSerializer.Meta):
-    fields = CourseSerializer.Meta.fields + ['reviews']
+    fields = CourseSerializer.Meta.fields + ['review_summary', 'reviews']
+
+  def get_summary(self, obj):
+    try:
+      return obj.review_summary
+    except CourseReviewSummary.DoesNotExist:
+      return CourseReviewSummary(course=obj)
+
+  def get_review_summary(self, obj):
+    return CourseReviewSummarySerializer(self.get_summary(obj)).data
+
+  @staticmethod
+  def review_queryset():
+    return CourseReview.objects.select_related('student').defer(
+      *UserSummarySerializer.deferred_fields('student')
+    ).order_by()
 
   def get_reviews(self, obj):
-    reviews = obj.reviews.all().order_by('-created_at')[:10]
-    return CourseReviewSerializer(reviews, many=True).data
\ No newline at end of file
+    ids = self.get_summary(obj).latest_review_ids
+    if not ids:
+      return []
+    # The async read path loads them beforehand (CourseViewSet.aprepare).
+    reviews = getattr(obj, 'latest_reviews', None)
+    if reviews is None:
+      reviews = self.review_queryset().in_bulk(ids)
+    return CourseReviewSerializer(
+      [reviews[pk] for pk in ids if pk in reviews], many=True, context=self.context
+    ).data
@@ -0,0 +1,169 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from base.images import derivatives_ready, track_derivatives
+from base.storage import track_files
+
+from .analytics import reaggregate_reviews
+from .cache import bump_catalog_version, bump_search_version, forget_enrolled_courses
+from .search import refresh_search_vectors, uses_postgres
+from .models import CourseCategory, Course, Lesson, LessonResource, Enrollment, CourseReview, deleted_with_course
+from users.models import User
+from users.serializers import UserSummarySerializer
+
+# Enrollments are left out: a cached body is shared between users and gets
+# their enrollment_status at response time (CourseViewSet.personalize), and
+# enrollment_count may lag by up to CATALOG_CACHE_TIMEOUT. For the same
+# reason they leave the course's updated_at alone: the counter update is the
+# only write an enrollment makes to its (often hot) course row.
+CATALOG_MODELS = (CourseCategory, Course, Lesson, LessonResource, CourseReview)
+
+
+def invalidate_catalog(sender, **kwargs):
+  bump_catalog_version()
+
+
+for model in CATALOG_MODELS:
+  post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f'invalidate_catalog_save_{model.__name__}')
+  post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f'invalidate_catalog_delete_{model.__name__}')
+
+
+def touch_courses(queryset):
+  return queryset.update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=CourseReview)
+def touch_parent_course(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  touch_courses(Course.objects.filter(pk=instance.course_id))
+
+
+@receiver([post_save, post_delete], sender=LessonResource)
+def touch_resource_course(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  touch_courses(Course.objects.filter(lessons=instance.lesson_id))
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def expire_enrolled_courses(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  forget_enrolled_courses([instance.student_id])
+
+
+@receiver(pre_delete, sender=Course)
+def expire_course_students(sender, instance, **kwargs):
+  # Its enrollments cascade without expire_enrolled_courses (see above).
+  forget_enrolled_courses(instance.enrollments.values_list('student_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def sync_student_courses(sender, instance, action, reverse, pk_set, **kwargs):
+  # course.students.add()/remove() write Enrollment rows in bulk without
+  # Enrollment.save(), so rebuild the counters of the courses involved.
+  if action == 'pre_clear' and not reverse:
+    # The cleared students are unknown once the rows are gone.
+    forget_enrolled_courses(instance.students.values_list('pk', flat=True))
+  if not action.startswith('post_'):
+    return
+  if reverse:
+    courses = Course.objects.filter(pk__in=pk_set or ())
+    if action == 'post_clear':
+      courses = Course.objects.all()
+    forget_enrolled_courses([instance.pk])
+  else:
+    courses = Course.objects.filter(pk=instance.pk)
+    forget_enrolled_courses(pk_set or ())
+  Course.recompute_enrollment_counters(courses)
+  touch_courses(courses)
+
+
+@receiver([post_save, post_delete], sender=CourseReview)
+def reaggregate_review_day(sender, instance, created=False, origin=None, **kwargs):
+  # The rollups only pick up new reviews; its daily stats go with a deleted course.
+  if created or deleted_with_course(origin):
+    return
+  # A review moved to another course changes the day of both.
+  loaded_course_id = getattr(instance, '_loaded_rating', (None, None))[0]
+  reaggregate_reviews({instance.course_id, loaded_course_id} - {None}, instance.created_at)
+
+
+@receiver(post_save, sender=CourseCategory)
+@receiver(pre_delete, sender=CourseCategory)
+def touch_category_courses(sender, instance, **kwargs):
+  touch_courses(instance.courses.all())
+
+
+def touch_user_courses(user_id):
+  """Courses whose payloads show the user, as instructor or as a reviewer."""
+  courses = Course.objects.filter(Q(instructor=user_id) | Q(reviews__student=user_id))
+  if touch_courses(courses):
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=User)
+def touch_profile_courses(sender, instance, created, update_fields=None, **kwargs):
+  if created:
+    return
+  # Saves of fields the nested summaries do not show (last_login) change nothing.
+  if update_fields is not None and not set(update_fields) & set(UserSummarySerializer.COLUMNS):
+    return
+  touch_user_courses(instance.pk)
+
+
+track_derivatives(Course, 'thumbnail', 'thumbnail_derivatives')
+track_files(Course)
+track_files(LessonResource)
+
+
+@receiver(derivatives_ready, sender=Course)
+def course_thumbnail_resized(sender, pk, **kwargs):
+  touch_courses(Course.objects.filter(pk=pk))
+  bump_catalog_version()
+
+
+@receiver(derivatives_ready, sender=User)
+def instructor_picture_resized(sender, pk, **kwargs):
+  touch_user_courses(pk)
+
+
+# Postgres keeps a search vector per course; otherwise the in-process index
+# (courses.search) is rebuilt once the search version moves.
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, update_fields=None, **kwargs):
+  if uses_postgres():
+    refresh_search_vectors(Course.objects.filter(pk=instance.pk))
+  else:
+    bump_search_version()
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def index_lesson_course(sender, instance, origin=None, **kwargs):
+  if deleted_with_course(origin):
+    return
+  if uses_postgres():
+    refresh_search_vectors(Course.objects.filter(pk=instance.course_id))
+  else:
+    bump_search_version()
+
+
+@receiver(post_save, sender=CourseCategory)
+def index_category_courses(sender, instance, **kwargs):
+  if uses_postgres():
+    refresh_search_vectors(instance.courses.all())
+  else:
+    bump_search_version()
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=CourseCategory)
+def unindex_courses(sender, instance, **kwargs):
+  # A deleted course leaves the index, and courses of a deleted category
+  # lose its name.
+  if not uses_postgres():
+    bump_search_version()
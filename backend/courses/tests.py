@@ -1,3 +1,1605 @@
-from django.test import TestCase
+import os
+import shutil
+import time
+from asyncio import iscoroutinefunction
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.tokens import AccessToken
+
+from base.authentication import JWTAuthentication
+from base.middleware import ReplicaRoutingMiddleware
+from base.routers import PrimaryReplicaRouter
+from base.storage import track_files
+from base.testing import async_read_views
+
+from users.models import User
+from users.serializers import TokenObtainPairSerializer, UserSummarySerializer
+from .cache import enrolled_courses_key
+from .enrollments import bulk_enroll
+from .models import (
+  CourseCategory, Course, Lesson, LessonResource, Enrollment, LessonCompletion, CourseReview,
+  CourseDailyStats, CourseReviewSummary, UploadSession
+)
+from .search import get_inverted_index
+
+
+class CatalogTestMixin:
+  def setUp(self):
+    cache.clear()
+    self.client = APIClient()
+
+  def make_user(self, username, role=User.Role.STUDENT):
+    return User.objects.create_user(
+      username=username,
+      email=f'{username}@example.com',
+      password='pass12345',
+      role=role
+    )
+
+  def make_course(self, instructor, title, category=None, lessons=2, **kwargs):
+    course = Course.objects.create(
+      title=title,
+      instructor=instructor,
+      category=category,
+      short_description='Short',
+      full_description='Full description',
+      difficulty=kwargs.pop('difficulty', 'beginner'),
+      is_published=True,
+      **kwargs
+    )
+    for order in range(1, lessons + 1):
+      lesson = Lesson.objects.create(
+        course=course,
+        title=f'Lesson {order}',
+        order=order,
+        content_type='article',
+        content='Lesson body',
+        duration_minutes=10
+      )
+      LessonResource.objects.create(lesson=lesson, name='Slides', file='lesson_resources/slides.pdf')
+    return course
+
+
+class CourseQueryPlanTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.category = CourseCategory.objects.create(name='Programming')
+
+  def populate(self, count):
+    for i in range(count):
+      course = self.make_course(self.instructor, f'Course {i}', self.category)
+      Enrollment.objects.create(student=self.student, course=course)
+      CourseReview.objects.create(student=self.student, course=course, rating=4)
+
+  def count_list_queries(self):
+    with CaptureQueriesContext(connection) as ctx:
+      response = self.client.get('/api/v1/courses/')
+    self.assertEqual(response.status_code, 200)
+    return len(ctx.captured_queries), response
+
+  def test_list_query_count_is_independent_of_page_size(self):
+    self.populate(2)
+    small, _ = self.count_list_queries()
+    self.populate(8)
+    large, response = self.count_list_queries()
+    self.assertEqual(small, large)
+    self.assertEqual(len(response.data['results']), 10)
+
+  def test_list_query_count_for_authenticated_user(self):
+    self.populate(10)
+    self.client.force_authenticate(self.student)
+    with self.assertNumQueries(2):
+      response = self.client.get('/api/v1/courses/')
+    self.assertTrue(all(c['enrollment_status'] for c in response.data['results']))
+
+  def test_expanded_list_query_count_is_independent_of_page_size(self):
+    self.populate(2)
+    with self.assertNumQueries(3):
+      self.client.get('/api/v1/courses/?expand=lessons')
+    self.populate(8)
+    with self.assertNumQueries(3):
+      response = self.client.get('/api/v1/courses/?expand=lessons')
+    self.assertEqual(len(response.data['results'][0]['lessons']), 2)
+
+  def test_retrieve_query_count(self):
+    self.populate(1)
+    course = Course.objects.get()
+    self.client.force_authenticate(self.student)
+    with self.assertNumQueries(3):
+      response = self.client.get(f'/api/v1/courses/{course.pk}/')
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.data['enrollment_status'])
+    self.assertEqual(len(response.data['reviews']), 1)
+
+
+class SparseFieldsetTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python')
+
+  def test_list_is_slim_by_default(self):
+    course = self.client.get('/api/v1/courses/').data['results'][0]
+    self.assertNotIn('lessons', course)
+    self.assertNotIn('full_description', course)
+    self.assertNotIn('students', course)
+    self.assertNotIn('email', course['instructor'])
+
+  def test_expand_adds_optional_fields(self):
+    course = self.client.get('/api/v1/courses/?expand=lessons,full_description').data['results'][0]
+    self.assertEqual(course['full_description'], 'Full description')
+    self.assertEqual([lesson['order'] for lesson in course['lessons']], [1, 2])
+
+  def test_fields_selects_nested_fields(self):
+    response = self.client.get('/api/v1/courses/?fields=id,instructor.username,lessons.title')
+    course = response.data['results'][0]
+    self.assertEqual(set(course), {'id', 'instructor', 'lessons'})
+    self.assertEqual(course['instructor'], {'username': 'teacher'})
+    self.assertEqual(course['lessons'][0], {'title': 'Lesson 1'})
+
+  def test_fields_applies_to_detail(self):
+    response = self.client.get(f'/api/v1/courses/{self.course.pk}/?fields=title,slug')
+    self.assertEqual(response.data, {'title': 'Python', 'slug': 'python'})
+
+
+class RatingCounterTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.alice = self.make_user('alice')
+    self.bob = self.make_user('bob')
+
+  def assertRating(self, rating_sum, rating_count, average):
+    self.course.refresh_from_db()
+    self.assertEqual((self.course.rating_sum, self.course.rating_count), (rating_sum, rating_count))
+    self.assertEqual(self.course.average_rating, average)
+
+  def test_counters_follow_create_edit_and_delete(self):
+    review = CourseReview.objects.create(student=self.alice, course=self.course, rating=5)
+    CourseReview.objects.create(student=self.bob, course=self.course, rating=2)
+    self.assertRating(7, 2, 3.5)
+
+    review = CourseReview.objects.get(pk=review.pk)
+    review.rating = 3
+    review.save()
+    self.assertRating(5, 2, 2.5)
+
+    review.delete()
+    self.assertRating(2, 1, 2.0)
+
+    self.bob.delete()
+    self.assertRating(0, 0, 0.0)
+
+  def test_average_is_rounded(self):
+    for name, rating in (('carol', 5), ('dave', 4), ('erin', 4)):
+      CourseReview.objects.create(student=self.make_user(name), course=self.course, rating=rating)
+    self.assertRating(13, 3, 4.3)
+
+  def test_course_save_does_not_overwrite_counters(self):
+    stale = Course.objects.get(pk=self.course.pk)
+    CourseReview.objects.create(student=self.alice, course=self.course, rating=4)
+    stale.title = 'Python 101'
+    stale.save()
+    self.assertRating(4, 1, 4.0)
+
+  def test_recompute_repairs_drift(self):
+    CourseReview.objects.create(student=self.alice, course=self.course, rating=4)
+    CourseReview.objects.create(student=self.bob, course=self.course, rating=5)
+    Course.objects.update(rating_sum=0, rating_count=7, average_rating=1.0)
+    call_command('recompute_course_stats', stdout=StringIO())
+    self.assertRating(9, 2, 4.5)
+
+
+class CatalogCacheTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.course = self.make_course(self.instructor, 'Python')
+
+  def test_repeated_anonymous_reads_skip_serialization(self):
+    self.assertEqual(self.client.get('/api/v1/courses/')['X-Cache'], 'MISS')
+    with self.assertNumQueries(0):
+      response = self.client.get('/api/v1/courses/')
+    self.assertEqual(response['X-Cache'], 'HIT')
+    self.assertEqual(response.data['count'], 1)
+
+  def test_query_params_are_part_of_the_key(self):
+    self.client.get('/api/v1/courses/')
+    response = self.client.get('/api/v1/courses/?fields=id')
+    self.assertEqual(response['X-Cache'], 'MISS')
+    self.assertEqual(set(response.data['results'][0]), {'id'})
+
+  def test_writes_invalidate_cached_responses(self):
+    url = f'/api/v1/courses/{self.course.pk}/'
+    self.client.get(url)
+    lesson = self.course.lessons.first()
+    lesson.title = 'Renamed'
+    lesson.save()
+    response = self.client.get(url)
+    self.assertEqual(response['X-Cache'], 'MISS')
+    self.assertEqual(response.data['lessons'][0]['title'], 'Renamed')
+
+    CourseCategory.objects.create(name='Design')
+    self.assertEqual(self.client.get('/api/v1/course-categories/').data['count'], 1)
+    CourseCategory.objects.create(name='Music')
+    self.assertEqual(self.client.get('/api/v1/course-categories/').data['count'], 2)
+
+  def test_profile_edits_reach_cached_courses(self):
+    url = f'/api/v1/courses/{self.course.pk}/'
+    CourseReview.objects.create(student=self.student, course=self.course, rating=5, comment='Great')
+    etag = self.client.get(url)['ETag']
+
+    self.instructor.first_name = 'Ada'
+    self.instructor.save()
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response['X-Cache'], 'MISS')
+    self.assertEqual(response.data['instructor']['first_name'], 'Ada')
+
+    etag = response['ETag']
+    self.student.last_name = 'Lovelace'
+    self.student.save(update_fields=['last_name'])
+    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data['reviews'][0]['student']['last_name'], 'Lovelace')
+
+    # Fields no payload shows leave the cache alone.
+    self.student.save(update_fields=['last_login'])
+    self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+  def test_enrollment_status_is_not_shared_between_users(self):
+    other = self.make_user('other')
+    Enrollment.objects.create(student=self.student, course=self.course)
+    self.client.force_authenticate(self.student)
+    self.assertTrue(self.client.get('/api/v1/courses/').data['results'][0]['enrollment_status'])
+    self.client.force_authenticate(other)
+    response = self.client.get('/api/v1/courses/')
+    self.assertEqual(response['X-Cache'], 'HIT')
+    self.assertFalse(response.data['results'][0]['enrollment_status'])
+    self.client.force_authenticate(None)
+    self.assertFalse(self.client.get('/api/v1/courses/').data['results'][0]['enrollment_status'])
+
+  def test_enrollments_keep_the_shared_cache(self):
+    url = f'/api/v1/courses/{self.course.pk}/'
+    self.client.force_authenticate(self.student)
+    self.assertFalse(self.client.get(url).data['enrollment_status'])
+    self.assertFalse(self.client.get('/api/v1/courses/').data['results'][0]['enrollment_status'])
+    Enrollment.objects.create(student=self.student, course=self.course)
+    for path in (url, '/api/v1/courses/'):
+      response = self.client.get(path)
+      self.assertEqual(response['X-Cache'], 'HIT')
+      data = response.data.get('results', [response.data])[0]
+      self.assertTrue(data['enrollment_status'])
+
+    # Without the ids in the payload, entries are cached per user.
+    self.assertTrue(self.client.get('/api/v1/courses/?fields=enrollment_status').data['results'][0]['enrollment_status'])
+    self.client.force_authenticate(self.make_user('other'))
+    response = self.client.get('/api/v1/courses/?fields=enrollment_status')
+    self.assertEqual(response['X-Cache'], 'MISS')
+    self.assertFalse(response.data['results'][0]['enrollment_status'])
+
+
+class ConditionalGetTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.course = self.make_course(self.instructor, 'Python')
+    self.url = f'/api/v1/courses/{self.course.pk}/'
+
+  def test_matching_etag_returns_304_before_serialization(self):
+    response = self.client.get(self.url)
+    self.assertIn('ETag', response)
+    self.assertNotIn('Last-Modified', response)
+    with self.assertNumQueries(0):
+      response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+    self.assertEqual(response.status_code, 304)
+
+  def test_etag_follows_the_cached_body(self):
+    # Enrollments leave the cached body alone, so its ETag must not change
+    # until the body does; then the old ETag must stop matching.
+    etag = self.client.get(self.url)['ETag']
+    Enrollment.objects.create(student=self.student, course=self.course)
+    self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+    cache.clear()
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data['enrollment_count'], 1)
+
+  def test_etag_changes_with_enrollment_status(self):
+    self.client.force_authenticate(self.student)
+    etag = self.client.get(self.url)['ETag']
+    Enrollment.objects.create(student=self.student, course=self.course)
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.data['enrollment_status'])
+
+  def test_lists_have_no_last_modified(self):
+    # A deleted course would not move it, so If-Modified-Since could not see the removal.
+    other = self.make_course(self.instructor, 'Django', lessons=0)
+    response = self.client.get('/api/v1/courses/')
+    self.assertNotIn('Last-Modified', response)
+    other.delete()
+    response = self.client.get('/api/v1/courses/', HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data['count'], 1)
+
+  def test_lesson_and_review_changes_bump_the_course(self):
+    etag = self.client.get(self.url)['ETag']
+    self.course.lessons.first().delete()
+    response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+    self.assertEqual(response.status_code, 200)
+
+    etag = response['ETag']
+    CourseReview.objects.create(student=self.student, course=self.course, rating=5)
+    self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+  def test_list_etag_changes_when_a_course_is_removed(self):
+    other = self.make_course(self.instructor, 'Django', lessons=0)
+    etag = self.client.get('/api/v1/courses/')['ETag']
+    other.delete()
+    self.assertEqual(self.client.get('/api/v1/courses/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+  def test_etag_differs_per_user(self):
+    etag = self.client.get(self.url)['ETag']
+    self.client.force_authenticate(self.student)
+    self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CursorPaginationTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    for i in range(15):
+      course = self.make_course(self.instructor, f'Course {i}', lessons=0)
+      Enrollment.objects.create(student=self.student, course=course)
+
+  def walk(self, url):
+    seen = []
+    while url:
+      response = self.client.get(url)
+      self.assertEqual(response.status_code, 200)
+      self.assertNotIn('count', response.data)
+      seen += [item['id'] for item in response.data['results']]
+      url = response.data['next']
+    return seen
+
+  def test_page_number_pagination_is_still_the_default(self):
+    response = self.client.get('/api/v1/courses/')
+    self.assertEqual(response.data['count'], 15)
+
+  def test_cursor_pagination_walks_every_course_once(self):
+    ids = self.walk('/api/v1/courses/?pagination=cursor')
+    self.assertEqual(ids, list(Course.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+  def test_cursor_pagination_for_enrollments(self):
+    self.client.force_authenticate(self.student)
+    self.assertEqual(len(self.walk('/api/v1/enrollments/?pagination=cursor')), 15)
+
+  def test_cursor_pages_do_not_count(self):
+    with self.assertNumQueries(1):
+      self.client.get('/api/v1/courses/?pagination=cursor')
+
+  def test_cursor_walks_long_runs_of_equal_scores(self):
+    Course.objects.bulk_create([
+      Course(
+        title=f'Tied {i}', slug=f'tied-{i}', instructor=self.instructor, short_description='Short',
+        full_description='Full', difficulty='beginner', is_published=True
+      )
+      for i in range(1100)
+    ])
+    expected = list(Course.objects.order_by('-average_rating', '-id').values_list('id', flat=True))
+    url = '/api/v1/courses/?ordering=rating&pagination=cursor'
+    ids = []
+    while url:
+      response = self.client.get(url)
+      last_page = [item['id'] for item in response.data['results']]
+      ids += last_page
+      url = response.data['next']
+    self.assertEqual(ids, expected)
+
+    # And back again from the last page.
+    ids = []
+    url = response.data['previous']
+    while url:
+      response = self.client.get(url)
+      ids = [item['id'] for item in response.data['results']] + ids
+      url = response.data['previous']
+    self.assertEqual(ids, expected[:-len(last_page)])
+
+  def test_invalid_cursor_is_not_found(self):
+    self.assertEqual(self.client.get('/api/v1/courses/?cursor=bm9wZQ==').status_code, 404)
+
+
+class CourseSearchTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    data = CourseCategory.objects.create(name='Data Science')
+    self.python = self.make_course(self.instructor, 'Python for Data Analysis', data, lessons=0)
+    self.django = self.make_course(self.instructor, 'Django Web Development', lessons=0)
+    Lesson.objects.create(
+      course=self.django, title='Deploying Python apps', order=1,
+      content_type='article', content='Body'
+    )
+    self.make_course(self.instructor, 'Watercolor Painting', lessons=0)
+
+  def search(self, query):
+    response = self.client.get('/api/v1/courses/search/', {'q': query})
+    self.assertEqual(response.status_code, 200)
+    return [course['title'] for course in response.data['results']]
+
+  def test_title_matches_rank_above_lesson_title_matches(self):
+    self.assertEqual(self.search('python'), ['Python for Data Analysis', 'Django Web Development'])
+
+  def test_all_terms_must_match(self):
+    self.assertEqual(self.search('python deploying'), ['Django Web Development'])
+    self.assertEqual(self.search('python painting'), [])
+
+  def test_category_names_are_searchable(self):
+    self.assertEqual(self.search('science'), ['Python for Data Analysis'])
+
+  def test_index_follows_catalog_changes(self):
+    self.assertEqual(self.search('painting'), ['Watercolor Painting'])
+    Course.objects.get(title='Watercolor Painting').delete()
+    self.assertEqual(self.search('painting'), [])
+
+  def test_reviews_do_not_rebuild_the_index(self):
+    index = get_inverted_index()
+    CourseReview.objects.create(student=self.make_user('student'), course=self.python, rating=5)
+    self.assertIs(get_inverted_index(), index)
+    Lesson.objects.create(course=self.python, title='Pandas basics', order=1, content_type='article', content='Body')
+    self.assertEqual(self.search('pandas'), ['Python for Data Analysis'])
+
+  def test_drafts_are_not_searchable(self):
+    self.python.is_published = False
+    self.python.save()
+    self.assertEqual(self.search('analysis'), [])
+
+
+class CourseFacetTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.web = CourseCategory.objects.create(name='Web')
+    self.data = CourseCategory.objects.create(name='Data')
+    self.make_course(self.instructor, 'HTML', self.web, lessons=0, price=0, duration_hours=1)
+    self.make_course(self.instructor, 'Django', self.web, lessons=0, difficulty='intermediate', price=60, duration_hours=8)
+    self.make_course(self.instructor, 'Pandas', self.data, lessons=0, difficulty='intermediate', price=120, duration_hours=12)
+
+  def titles(self, response):
+    return sorted(course['title'] for course in response.data['results'])
+
+  def test_filters(self):
+    self.assertEqual(self.titles(self.client.get('/api/v1/courses/?difficulty=intermediate')), ['Django', 'Pandas'])
+    self.assertEqual(self.titles(self.client.get(f'/api/v1/courses/?category={self.web.pk}')), ['Django', 'HTML'])
+    self.assertEqual(self.titles(self.client.get('/api/v1/courses/?price_band=free,100_plus')), ['HTML', 'Pandas'])
+    self.assertEqual(self.titles(self.client.get('/api/v1/courses/?min_duration=5&max_price=100')), ['Django'])
+
+  def test_invalid_filters_are_rejected(self):
+    self.assertEqual(self.client.get('/api/v1/courses/?min_price=abc').status_code, 400)
+    self.assertEqual(self.client.get('/api/v1/courses/?price_band=cheap').status_code, 400)
+
+  def test_facets_use_one_query_each(self):
+    # Page count and page, then five facet queries.
+    with self.assertNumQueries(7):
+      response = self.client.get(f'/api/v1/courses/?facets=true&category={self.web.pk}')
+    facets = response.data['facets']
+    self.assertEqual(
+      {row['value']: row['count'] for row in facets['difficulty']},
+      {'beginner': 1, 'intermediate': 1, 'advanced': 0}
+    )
+    # The category facet ignores the category filter itself.
+    self.assertEqual({row['label']: row['count'] for row in facets['category']}, {'Web': 2, 'Data': 1})
+    self.assertEqual(
+      {row['value']: row['count'] for row in facets['price_band']},
+      {'free': 1, 'under_50': 0, '50_to_100': 1, '100_plus': 0}
+    )
+    self.assertEqual(facets['duration'][-1], {'value': '10_plus', 'count': 0})
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+  def setUp(self):
+    self.factory = RequestFactory()
+    self.router = PrimaryReplicaRouter()
+
+  def read_alias(self, request):
+    seen = {}
+
+    def view(request):
+      seen['alias'] = self.router.db_for_read(Course)
+      return HttpResponse()
+
+    response = ReplicaRoutingMiddleware(view)(request)
+    return seen['alias'], response
+
+  def test_safe_requests_read_from_replica(self):
+    alias, response = self.read_alias(self.factory.get('/api/v1/courses/'))
+    self.assertEqual(alias, 'replica')
+    self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+  def test_writes_use_primary_and_pin_following_reads(self):
+    alias, response = self.read_alias(self.factory.post('/api/v1/enrollments/'))
+    self.assertEqual(alias, 'default')
+    self.assertEqual(self.router.db_for_write(Enrollment), 'default')
+    cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+    self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    request = self.factory.get('/api/v1/courses/')
+    request.COOKIES[settings.REPLICA_PIN_COOKIE] = '1'
+    self.assertEqual(self.read_alias(request)[0], 'default')
+
+  def test_reads_outside_a_request_use_primary(self):
+    self.assertEqual(self.router.db_for_read(Course), 'default')
+
+  def test_migrations_only_run_on_primary(self):
+    self.assertTrue(self.router.allow_migrate('default', 'courses'))
+    self.assertFalse(self.router.allow_migrate('replica', 'courses'))
+
+
+@override_settings(DATABASE_REPLICAS=['lagging_replica'])
+class ReplicaDatabaseRoutingTests(TransactionTestCase):
+  """
+  The routing against a real second database, which never receives the
+  writes, as a lagging replica. Not a TestCase: the router keeps reads in
+  a transaction on the primary, so its wrapping transaction would too.
+  """
+  @classmethod
+  def setUpClass(cls):
+    # The replica only exists for this class: an in-memory SQLite alias the
+    # runner never sees, so it is added to ``databases`` only once it exists.
+    connections.settings['lagging_replica'] = connections.configure_settings({
+      'default': connections.settings['default'],
+      'lagging_replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    })['lagging_replica']
+    cls.databases = {'default', 'lagging_replica'}
+    super().setUpClass()
+    # Migrations only run on the primary; the replica gets the table read here.
+    with connections['lagging_replica'].schema_editor() as editor:
+      editor.create_model(CourseCategory)
+
+  @classmethod
+  def tearDownClass(cls):
+    super().tearDownClass()
+    connections['lagging_replica'].close()
+    del connections['lagging_replica']
+    del connections.settings['lagging_replica']
+
+  def setUp(self):
+    self.factory = RequestFactory()
+
+  def call(self, method, view, cookies=None):
+    request = getattr(self.factory, method)('/api/v1/course-categories/')
+    request.COOKIES.update(cookies or {})
+    return ReplicaRoutingMiddleware(view)(request)
+
+  def test_reads_after_a_write_go_to_the_primary(self):
+    seen = {}
+
+    def write(request):
+      CourseCategory.objects.create(name='Design')
+      seen['own write'] = CourseCategory.objects.filter(name='Design').exists()
+      return HttpResponse()
+
+    def read(request):
+      seen['read'] = CourseCategory.objects.filter(name='Design').exists()
+      return HttpResponse()
+
+    response = self.call('post', write)
+    self.assertTrue(seen['own write'])
+    self.assertFalse(CourseCategory.objects.using('lagging_replica').exists())
+
+    self.call('get', read, cookies={settings.REPLICA_PIN_COOKIE: response.cookies[settings.REPLICA_PIN_COOKIE].value})
+    self.assertTrue(seen['read'])
+    # Without the cookie the read goes to the replica, which lacks the row.
+    self.call('get', read)
+    self.assertFalse(seen['read'])
+
+
+class EnrollmentCounterTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.old = self.make_course(self.instructor, 'Old favourite', lessons=0)
+    self.new = self.make_course(self.instructor, 'New hit', lessons=0)
+    self.students = [self.make_user(f'student{i}') for i in range(4)]
+
+  def enroll(self, course, student, days_ago):
+    enrollment = Enrollment.objects.create(student=student, course=course)
+    Enrollment.objects.filter(pk=enrollment.pk).update(
+      enrolled_at=timezone.now() - timedelta(days=days_ago)
+    )
+    return Enrollment.objects.get(pk=enrollment.pk)
+
+  def test_counters_follow_enrollment_lifecycle(self):
+    enrollment = Enrollment.objects.create(student=self.students[0], course=self.old)
+    Enrollment.objects.create(student=self.students[1], course=self.old)
+    enrollment.completed_at = timezone.now()
+    enrollment.save()
+    self.old.refresh_from_db()
+    self.assertEqual((self.old.enrollment_count, self.old.completion_count), (2, 1))
+
+    enrollment.delete()
+    self.old.refresh_from_db()
+    self.assertEqual((self.old.enrollment_count, self.old.completion_count), (1, 0))
+
+  def test_recent_enrollments_outweigh_old_ones(self):
+    for student in self.students[:3]:
+      self.enroll(self.old, student, days_ago=120)
+    self.enroll(self.new, self.students[3], days_ago=0)
+    # Recompute so the backdated enrolled_at values are what count.
+    call_command('recompute_course_stats', stdout=StringIO())
+    response = self.client.get('/api/v1/courses/?ordering=popular')
+    self.assertEqual(
+      [course['title'] for course in response.data['results']],
+      ['New hit', 'Old favourite']
+    )
+    self.assertEqual(response.data['results'][1]['enrollment_count'], 3)
+
+  def count_delete_queries(self, course, students):
+    for student in students:
+      Enrollment.objects.create(student=student, course=course)
+      CourseReview.objects.create(student=student, course=course, rating=4)
+    with CaptureQueriesContext(connection) as ctx:
+      course.delete()
+    return len(ctx.captured_queries)
+
+  def test_deleting_a_course_skips_per_row_bookkeeping(self):
+    students = User.objects.bulk_create([User(username=f'many{i}', email=f'many{i}@example.com') for i in range(40)])
+    big = self.make_course(self.instructor, 'Big', lessons=0)
+    self.assertEqual(
+      self.count_delete_queries(self.old, students[:2]),
+      self.count_delete_queries(big, students)
+    )
+    # Deleting one enrollment still keeps the counters.
+    enrollment = Enrollment.objects.create(student=students[0], course=self.new)
+    enrollment.delete()
+    self.new.refresh_from_db()
+    self.assertEqual(self.new.enrollment_count, 0)
+
+  def test_deleting_a_course_expires_its_students_enrolled_sets(self):
+    Enrollment.objects.create(student=self.students[0], course=self.old)
+    cache.set(enrolled_courses_key(self.students[0].pk), frozenset([self.old.pk]))
+    self.old.delete()
+    self.assertIsNone(cache.get(enrolled_courses_key(self.students[0].pk)))
+
+  def test_unknown_ordering_is_rejected(self):
+    self.assertEqual(self.client.get('/api/v1/courses/?ordering=title').status_code, 400)
+
+
+class CourseStudentsTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.student = self.make_user('student')
+
+  def test_students_and_enrollments_are_one_table(self):
+    Enrollment.objects.create(student=self.student, course=self.course)
+    self.assertEqual(list(self.course.students.all()), [self.student])
+    self.assertEqual(list(self.student.courses_enrolled.all()), [self.course])
+
+  def test_m2m_writes_keep_counters_in_sync(self):
+    self.course.students.add(self.student)
+    self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+    self.course.refresh_from_db()
+    self.assertEqual(self.course.enrollment_count, 1)
+    self.course.students.remove(self.student)
+    self.course.refresh_from_db()
+    self.assertEqual(self.course.enrollment_count, 0)
+
+  def test_course_payload_has_no_student_list(self):
+    Enrollment.objects.create(student=self.student, course=self.course)
+    data = self.client.get(f'/api/v1/courses/{self.course.pk}/').data
+    self.assertNotIn('students', data)
+    self.assertEqual(data['enrollment_count'], 1)
+
+
+class BulkEnrollmentTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.students = [self.make_user(f'student{i}') for i in range(5)]
+    Enrollment.objects.create(student=self.students[0], course=self.course)
+    self.url = f'/api/v1/courses/{self.course.pk}/bulk-enroll/'
+
+  def test_bulk_enroll_by_id_and_email(self):
+    self.client.force_authenticate(self.instructor)
+    payload = {'students': [
+      str(self.students[0].pk), str(self.students[1].pk), 'STUDENT2@example.com',
+      'nobody@example.com', 'garbage', str(self.students[1].pk)
+    ]}
+    with self.assertNumQueries(9):
+      response = self.client.post(self.url, payload, format='json')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(
+      [result['status'] for result in response.data['results']],
+      ['already_enrolled', 'enrolled', 'enrolled', 'not_found', 'invalid', 'already_enrolled']
+    )
+    self.course.refresh_from_db()
+    self.assertEqual(self.course.enrollment_count, 3)
+    self.assertEqual(self.course.students.count(), 3)
+
+  def test_emails_match_regardless_of_case(self):
+    self.students[3].email = 'Student3@Example.com'
+    self.students[3].save()
+    results = bulk_enroll(self.course, ['student3@example.com', 'STUDENT4@EXAMPLE.COM'])
+    self.assertEqual([result['status'] for result in results], ['enrolled', 'enrolled'])
+    self.assertEqual([result['student'] for result in results], [self.students[3].pk, self.students[4].pk])
+
+  def test_counters_ignore_rows_skipped_as_conflicts(self):
+    bulk_create = Enrollment.objects.bulk_create
+
+    def enrolled_meanwhile(objs, **kwargs):
+      # Committed by someone else after bulk_enroll looked for existing rows,
+      # and counted by its own save().
+      Enrollment.objects.create(student=self.students[1], course=self.course)
+      return bulk_create(objs, **kwargs)
+
+    with mock.patch.object(Enrollment.objects, 'bulk_create', enrolled_meanwhile):
+      results = bulk_enroll(self.course, [str(self.students[1].pk), str(self.students[2].pk)])
+    self.assertEqual([result['status'] for result in results], ['already_enrolled', 'enrolled'])
+    self.course.refresh_from_db()
+    self.assertEqual(self.course.enrollment_count, 3)
+
+  def test_bulk_enroll_from_csv(self):
+    self.client.force_authenticate(self.instructor)
+    upload = SimpleUploadedFile(
+      'cohort.csv', b'email\nstudent3@example.com\nstudent4@example.com\n', content_type='text/csv'
+    )
+    response = self.client.post(self.url, {'file': upload}, format='multipart')
+    self.assertEqual(response.data['summary']['enrolled'], 2)
+
+  def test_only_the_course_owner_can_bulk_enroll(self):
+    self.client.force_authenticate(self.students[1])
+    response = self.client.post(self.url, {'students': [str(self.students[1].pk)]}, format='json')
+    self.assertEqual(response.status_code, 403)
+
+  def test_management_command(self):
+    out = StringIO()
+    call_command('bulk_enroll', self.course.slug, 'student3@example.com', str(self.students[0].pk), stdout=out)
+    self.assertIn('1 enrolled, 1 already_enrolled', out.getvalue())
+
+
+class ProgressIngestTests(CatalogTestMixin, TestCase):
+  url = '/api/v1/enrollments/progress/'
+
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.short = Lesson.objects.create(
+      course=self.course, title='Intro', order=1, content_type='video', content='', duration_minutes=10
+    )
+    self.long = Lesson.objects.create(
+      course=self.course, title='Deep dive', order=2, content_type='video', content='', duration_minutes=30
+    )
+    self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+    self.client.force_authenticate(self.student)
+
+  def send(self, *events):
+    return self.client.post(self.url, {'events': list(events)}, format='json')
+
+  def test_progress_is_weighted_by_lesson_duration(self):
+    response = self.send({'lesson': self.short.pk, 'completed': True})
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.data['enrollments'][0]['progress'], Decimal('25.00'))
+
+    self.send({'lesson': self.long.pk, 'seconds_watched': 1700})
+    self.enrollment.refresh_from_db()
+    self.assertEqual(self.enrollment.progress, Decimal('100.00'))
+    self.assertIsNotNone(self.enrollment.completed_at)
+    self.assertEqual(Course.objects.get(pk=self.course.pk).completion_count, 1)
+
+  def test_heartbeats_are_coalesced_and_throttled(self):
+    heartbeats = [{'lesson': self.long.pk, 'seconds_watched': seconds} for seconds in range(5, 65, 5)]
+    self.send(*heartbeats)
+    completion = LessonCompletion.objects.get()
+    self.assertEqual(completion.seconds_watched, 60)
+
+    with self.assertNumQueries(4):
+      self.send({'lesson': self.long.pk, 'seconds_watched': 70})
+    completion.refresh_from_db()
+    self.assertEqual(completion.seconds_watched, 60)
+
+    self.send({'lesson': self.long.pk, 'seconds_watched': 95})
+    completion.refresh_from_db()
+    self.assertEqual(completion.seconds_watched, 95)
+    self.assertIsNone(completion.completed_at)
+
+  def test_completions_survive_a_concurrent_insert(self):
+    bulk_create = LessonCompletion.objects.bulk_create
+
+    def watched_meanwhile(objs, **kwargs):
+      # Another ingest inserted the row after this one looked for it.
+      LessonCompletion.objects.create(enrollment=self.enrollment, lesson=self.short, seconds_watched=300)
+      return bulk_create(objs, **kwargs)
+
+    with mock.patch.object(LessonCompletion.objects, 'bulk_create', watched_meanwhile):
+      response = self.send({'lesson': self.short.pk, 'seconds_watched': 120, 'completed': True})
+    completion = LessonCompletion.objects.get()
+    self.assertEqual(completion.seconds_watched, 300)
+    self.assertIsNotNone(completion.completed_at)
+    self.assertEqual(response.data['enrollments'][0]['progress'], Decimal('25.00'))
+
+  def test_lessons_outside_enrollments_are_ignored(self):
+    other = self.make_course(self.instructor, 'Django', lessons=1)
+    response = self.send({'lesson': other.lessons.get().pk, 'completed': True}, {'lesson': 999999})
+    self.assertEqual(response.data['ignored'], sorted([other.lessons.get().pk, 999999]))
+    self.assertFalse(LessonCompletion.objects.exists())
+
+  def test_progress_cannot_be_patched(self):
+    self.client.patch(f'/api/v1/enrollments/{self.enrollment.pk}/', {'progress': 100}, format='json')
+    self.enrollment.refresh_from_db()
+    self.assertEqual(self.enrollment.progress, 0)
+
+
+class InstructorAnalyticsTests(CatalogTestMixin, TestCase):
+  url = '/api/v1/instructors/me/analytics/'
+
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python', lessons=0, price=Decimal('20.00'))
+    self.other = self.make_course(self.make_user('rival', User.Role.INSTRUCTOR), 'Django', lessons=0)
+    self.yesterday = timezone.now() - timedelta(days=1)
+    for index in range(3):
+      self.enroll(self.make_user(f'student{index}'), self.course, rating=index + 3)
+    self.enroll(self.make_user('outsider'), self.other)
+
+  def enroll(self, student, course, rating=None):
+    enrollment = Enrollment.objects.create(student=student, course=course)
+    Enrollment.objects.filter(pk=enrollment.pk).update(enrolled_at=self.yesterday)
+    if rating:
+      review = CourseReview.objects.create(student=student, course=course, rating=rating)
+      CourseReview.objects.filter(pk=review.pk).update(created_at=self.yesterday)
+
+  def test_analytics_read_from_rollups(self):
+    call_command('aggregate_course_stats', stdout=StringIO())
+    self.client.force_authenticate(self.instructor)
+    with self.assertNumQueries(3):
+      response = self.client.get(self.url, {'days': 7})
+    self.assertEqual(response.status_code, 200)
+    [course] = response.data['courses']
+    self.assertEqual(course['id'], self.course.pk)
+    self.assertEqual(course['enrollments'], 3)
+    self.assertEqual(course['revenue'], Decimal('60.00'))
+    self.assertEqual(course['rating_distribution'], {'1': 0, '2': 0, '3': 1, '4': 1, '5': 1})
+    self.assertEqual(course['average_rating'], 4.0)
+    self.assertEqual(response.data['daily'][0]['date'], timezone.localdate(self.yesterday))
+
+  def test_aggregation_is_incremental(self):
+    call_command('aggregate_course_stats', stdout=StringIO())
+    call_command('aggregate_course_stats', stdout=StringIO())
+    stats = CourseDailyStats.objects.get(course=self.course)
+    self.assertEqual(stats.enrollments, 3)
+
+    Enrollment.objects.create(student=self.make_user('latecomer'), course=self.course)
+    out = StringIO()
+    call_command('aggregate_course_stats', stdout=out)
+    self.assertIn('0 enrollments', out.getvalue())
+    with override_settings(ANALYTICS_ROLLUP_LAG=0):
+      call_command('aggregate_course_stats', stdout=out)
+    self.assertIn('1 enrollments', out.getvalue())
+    self.assertEqual(CourseDailyStats.objects.filter(course=self.course).aggregate(total=Sum('enrollments'))['total'], 4)
+
+    with override_settings(ANALYTICS_ROLLUP_LAG=0):
+      call_command('aggregate_course_stats', rebuild=True, stdout=StringIO())
+    self.assertEqual(CourseDailyStats.objects.filter(course=self.course).aggregate(total=Sum('enrollments'))['total'], 4)
+
+  def test_completion_rate_follows_enrollment_cohorts(self):
+    old = Enrollment.objects.create(student=self.make_user('veteran'), course=self.course)
+    Enrollment.objects.filter(pk=old.pk).update(enrolled_at=self.yesterday - timedelta(days=30))
+    # Completions in the range, of one recent and one old enrollment.
+    recent = Enrollment.objects.get(course=self.course, student__username='student0')
+    Enrollment.objects.filter(pk__in=[old.pk, recent.pk]).update(completed_at=self.yesterday + timedelta(hours=1))
+    call_command('aggregate_course_stats', stdout=StringIO())
+    self.client.force_authenticate(self.instructor)
+    [course] = self.client.get(self.url, {'days': 7}).data['courses']
+    self.assertEqual((course['enrollments'], course['completions']), (3, 2))
+    self.assertEqual(course['completion_rate'], round(1 / 3, 4))
+
+  def test_review_edits_reach_the_rollups(self):
+    call_command('aggregate_course_stats', stdout=StringIO())
+    review = CourseReview.objects.get(course=self.course, rating=3)
+    review.rating = 1
+    review.save()
+    CourseReview.objects.get(course=self.course, rating=5).delete()
+    self.client.force_authenticate(self.instructor)
+    [course] = self.client.get(self.url, {'days': 7}).data['courses']
+    self.assertEqual(course['rating_distribution'], {'1': 1, '2': 0, '3': 0, '4': 1, '5': 0})
+    self.assertEqual(course['average_rating'], 2.5)
+
+  def test_moved_reviews_are_recounted_on_both_courses(self):
+    call_command('aggregate_course_stats', stdout=StringIO())
+    review = CourseReview.objects.get(course=self.course, rating=5)
+    review.course = self.other
+    review.save()
+    self.assertEqual(CourseDailyStats.objects.get(course=self.course).rating_5, 0)
+    self.assertEqual(CourseDailyStats.objects.get(course=self.other).rating_5, 1)
+
+  def test_students_cannot_see_analytics(self):
+    self.client.force_authenticate(self.make_user('student'))
+    self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ReviewSummaryTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.reviews = [
+      CourseReview.objects.create(student=self.make_user(f'student{i}'), course=self.course, rating=i % 5 + 1)
+      for i in range(12)
+    ]
+
+  def summary(self):
+    return CourseReviewSummary.objects.get(course=self.course)
+
+  def test_summary_follows_review_writes(self):
+    summary = self.summary()
+    self.assertEqual(summary.histogram, {'1': 3, '2': 3, '3': 2, '4': 2, '5': 2})
+    self.assertEqual(summary.latest_review_ids, [review.pk for review in reversed(self.reviews[2:])])
+
+    newest = self.reviews[-1]
+    newest.rating = 1
+    newest.save()
+    newest.delete()
+    summary = self.summary()
+    self.assertEqual(summary.review_count, 11)
+    self.assertEqual(summary.histogram['2'], 2)
+    self.assertEqual(summary.latest_review_ids, [review.pk for review in reversed(self.reviews[1:11])])
+
+    stored = summary.histogram, summary.latest_review_ids
+    CourseReviewSummary.rebuild()
+    self.assertEqual((self.summary().histogram, self.summary().latest_review_ids), stored)
+
+  def test_detail_renders_latest_reviews_from_summary(self):
+    # Course with its summary, lessons, latest reviews.
+    with self.assertNumQueries(3):
+      response = self.client.get(f'/api/v1/courses/{self.course.pk}/')
+    self.assertEqual(response.data['review_summary']['review_count'], 12)
+    self.assertEqual([review['id'] for review in response.data['reviews']], self.summary().latest_review_ids)
+
+  def test_course_without_reviews(self):
+    course = self.make_course(self.instructor, 'Django', lessons=0)
+    response = self.client.get(f'/api/v1/courses/{course.pk}/')
+    self.assertEqual(response.data['reviews'], [])
+    self.assertEqual(response.data['review_summary']['review_count'], 0)
+
+  def test_reviews_endpoint_is_paginated(self):
+    url = f'/api/v1/courses/{self.course.pk}/reviews/'
+    response = self.client.get(url)
+    self.assertEqual(response.data['count'], 12)
+    self.assertEqual(response.data['results'][0]['id'], self.reviews[-1].pk)
+    response = self.client.get(url, {'pagination': 'cursor'})
+    self.assertEqual(len(response.data['results']), 10)
+    self.assertIsNotNone(response.data['next'])
+    self.assertEqual(self.client.get('/api/v1/courses/999999/reviews/').status_code, 404)
+
+
+class NestedUserTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.instructor.phone_number = '+15555550100'
+    self.instructor.profile_picture = 'profile_pics/teacher.png'
+    self.instructor.save()
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    CourseReview.objects.create(student=self.make_user('student'), course=self.course, rating=5)
+
+  def test_public_payloads_use_the_compact_user(self):
+    detail = self.client.get(f'/api/v1/courses/{self.course.pk}/').data
+    listed = self.client.get('/api/v1/courses/').data['results'][0]
+    for user in (detail['instructor'], listed['instructor'], detail['reviews'][0]['student']):
+      self.assertEqual(
+        set(user), {
+          'id', 'username', 'first_name', 'last_name', 'role', 'role_display',
+          'profile_picture_url', 'profile_picture_srcset',
+        }
+      )
+    self.assertTrue(detail['instructor']['profile_picture_url'].startswith('http://testserver/'))
+
+  def test_user_columns_are_not_loaded(self):
+    with CaptureQueriesContext(connection) as ctx:
+      self.client.get(f'/api/v1/courses/{self.course.pk}/')
+    sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+    self.assertIn('"users_user"."username"', sql)
+    for column in ('email', 'phone_number', 'password', 'bio'):
+      self.assertNotIn(f'"users_user"."{column}"', sql)
+
+  def test_serializes_without_request_context(self):
+    data = UserSummarySerializer(self.instructor).data
+    self.assertEqual(data['profile_picture_url'], f'{settings.MEDIA_URL}profile_pics/teacher.png')
+
+
+class LessonOutlineTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(self.instructor, 'Python')
+    self.client.force_authenticate(self.instructor)
+
+  def captured_sql(self, url):
+    with CaptureQueriesContext(connection) as ctx:
+      response = self.client.get(url)
+    return response, ' '.join(query['sql'] for query in ctx.captured_queries)
+
+  def test_course_pages_carry_lesson_outlines_only(self):
+    for url in ('/api/v1/courses/?expand=lessons', f'/api/v1/courses/{self.course.pk}/'):
+      response, sql = self.captured_sql(url)
+      data = response.data['results'][0] if 'results' in response.data else response.data
+      self.assertEqual(
+        set(data['lessons'][0]), {'id', 'order', 'title', 'content_type', 'duration_minutes', 'is_free'}
+      )
+      self.assertNotIn('"courses_lesson"."content"', sql)
+    _, sql = self.captured_sql('/api/v1/courses/')
+    self.assertNotIn('"courses_course"."full_description"', sql)
+
+  def test_lesson_detail_has_the_body(self):
+    lesson = self.course.lessons.first()
+    response, sql = self.captured_sql('/api/v1/lessons/')
+    self.assertNotIn('content', response.data['results'][0])
+    self.assertNotIn('"courses_lesson"."content"', sql)
+    response = self.client.get(f'/api/v1/lessons/{lesson.pk}/')
+    self.assertEqual(response.data['content'], 'Lesson body')
+    self.assertEqual(len(response.data['resources']), 1)
+    self.assertTrue(response.data['resources'][0]['download_url'].endswith(
+      f'/lesson-resources/{lesson.resources.get().pk}/download/'
+    ))
+
+  def test_admin_changelists_defer_large_columns(self):
+    admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+    self.client.force_login(admin)
+    response, sql = self.captured_sql('/admin/courses/lesson/')
+    self.assertEqual(response.status_code, 200)
+    self.assertNotIn('"courses_lesson"."content"', sql)
+    response, sql = self.captured_sql(f'/admin/courses/course/{self.course.pk}/change/')
+    self.assertEqual(response.status_code, 200)
+    self.assertNotIn('"courses_lesson"."content"', sql)
+
+  def test_payload_benchmark(self):
+    out = StringIO()
+    call_command('benchmark_payloads', courses=2, lessons=3, content_kb=1, stdout=out)
+    self.assertIn('outline', out.getvalue())
+    self.assertEqual(Course.objects.count(), 1)
+
+
+class LessonContentAccessTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.course = self.make_course(self.instructor, 'Python', lessons=0)
+    self.lessons = Lesson.objects.bulk_create([
+      Lesson(course=self.course, title=f'Lesson {order}', order=order, content_type='article',
+             content=f'Body {order}', is_free=order == 1)
+      for order in range(1, 201)
+    ])
+    self.free, self.paid = self.lessons[0], self.lessons[1]
+
+  def content(self, lesson):
+    return self.client.get(f'/api/v1/lessons/{lesson.pk}/content/')
+
+  def test_free_lessons_are_public(self):
+    self.assertEqual(self.content(self.free).data['content'], 'Body 1')
+    self.assertEqual(self.content(self.paid).status_code, 401)
+
+  def test_enrollment_unlocks_and_unenrolling_locks_again(self):
+    self.client.force_authenticate(self.student)
+    self.assertEqual(self.content(self.paid).status_code, 403)
+    enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+    self.assertEqual(self.content(self.paid).data['content'], 'Body 2')
+    enrollment.delete()
+    self.assertEqual(self.content(self.paid).status_code, 403)
+    self.course.students.add(self.student)
+    self.assertEqual(self.content(self.paid).status_code, 200)
+    self.course.students.clear()
+    self.assertEqual(self.content(self.paid).status_code, 403)
+
+  def test_instructor_reads_own_lessons(self):
+    self.client.force_authenticate(self.instructor)
+    self.assertEqual(self.content(self.paid).status_code, 200)
+
+  def test_checking_many_lessons_costs_one_lookup(self):
+    Enrollment.objects.create(student=self.student, course=self.course)
+    self.client.force_authenticate(self.student)
+    self.client.get(f'/api/v1/lessons/content/?course={self.course.pk}')
+    # Lessons and their resources; enrolled courses come from the cache.
+    with self.assertNumQueries(2):
+      response = self.client.get(f'/api/v1/lessons/content/?course={self.course.pk}')
+    self.assertEqual(len(response.data['results']), 200)
+    self.assertEqual(response.data['locked'], [])
+
+  def test_bulk_content_lists_locked_lessons(self):
+    ids = ','.join(str(lesson.pk) for lesson in self.lessons[:3])
+    response = self.client.get(f'/api/v1/lessons/content/?ids={ids}')
+    self.assertEqual([lesson['id'] for lesson in response.data['results']], [self.free.pk])
+    self.assertEqual(response.data['locked'], [lesson.pk for lesson in self.lessons[1:3]])
+    self.assertEqual(self.client.get('/api/v1/lessons/content/').status_code, 400)
+
+
+@override_settings(MEDIA_ROOT='/tmp/courses-test-media')
+class ResourceDownloadTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.course = self.make_course(self.instructor, 'Python', lessons=1)
+    self.payload = bytes(range(256)) * 40
+    self.resource = LessonResource.objects.create(
+      lesson=self.course.lessons.get(), name='Slides',
+      file=SimpleUploadedFile('slides.pdf', self.payload, content_type='application/pdf')
+    )
+    self.addCleanup(self.resource.file.delete, save=False)
+    self.url = f'/api/v1/lesson-resources/{self.resource.pk}/download/'
+    Enrollment.objects.create(student=self.student, course=self.course)
+    self.client.force_authenticate(self.student)
+
+  def test_full_download_streams_the_file(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.streaming)
+    self.assertEqual(b''.join(response.streaming_content), self.payload)
+    self.assertEqual(response['Accept-Ranges'], 'bytes')
+    self.assertIn('attachment', response['Content-Disposition'])
+
+  def test_range_requests(self):
+    response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+    self.assertEqual(response.status_code, 206)
+    self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.payload)}')
+    self.assertEqual(b''.join(response.streaming_content), self.payload[100:200])
+
+    response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+    self.assertEqual(b''.join(response.streaming_content), self.payload[-10:])
+
+    response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.payload)}-')
+    self.assertEqual(response.status_code, 416)
+    self.assertEqual(response['Content-Range'], f'bytes */{len(self.payload)}')
+
+  def test_if_range(self):
+    etag = self.client.get(self.url)['ETag']
+    response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+    self.assertEqual(response.status_code, 206)
+    response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(b''.join(response.streaming_content), self.payload)
+
+  def test_requires_enrollment(self):
+    self.client.force_authenticate(self.make_user('outsider'))
+    self.assertEqual(self.client.get(self.url).status_code, 403)
+    self.client.force_authenticate(None)
+    self.assertEqual(self.client.get(self.url).status_code, 401)
+
+  def test_resources_are_listed_to_their_instructor_only(self):
+    other = self.make_user('other-teacher', User.Role.INSTRUCTOR)
+    self.make_course(other, 'Rust', lessons=1)
+    self.assertEqual(self.client.get('/api/v1/lesson-resources/').data['count'], 0)
+    self.assertEqual(self.client.get(f'/api/v1/lesson-resources/{self.resource.pk}/').status_code, 404)
+
+    self.client.force_authenticate(self.instructor)
+    response = self.client.get('/api/v1/lesson-resources/')
+    self.assertEqual(
+      {resource['id'] for resource in response.data['results']},
+      set(LessonResource.objects.filter(lesson__course=self.course).values_list('pk', flat=True))
+    )
+    data = self.client.get(f'/api/v1/lesson-resources/{self.resource.pk}/').data
+    self.assertNotIn('file', data)
+    self.assertTrue(data['download_url'].endswith(self.url))
+
+  @override_settings(FILE_DELIVERY='x-accel-redirect', PROTECTED_MEDIA_URL='/protected/')
+  def test_proxy_handoff(self):
+    response = self.client.get(self.url)
+    self.assertEqual(response['X-Accel-Redirect'], f'/protected/{self.resource.file.name}')
+    self.assertEqual(response.content, b'')
+
+
+@override_settings(MEDIA_ROOT='/tmp/courses-test-images', IMAGE_DERIVATIVES_ASYNC=False)
+class ImageDerivativeTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.addCleanup(shutil.rmtree, '/tmp/courses-test-images', ignore_errors=True)
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+
+  def image(self, name, width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+  def test_thumbnail_derivatives(self):
+    course = self.make_course(self.instructor, 'Python', thumbnail=self.image('cover.png', 1200, 600))
+    course.refresh_from_db()
+    derivatives = course.thumbnail_derivatives
+    self.assertEqual(derivatives['source'], course.thumbnail.name)
+    self.assertEqual(sorted(derivatives['widths'], key=int), ['160', '480', '960'])
+    names = derivatives['widths']['480']
+    self.assertTrue(names['webp'].endswith('-480.webp'))
+    self.assertTrue(names['jpeg'].endswith('-480.jpg'))
+    with course.thumbnail.storage.open(names['jpeg']) as file:
+      self.assertEqual(Image.open(file).size, (480, 240))
+
+    # Same bytes, same derivative names: the files are shared, not rewritten.
+    other = self.make_course(self.instructor, 'Django', thumbnail=self.image('copy.png', 1200, 600))
+    other.refresh_from_db()
+    self.assertEqual(other.thumbnail_derivatives['widths'], derivatives['widths'])
+
+  def test_small_images_are_not_upscaled(self):
+    course = self.make_course(self.instructor, 'Python', thumbnail=self.image('small.png', 300, 200))
+    course.refresh_from_db()
+    self.assertEqual(list(course.thumbnail_derivatives['widths']), ['160'])
+
+    course.thumbnail = None
+    course.save()
+    course.refresh_from_db()
+    self.assertEqual(course.thumbnail_derivatives, {})
+
+  def test_srcset_in_payloads(self):
+    self.instructor.profile_picture = self.image('me.png', 500, 500)
+    self.instructor.save()
+    self.make_course(self.instructor, 'Python', thumbnail=self.image('cover.png', 1000, 500))
+
+    data = self.client.get('/api/v1/courses/').data['results'][0]
+    self.assertEqual(data['thumbnail_srcset']['webp'].count('w,'), 2)
+    self.assertIn('960w', data['thumbnail_srcset']['jpeg'])
+    self.assertIn('480w', data['instructor']['profile_picture_srcset']['webp'])
+
+
+@override_settings(MEDIA_ROOT='/tmp/courses-test-cas', IMAGE_DERIVATIVES_ASYNC=False, MEDIA_CLEANUP_MIN_AGE=0)
+class MediaStorageTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.addCleanup(shutil.rmtree, '/tmp/courses-test-cas', ignore_errors=True)
+    instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.course = self.make_course(instructor, 'Python', lessons=2)
+    self.lessons = list(self.course.lessons.all())
+
+  def resource(self, lesson, content=b'slides'):
+    return LessonResource.objects.create(
+      lesson=lesson, name='Slides', file=SimpleUploadedFile('slides.pdf', content)
+    )
+
+  def test_identical_uploads_share_a_file(self):
+    first = self.resource(self.lessons[0])
+    second = self.resource(self.lessons[1])
+    other = self.resource(self.lessons[1], b'other slides')
+    self.assertEqual(first.file.name, second.file.name)
+    self.assertNotEqual(first.file.name, other.file.name)
+    self.assertRegex(first.file.name, r'^lesson_resources/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+
+  def test_files_are_deleted_once_unreferenced(self):
+    first = self.resource(self.lessons[0])
+    second = self.resource(self.lessons[1])
+    storage, name = first.file.storage, first.file.name
+    with self.captureOnCommitCallbacks(execute=True):
+      first.delete()
+    self.assertTrue(storage.exists(name))
+    with self.captureOnCommitCallbacks(execute=True):
+      LessonResource.objects.get(pk=second.pk).delete()
+    self.assertFalse(storage.exists(name))
+
+  @override_settings(MEDIA_CLEANUP_MIN_AGE=3600)
+  def test_recently_reused_files_are_left_for_cleanup(self):
+    # Another transaction may have reused the name without committing yet.
+    resource = self.resource(self.lessons[0])
+    storage, name = resource.file.storage, resource.file.name
+    with self.captureOnCommitCallbacks(execute=True):
+      resource.delete()
+    self.assertTrue(storage.exists(name))
+    call_command('cleanup_media', '--state=/tmp/courses-test-cas/.cleanup', stdout=StringIO())
+    self.assertTrue(storage.exists(name))
+
+  def test_only_loaded_rows_remember_their_files(self):
+    self.assertFalse(hasattr(LessonResource(lesson=self.lessons[0], file='a.pdf'), '_loaded_files'))
+    resource = LessonResource.objects.get(pk=self.resource(self.lessons[0]).pk)
+    self.assertEqual(resource._loaded_files, {'file': resource.file.name})
+    self.assertEqual(LessonResource.objects.only('name').get(pk=resource.pk)._loaded_files, {})
+    # Without TrackedFilesMixin a replaced file would never be released.
+    with self.assertRaises(TypeError):
+      track_files(Lesson)
+
+  def image(self, name, color):
+    buffer = BytesIO()
+    Image.new('RGB', (40, 20), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+  def test_replaced_thumbnail_is_released(self):
+    self.course.thumbnail = self.image('old.png', 'red')
+    self.course.save()
+    course = Course.objects.get(pk=self.course.pk)
+    old = course.thumbnail.name
+    with self.captureOnCommitCallbacks(execute=True):
+      course.thumbnail = self.image('new.png', 'blue')
+      course.save()
+    self.assertFalse(course.thumbnail.storage.exists(old))
+    self.assertTrue(course.thumbnail.storage.exists(course.thumbnail.name))
+
+  def test_cleanup_media(self):
+    kept = self.resource(self.lessons[0]).file
+    storage = kept.storage
+    orphans = [storage.save(f'stray/{name}', ContentFile(name.encode())) for name in ('a.txt', 'b.txt')]
+    state = '/tmp/courses-test-cas/.cleanup'
+
+    # A saved position resumes the sweep after it.
+    with open(state, 'w') as file:
+      file.write(orphans[0])
+    out = StringIO()
+    call_command('cleanup_media', '--min-age=0', '--batch-size=1', f'--state={state}', stdout=out)
+    self.assertIn(f'Resuming after {orphans[0]}', out.getvalue())
+    self.assertTrue(storage.exists(orphans[0]))
+    self.assertFalse(storage.exists(orphans[1]))
+    self.assertTrue(storage.exists(kept.name))
+
+    call_command('cleanup_media', '--min-age=0', f'--state={state}', stdout=StringIO())
+    self.assertFalse(storage.exists(orphans[0]))
+    self.assertTrue(storage.exists(kept.name))
+    self.assertFalse(os.path.exists(state))
+
+    # Derivatives are kept while a derivative map points at them.
+    self.course.thumbnail = self.image('cover.png', 'red')
+    self.course.save()
+    self.course.refresh_from_db()
+    derivative = self.course.thumbnail_derivatives['widths']['40']['webp']
+    stray = storage.save('derivatives/00/000000-160.webp', ContentFile(b'stale'))
+    call_command('cleanup_media', '--min-age=0', f'--state={state}', stdout=StringIO())
+    self.assertTrue(storage.exists(derivative))
+    self.assertTrue(storage.exists(self.course.thumbnail.name))
+    self.assertFalse(storage.exists(stray))
+
+    call_command('cleanup_media', '--min-age=3600', f'--state={state}', stdout=StringIO())
+    self.assertTrue(storage.exists(kept.name))
+
+
+@override_settings(
+  MEDIA_ROOT='/tmp/courses-test-uploads', UPLOAD_TEMP_DIR='/tmp/courses-test-uploads/.partial',
+  UPLOAD_CHUNK_MAX_SIZE=1000
+)
+class ChunkedUploadTests(CatalogTestMixin, TestCase):
+  url = '/api/v1/lesson-resource-uploads/'
+
+  def setUp(self):
+    super().setUp()
+    self.addCleanup(shutil.rmtree, '/tmp/courses-test-uploads', ignore_errors=True)
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.lesson = self.make_course(self.instructor, 'Python', lessons=1).lessons.get()
+    self.payload = bytes(range(250)) * 10
+    self.client.force_authenticate(self.instructor)
+
+  def start(self, **data):
+    return self.client.post(self.url, {
+      'lesson': self.lesson.pk, 'name': 'Slides', 'filename': 'slides.zip', 'size': len(self.payload), **data
+    }, format='json')
+
+  def put(self, session, start, end):
+    return self.client.put(
+      f'{self.url}{session}/', self.payload[start:end + 1], content_type='application/octet-stream',
+      HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.payload)}'
+    )
+
+  def test_chunked_upload(self):
+    response = self.start()
+    self.assertEqual(response.status_code, 201)
+    session = response.data['id']
+    self.assertEqual(response.data['offset'], 0)
+
+    self.assertEqual(self.put(session, 0, 999).data['offset'], 1000)
+    self.assertEqual(self.put(session, 1000, 1999).data['offset'], 2000)
+    # After a reconnect the client asks where to carry on; resending is harmless.
+    self.assertEqual(self.client.get(f'{self.url}{session}/').data['offset'], 2000)
+    self.assertEqual(self.put(session, 1500, 2499).data['offset'], 2500)
+
+    response = self.client.post(f'{self.url}{session}/finalize/')
+    self.assertEqual(response.status_code, 201)
+    resource = LessonResource.objects.get(pk=response.data['resource']['id'])
+    self.assertEqual((resource.lesson, resource.name), (self.lesson, 'Slides'))
+    self.assertRegex(resource.file.name, r'^lesson_resources/[0-9a-f]{2}/[0-9a-f]{64}\.zip$')
+    with resource.file.open('rb') as file:
+      self.assertEqual(file.read(), self.payload)
+    self.assertFalse(os.path.exists(UploadSession.objects.get(pk=session).part_path))
+
+    response = self.client.post(f'{self.url}{session}/finalize/')
+    self.assertEqual((response.status_code, response.data['resource']['id']), (200, resource.pk))
+    self.assertEqual(self.put(session, 0, 999).status_code, 409)
+
+  def test_files_are_checked_before_upload(self):
+    self.assertIn('filename', self.start(filename='setup.exe').data)
+    with override_settings(LESSON_RESOURCE_MAX_SIZE=100):
+      self.assertIn('size', self.start().data)
+    self.assertEqual(self.start(size=0).status_code, 400)
+    self.client.force_authenticate(self.make_user('student'))
+    self.assertEqual(self.start().status_code, 403)
+    self.assertFalse(UploadSession.objects.exists())
+
+  def test_chunk_rules(self):
+    session = self.start().data['id']
+    response = self.put(session, 1000, 1999)
+    self.assertEqual((response.status_code, response.data['offset']), (409, 0))
+    self.assertEqual(self.put(session, 0, 1000).status_code, 413)
+    self.assertEqual(self.client.put(f'{self.url}{session}/', b'abc', content_type='text/plain').status_code, 400)
+    response = self.client.put(
+      f'{self.url}{session}/', self.payload[:1000], content_type='application/octet-stream',
+      HTTP_CONTENT_RANGE=f'bytes 0-999/{len(self.payload)}', CONTENT_LENGTH='1000 bytes'
+    )
+    self.assertEqual(response.status_code, 400)
+    self.put(session, 0, 999)
+    self.assertEqual(self.client.post(f'{self.url}{session}/finalize/').status_code, 409)
+
+    self.client.force_authenticate(self.make_user('other', User.Role.INSTRUCTOR))
+    self.assertEqual(self.put(session, 1000, 1999).status_code, 404)
+
+  def test_idle_sessions_expire(self):
+    session = UploadSession.objects.get(pk=self.start().data['id'])
+    self.put(session.pk, 0, 999)
+    UploadSession.objects.filter(pk=session.pk).update(updated_at=timezone.now() - timedelta(days=2))
+    call_command('cleanup_media', '--min-age=0', '--state=/tmp/courses-test-uploads/.cleanup', stdout=StringIO())
+    self.assertFalse(UploadSession.objects.exists())
+    self.assertFalse(os.path.exists(session.part_path))
+
+
+class AsyncReadViewTests(CatalogTestMixin, TestCase):
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    cls.enterClassContext(async_read_views())
+
+  def setUp(self):
+    super().setUp()
+    self.instructor = self.make_user('teacher', User.Role.INSTRUCTOR)
+    self.student = self.make_user('student')
+    self.category = CourseCategory.objects.create(name='Programming')
+    self.course = self.make_course(self.instructor, 'Python', category=self.category)
+    CourseReview.objects.create(student=self.student, course=self.course, rating=4)
+    self.urls = [
+      '/api/v1/courses/',
+      '/api/v1/courses/?facets=true&expand=lessons',
+      f'/api/v1/courses/{self.course.pk}/',
+      '/api/v1/course-categories/',
+      f'/api/v1/course-categories/{self.category.pk}/',
+      '/api/v1/profiles/',
+      '/api/v1/profiles/teacher/',
+    ]
+
+  def bearer_header(self, user):
+    return {'Authorization': f'Bearer {TokenObtainPairSerializer.get_token(user).access_token}'}
+
+  def bearer(self, user):
+    return {f'HTTP_{name.upper()}': value for name, value in self.bearer_header(user).items()}
+
+  def test_only_catalog_reads_are_async(self):
+    self.assertTrue(iscoroutinefunction(resolve('/api/v1/courses/').func))
+    self.assertTrue(iscoroutinefunction(resolve('/api/v1/profiles/teacher/').func))
+    self.assertFalse(iscoroutinefunction(resolve('/api/v1/courses/search/').func))
+    self.assertFalse(iscoroutinefunction(resolve('/api/v1/lessons/').func))
+    with async_read_views(False):
+      self.assertFalse(iscoroutinefunction(resolve('/api/v1/courses/').func))
+
+  def test_async_and_sync_paths_return_the_same_payloads(self):
+    for url in self.urls:
+      cache.clear()
+      response = self.client.get(url, **self.bearer(self.student))
+      cache.clear()
+      with override_settings(ASYNC_READ_VIEWS=False):
+        expected = self.client.get(url, **self.bearer(self.student))
+      self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.json()), url)
+      # Each cache fill gets its own ETag, so only compare that both have one.
+      self.assertEqual('ETag' in response, 'ETag' in expected, url)
+    self.assertEqual(response.json()['username'], 'teacher')
+
+  async def test_reads_run_on_the_event_loop(self):
+    response = await self.async_client.get(f'/api/v1/courses/{self.course.pk}/', headers=self.bearer_header(self.student))
+    self.assertEqual(response.status_code, 200)
+    self.assertIs(response.json()['enrollment_status'], False)
+    self.assertEqual([review['rating'] for review in response.json()['reviews']], [4])
+    await Enrollment.objects.acreate(student=self.student, course=self.course)
+    response = await self.async_client.get(f'/api/v1/courses/{self.course.pk}/', headers=self.bearer_header(self.student))
+    self.assertEqual(response['X-Cache'], 'HIT')
+    self.assertIs(response.json()['enrollment_status'], True)
+    response = await self.async_client.get('/api/v1/courses/', {'page': 2})
+    self.assertEqual(response.status_code, 404)
+    response = await self.async_client.get('/api/v1/profiles/nobody/')
+    self.assertEqual(response.status_code, 404)
+
+  def test_token_checks(self):
+    Enrollment.objects.create(student=self.student, course=self.course)
+    response = self.client.get('/api/v1/courses/', **self.bearer(self.student))
+    self.assertTrue(response.data['results'][0]['enrollment_status'])
+    self.assertEqual(self.client.get('/api/v1/courses/', HTTP_AUTHORIZATION='Bearer nonsense').status_code, 401)
+    self.student.is_active = False
+    self.student.save()
+    self.assertEqual(self.client.get('/api/v1/courses/', **self.bearer(self.student)).status_code, 401)
+
+  def test_writes_fall_back_to_sync_views(self):
+    admin = self.make_user('admin')
+    admin.is_staff = True
+    admin.save()
+    response = self.client.post('/api/v1/course-categories/', {'name': 'Design'}, **self.bearer(admin))
+    self.assertEqual(response.status_code, 201)
+    response = self.client.patch(
+      f'/api/v1/courses/{self.course.pk}/', {'title': 'Python 3'}, format='json', **self.bearer(self.instructor)
+    )
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(self.client.get(f'/api/v1/courses/{self.course.pk}/').data['title'], 'Python 3')
+    self.assertEqual(self.client.delete(f'/api/v1/courses/{self.course.pk}/').status_code, 401)
+
+
+class ClaimsAuthenticationTests(CatalogTestMixin, TestCase):
+  def setUp(self):
+    super().setUp()
+    self.user = self.make_user('teacher', User.Role.INSTRUCTOR)
+
+  def obtain(self):
+    response = self.client.post('/api/v1/auth/jwt/create/', {'username': 'teacher', 'password': 'pass12345'})
+    return response.data
+
+  def authenticate(self, token):
+    request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    return JWTAuthentication().authenticate(request)[0]
+
+  def test_tokens_carry_role_claims(self):
+    access = AccessToken(self.obtain()['access'])
+    self.assertEqual((access['role'], access['is_staff']), ('instructor', False))
+
+  def test_user_is_built_from_claims(self):
+    token = self.obtain()['access']
+    # Only the cached active/password check; then nothing at all.
+    with self.assertNumQueries(1):
+      user = self.authenticate(token)
+    with self.assertNumQueries(0):
+      user = self.authenticate(token)
+      self.assertEqual((user.pk, user.role, user.is_staff, user.is_instructor), (self.user.pk, 'instructor', False, True))
+    with self.assertNumQueries(1):
+      self.assertEqual((user.username, user.email, user.bio), ('teacher', 'teacher@example.com', ''))
+
+    response = self.client.get('/api/v1/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    self.assertEqual(response.data['email'], 'teacher@example.com')
+    self.assertEqual(self.authenticate(AccessToken.for_user(self.user)).email, 'teacher@example.com')
+
+  def test_account_changes_apply_at_once(self):
+    token = self.obtain()['access']
+    self.authenticate(token)
+    self.user.is_active = False
+    self.user.save()
+    response = self.client.get('/api/v1/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    self.assertEqual(response.status_code, 401)
+    self.user.delete()
+    response = self.client.get('/api/v1/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    self.assertEqual(response.status_code, 401)
+
+  def test_refresh_reads_the_current_role(self):
+    refresh = self.obtain()['refresh']
+    self.user.role = User.Role.STUDENT
+    self.user.is_staff = True
+    self.user.save()
+    # Rotation needs the token_blacklist app, which is not installed.
+    with mock.patch.object(jwt_serializers.api_settings, 'ROTATE_REFRESH_TOKENS', False):
+      response = self.client.post('/api/v1/auth/jwt/refresh/', {'refresh': refresh})
+    access = AccessToken(response.data['access'])
+    self.assertEqual((access['role'], access['is_staff']), ('student', True))
+    self.assertTrue(self.authenticate(response.data['access']).is_staff)
 
-# Create your tests here.
@@ -0,0 +1,134 @@
+import os
+import re
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils import timezone
+
+from .models import LessonResource, UploadSession
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+READ_SIZE = 64 * 1024
+
+
+def validate_resource_filename(filename):
+  """Run the validators of LessonResource.file against a name, before any byte is sent."""
+  field = LessonResource._meta.get_field('file')
+  for validator in field.validators:
+    validator(File(None, name=filename))
+
+
+def validate_resource_size(size):
+  if size > settings.LESSON_RESOURCE_MAX_SIZE:
+    raise ValidationError(f'Files can be at most {settings.LESSON_RESOURCE_MAX_SIZE} bytes.')
+
+
+def parse_content_range(header):
+  """(start, end, total) from ``bytes start-end/total``, or None."""
+  match = CONTENT_RANGE_RE.match((header or '').strip())
+  if not match:
+    return None
+  start, end, total = (int(value) for value in match.groups())
+  if start > end:
+    return None
+  return start, end, total
+
+
+def start_session(owner, lesson, name, filename, size):
+  session = UploadSession.objects.create(owner=owner, lesson=lesson, name=name, filename=filename, size=size)
+  os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+  open(session.part_path, 'xb').close()
+  return session
+
+
+def receive_chunk(stream, length):
+  """
+  Read up to ``length`` bytes of ``stream`` into a temporary file, before
+  any lock is taken, so a slow client never holds the session row.
+  Whatever arrived before the client went away is kept, so it can resume
+  from ``session.received``.
+  """
+  os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+  chunk = tempfile.TemporaryFile(dir=settings.UPLOAD_TEMP_DIR)
+  received = 0
+  while received < length:
+    data = stream.read(min(READ_SIZE, length - received))
+    if not data:
+      break
+    chunk.write(data)
+    received += len(data)
+  chunk.seek(0)
+  return chunk
+
+
+def write_chunk(session, chunk, start):
+  """
+  Copy a chunk from ``receive_chunk`` to ``start`` of the session's
+  partial file. The caller holds the session row lock. Returns the
+  number of bytes written.
+  """
+  written = os.fstat(chunk.fileno()).st_size
+  with open(session.part_path, 'r+b') as part:
+    part.seek(start)
+    shutil.copyfileobj(chunk, part, READ_SIZE)
+    part.flush()
+    os.fsync(part.fileno())
+  session.received = max(session.received, start + written)
+  session.save(update_fields=['received', 'updated_at'])
+  return written
+
+
+def finalize_session(session):
+  """
+  Move the complete file into storage with a rename and create its
+  LessonResource. The caller holds the session row lock.
+  """
+  field = LessonResource._meta.get_field('file')
+  validate_resource_filename(session.filename)
+  validate_resource_size(session.size)
+  if os.path.getsize(session.part_path) != session.size:
+    raise ValidationError('The uploaded file does not match the declared size.')
+  name = field.storage.adopt(field.generate_filename(None, session.filename), session.part_path)
+  session.resource = LessonResource.objects.create(lesson=session.lesson, name=session.name, file=name)
+  session.save(update_fields=['resource', 'updated_at'])
+  return session.resource
+
+
+def discard_part(session):
+  try:
+    os.remove(session.part_path)
+  except FileNotFoundError:
+    pass
+
+
+def expire_sessions(now=None):
+  """
+  Drop sessions idle for UPLOAD_SESSION_TTL seconds along with their
+  partial files, and partial files whose session no longer exists.
+  Returns the number of sessions dropped.
+  """
+  cutoff = (now or timezone.now()) - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+  expired = list(UploadSession.objects.filter(updated_at__lt=cutoff))
+  UploadSession.objects.filter(pk__in=[session.pk for session in expired]).delete()
+  for session in expired:
+    discard_part(session)
+
+  parts = {}
+  try:
+    for entry in os.scandir(settings.UPLOAD_TEMP_DIR):
+      try:
+        parts[uuid.UUID(os.path.splitext(entry.name)[0])] = entry
+      except ValueError:
+        continue
+  except FileNotFoundError:
+    return len(expired)
+  live = set(UploadSession.objects.filter(pk__in=parts).values_list('pk', flat=True))
+  for pk, entry in parts.items():
+    if pk not in live and entry.stat().st_mtime < cutoff.timestamp():
+      os.remove(entry.path)
+  return len(expired)
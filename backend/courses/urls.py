@@ -6,8 +6,10 @@ from .views import (
     CourseViewSet,
     LessonViewSet,
     LessonResourceViewSet,
+    LessonResourceUploadViewSet,
     EnrollmentViewSet,
-    CourseReviewViewSet
+    CourseReviewViewSet,
+    InstructorAnalyticsView
 )
 
 router = DefaultRouter()
@@ -15,9 +17,11 @@ router.register(r'course-categories', CourseCategoryViewSet)
 router.register(r'courses', CourseViewSet)
 router.register(r'lessons', LessonViewSet)
 router.register(r'lesson-resources', LessonResourceViewSet)
+router.register(r'lesson-resource-uploads', LessonResourceUploadViewSet, basename='lessonresource-upload')
 router.register(r'enrollments', EnrollmentViewSet)
 router.register(r'reviews', CourseReviewViewSet)
 
 urlpatterns = [
+    path('instructors/me/analytics/', InstructorAnalyticsView.as_view(), name='instructor-analytics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
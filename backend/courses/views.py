@@ -1,38 +1,78 @@
 # views.py
-from rest_framework import viewsets, status
+import os
+from datetime import timedelta
+
+from rest_framework import mixins, viewsets, status
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
+from rest_framework.exceptions import PermissionDenied
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from .models import (
   CourseCategory,
   Course,
   Lesson,
   LessonResource,
   Enrollment,
-  CourseReview
+  CourseReview,
+  CourseReviewSummary,
+  UploadSession
 )
 from .serializers import (
   CourseCategorySerializer,
   CourseSerializer,
+  CourseListSerializer,
   CourseCreateUpdateSerializer,
   CourseDetailSerializer,
   LessonSerializer,
+  LessonOutlineSerializer,
   LessonResourceSerializer,
   EnrollmentSerializer,
   EnrollmentCreateSerializer,
-  CourseReviewSerializer
+  CourseReviewSerializer,
+  BulkEnrollmentSerializer,
+  ProgressBatchSerializer,
+  UploadSessionSerializer
 )
 from .permissions import (
   IsInstructor,
   IsCourseOwner,
   IsLessonCourseOwner,
-  IsLessonResourceCourseOwner
+  IsLessonResourceCourseOwner,
+  CanViewLessonContent,
+  can_view_lesson
+)
+from .analytics import instructor_analytics
+from .cache import (
+  CatalogCacheMixin,
+  ConditionalGetMixin,
+  aenrolled_course_ids,
+  course_payloads,
+  enrolled_course_ids,
+  overlay_enrollment_status
 )
+from .downloads import serve_file
+from .enrollments import bulk_enroll, read_identifiers, summarize
+from .filters import CourseFilterBackend, CourseOrderingBackend, FacetedListMixin, course_ordering
+from .pagination import OptionalCursorPagination
+from .progress import ingest_progress
+from .search import search_courses
+from .uploads import discard_part, finalize_session, parse_content_range, receive_chunk, start_session, write_chunk
 from users.models import User
+from users.serializers import UserSummarySerializer
+from base.async_views import AsyncReadMixin
+from base.serializers import sparse_fieldset_from_request
 
 
-class CourseCategoryViewSet(viewsets.ModelViewSet):
+class CourseCategoryViewSet(CatalogCacheMixin, AsyncReadMixin, viewsets.ModelViewSet):
   queryset = CourseCategory.objects.all()
   serializer_class = CourseCategorySerializer
 
@@ -42,32 +82,226 @@ class CourseCategoryViewSet(viewsets.ModelViewSet):
     return [IsAdminUser()]
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ConditionalGetMixin, CatalogCacheMixin, FacetedListMixin, AsyncReadMixin, viewsets.ModelViewSet):
   queryset = Course.objects.all()
+  filter_backends = [CourseFilterBackend, CourseOrderingBackend]
+  cached_actions = ('list', 'retrieve', 'search', 'reviews')
+  pagination_class = OptionalCursorPagination
+
+  @property
+  def cache_per_user(self):
+    # Cached bodies are shared and personalize() fills in enrollment_status
+    # by course id, unless the sparse fieldset leaves the ids out.
+    return self.wants_field('enrollment_status') and not self.wants_field('id')
+
+  def personalize(self, request, data):
+    return overlay_enrollment_status(data, enrolled_course_ids(request))
+
+  async def apersonalize(self, request, data):
+    return overlay_enrollment_status(data, await aenrolled_course_ids(request))
+
+  def personal_validator(self, data):
+    # The entry fixes which courses are in the body; only their status varies.
+    return [i for i, course in enumerate(course_payloads(data)) if course.get('enrollment_status')]
+
+  @property
+  def cursor_ordering(self):
+    if self.action == 'reviews':
+      return ('-created_at', '-id')
+    return course_ordering(self.request.query_params)
+
+  def get_queryset(self):
+    queryset = super().get_queryset().defer('search_vector')
+    if self.action == 'list':
+      return self.plan_list_queryset(queryset)
+    if self.action == 'retrieve':
+      return self.plan_detail_queryset(queryset)
+    return queryset
+
+  def wants_field(self, name):
+    fields, expand = sparse_fieldset_from_request(self.request)
+    if fields is not None:
+      return name in fields
+    return name in expand or name not in getattr(self.get_serializer_class().Meta, 'expandable_fields', ())
+
+  def plan_list_queryset(self, queryset):
+    # One query per relation, independent of page size, and only for
+    # the relations the client asked to see.
+    queryset = queryset.select_related('instructor', 'category').defer(
+      *UserSummarySerializer.deferred_fields('instructor')
+    )
+    if self.wants_field('lessons'):
+      queryset = queryset.prefetch_related(
+        Prefetch('lessons', queryset=Lesson.objects.only(*LessonOutlineSerializer.COLUMNS))
+      )
+    if not self.wants_field('full_description'):
+      queryset = queryset.defer('full_description')
+    if self.wants_field('enrollment_status'):
+      queryset = self.annotate_enrollment_status(queryset)
+    return queryset
+
+  def plan_detail_queryset(self, queryset):
+    queryset = queryset.select_related('instructor', 'category').defer(
+      *UserSummarySerializer.deferred_fields('instructor')
+    )
+    if self.wants_field('lessons'):
+      queryset = queryset.prefetch_related(
+        Prefetch('lessons', queryset=Lesson.objects.only(*LessonOutlineSerializer.COLUMNS))
+      )
+    if self.wants_field('reviews') or self.wants_field('review_summary'):
+      # The serializer fetches the summary's latest reviews in one query.
+      queryset = queryset.select_related('review_summary')
+    if self.wants_field('enrollment_status'):
+      queryset = self.annotate_enrollment_status(queryset)
+    return queryset
+
+  async def aprepare(self, instances):
+    # Serializers cannot query from the event loop: load the latest reviews
+    # CourseDetailSerializer would otherwise fetch itself.
+    if self.action != 'retrieve' or not self.wants_field('reviews'):
+      return
+    for course in instances:
+      try:
+        ids = course.review_summary.latest_review_ids
+      except CourseReviewSummary.DoesNotExist:
+        continue
+      if ids:
+        course.latest_reviews = await CourseDetailSerializer.review_queryset().ain_bulk(ids)
+
+  def annotate_enrollment_status(self, queryset):
+    user = self.request.user
+    if user.is_authenticated:
+      enrolled = Exists(Enrollment.objects.filter(course=OuterRef('pk'), student=user))
+    else:
+      enrolled = Value(False, output_field=BooleanField())
+    return queryset.annotate(is_enrolled=enrolled)
 
   def get_serializer_class(self):
     if self.action == 'retrieve':
       return CourseDetailSerializer
     elif self.action in ['create', 'update', 'partial_update']:
       return CourseCreateUpdateSerializer
+    elif self.action in ['list', 'search']:
+      return CourseListSerializer
+    elif self.action == 'reviews':
+      return CourseReviewSerializer
     return CourseSerializer
 
   def get_permissions(self):
     if self.action == 'create':
       return [IsAuthenticated(), IsInstructor()]
-    elif self.action in ['update', 'partial_update', 'destroy']:
+    elif self.action in ['update', 'partial_update', 'destroy', 'bulk_enroll']:
       return [IsAuthenticated(), IsCourseOwner()]
     return [AllowAny()]
 
   def perform_create(self, serializer):
     serializer.save(instructor=self.request.user)
 
+  @action(detail=True, methods=['POST'], url_path='bulk-enroll')
+  def bulk_enroll(self, request, pk=None):
+    course = self.get_object()
+    serializer = BulkEnrollmentSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    identifiers = list(serializer.validated_data.get('students', []))
+    if serializer.validated_data.get('file'):
+      identifiers += read_identifiers(serializer.validated_data['file'])
+    if len(identifiers) > settings.BULK_ENROLLMENT_MAX_ROWS:
+      return Response(
+        {'detail': f'At most {settings.BULK_ENROLLMENT_MAX_ROWS} students per request.'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+    results = bulk_enroll(course, identifiers)
+    return Response({'course': course.pk, 'summary': summarize(results), 'results': results})
+
+  @action(detail=True, methods=['GET'])
+  def reviews(self, request, pk=None):
+    return self.cached_response(self.reviews_response, request, pk=pk)
+
+  def reviews_response(self, request, pk=None):
+    course = get_object_or_404(Course.objects.only('pk'), pk=pk)
+    reviews = (
+      CourseReview.objects.filter(course=course).select_related('student')
+      .defer(*UserSummarySerializer.deferred_fields('student')).order_by(*self.cursor_ordering)
+    )
+    page = self.paginate_queryset(reviews)
+    serializer = self.get_serializer(page, many=True)
+    return self.get_paginated_response(serializer.data)
+
+  @action(detail=False, methods=['GET'])
+  def search(self, request):
+    return self.cached_response(self.search_response, request)
+
+  def search_response(self, request):
+    paginator = PageNumberPagination()
+    ranked = search_courses(request.query_params.get('q', ''))
+    page = paginator.paginate_queryset(ranked, request, view=self)
+    courses = self.plan_list_queryset(Course.objects.all()).in_bulk([pk for pk, _ in page])
+    results = [courses[pk] for pk, _ in page if pk in courses]
+    serializer = self.get_serializer(results, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
 
 class LessonViewSet(viewsets.ModelViewSet):
   queryset = Lesson.objects.all()
   serializer_class = LessonSerializer
   permission_classes = [IsAuthenticated, IsLessonCourseOwner]
 
+  def get_queryset(self):
+    # Lesson bodies are only loaded for a single lesson.
+    if self.action == 'list':
+      return super().get_queryset().only(*LessonOutlineSerializer.COLUMNS)
+    return super().get_queryset().prefetch_related('resources')
+
+  def get_serializer_class(self):
+    if self.action == 'list':
+      return LessonOutlineSerializer
+    return LessonSerializer
+
+  def get_permissions(self):
+    if self.action in ['content', 'bulk_content']:
+      return [AllowAny(), CanViewLessonContent()]
+    return super().get_permissions()
+
+  def content_queryset(self):
+    return (
+      Lesson.objects.select_related('course')
+      .only(*LessonOutlineSerializer.COLUMNS, 'content', 'created_at', 'course__instructor')
+      .prefetch_related('resources')
+    )
+
+  @action(detail=True, methods=['GET'])
+  def content(self, request, pk=None):
+    lesson = get_object_or_404(self.content_queryset(), pk=pk)
+    self.check_object_permissions(request, lesson)
+    return Response(self.get_serializer(lesson).data)
+
+  @action(detail=False, methods=['GET'], url_path='content', url_name='content-bulk')
+  def bulk_content(self, request):
+    """
+    Bodies of several lessons (``?ids=1,2,3`` or ``?course=<id>``). Access is
+    checked against the cached enrolled course ids, so it costs no query
+    per lesson; lessons the user may not read are listed under ``locked``.
+    """
+    lessons = self.content_queryset()
+    ids = [value for value in request.query_params.get('ids', '').split(',') if value]
+    course = request.query_params.get('course')
+    if ids and all(value.isdigit() for value in ids) and len(ids) <= settings.LESSON_CONTENT_MAX_IDS:
+      lessons = lessons.filter(pk__in=ids)
+    elif course and course.isdigit() and not ids:
+      lessons = lessons.filter(course_id=course)
+    else:
+      return Response(
+        {'detail': f'Pass ?course=<id> or up to {settings.LESSON_CONTENT_MAX_IDS} lesson ids as ?ids=1,2,3.'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+    readable, locked = [], []
+    for lesson in lessons:
+      (readable if can_view_lesson(request, lesson) else locked).append(lesson)
+    return Response({
+      'results': self.get_serializer(readable, many=True).data,
+      'locked': [lesson.pk for lesson in locked],
+    })
+
   def perform_create(self, serializer):
     course = serializer.validated_data['course']
     if course.instructor != self.request.user:
@@ -80,6 +314,35 @@ class LessonResourceViewSet(viewsets.ModelViewSet):
   serializer_class = LessonResourceSerializer
   permission_classes = [IsAuthenticated, IsLessonResourceCourseOwner]
 
+  def get_queryset(self):
+    queryset = super().get_queryset()
+    if self.action == 'download':
+      return queryset
+    # Managing resources is for the course's instructor; students download them.
+    return queryset.filter(lesson__course__instructor=self.request.user)
+
+  def get_permissions(self):
+    if self.action == 'download':
+      return [IsAuthenticated()]
+    return super().get_permissions()
+
+  @action(detail=True, methods=['GET'])
+  def download(self, request, pk=None):
+    resource = get_object_or_404(
+      LessonResource.objects.select_related('lesson__course').only(
+        'file', 'name', 'uploaded_at', 'lesson__is_free', 'lesson__course__instructor'
+      ),
+      pk=pk
+    )
+    if not can_view_lesson(request, resource.lesson):
+      raise PermissionDenied('Enroll in this course to download its resources.')
+    if not resource.file:
+      raise Http404
+    # Stored files are named after their hash; offer the resource's own name instead.
+    extension = os.path.splitext(resource.file.name)[1]
+    filename = resource.name if resource.name.lower().endswith(extension) else f'{resource.name}{extension}'
+    return serve_file(request, resource.file, resource.uploaded_at, filename=filename)
+
   def perform_create(self, serializer):
     lesson = serializer.validated_data['lesson']
     if lesson.course.instructor != self.request.user:
@@ -87,13 +350,114 @@ class LessonResourceViewSet(viewsets.ModelViewSet):
     serializer.save()
 
 
+class LessonResourceUploadViewSet(
+  mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+  """
+  Chunked, resumable upload of a lesson resource:
+
+  - POST with lesson, name, filename and size opens a session; the name
+    and size are checked against the resource rules straight away.
+  - PUT raw bytes with ``Content-Range: bytes start-end/size``. Chunks
+    may start anywhere up to the session's ``offset``.
+  - GET returns the ``offset`` to resume from after a reconnect.
+  - POST finalize/ once ``offset`` reaches ``size`` creates the resource.
+  - DELETE abandons the upload.
+  """
+  serializer_class = UploadSessionSerializer
+  permission_classes = [IsAuthenticated]
+
+  def get_queryset(self):
+    return UploadSession.objects.filter(owner=self.request.user).select_related('resource')
+
+  def perform_create(self, serializer):
+    lesson = serializer.validated_data['lesson']
+    if lesson.course.instructor_id != self.request.user.pk:
+      raise PermissionDenied("You are not the instructor of this course.")
+    serializer.instance = start_session(owner=self.request.user, **serializer.validated_data)
+
+  def update(self, request, pk=None):
+    content_range = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'))
+    if content_range is None:
+      return Response(
+        {'detail': 'Send the chunk with a "Content-Range: bytes start-end/size" header.'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+    start, end, total = content_range
+    length = end - start + 1
+    if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+      return Response(
+        {'detail': f'Chunks can be at most {settings.UPLOAD_CHUNK_MAX_SIZE} bytes.'},
+        status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+      )
+    try:
+      content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+      content_length = None
+    if content_length != length:
+      return Response({'detail': 'Content-Length does not match Content-Range.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    session = get_object_or_404(self.get_queryset(), pk=pk)
+    rejected = self.check_chunk(session, start, end, total)
+    if rejected:
+      return rejected
+    # The body is read straight from the request stream, never parsed, and
+    # before the row lock that serializes chunks of one session across
+    # workers: the lock is only held to check the offset and copy the chunk.
+    with receive_chunk(request.stream, length) as chunk, transaction.atomic():
+      session = get_object_or_404(self.get_queryset().select_for_update(of=('self',)), pk=pk)
+      rejected = self.check_chunk(session, start, end, total)
+      if rejected:
+        return rejected
+      write_chunk(session, chunk, start)
+    return Response(self.get_serializer(session).data)
+
+  def check_chunk(self, session, start, end, total):
+    if session.resource_id:
+      return Response({'detail': 'This upload is already finished.'}, status=status.HTTP_409_CONFLICT)
+    if total != session.size or end >= session.size:
+      return Response({'detail': f'The file is {session.size} bytes.'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > session.received:
+      return Response(
+        {'detail': 'Chunks must continue from offset.', 'offset': session.received},
+        status=status.HTTP_409_CONFLICT
+      )
+    return None
+
+  @action(detail=True, methods=['POST'])
+  def finalize(self, request, pk=None):
+    with transaction.atomic():
+      session = get_object_or_404(self.get_queryset().select_for_update(of=('self',)), pk=pk)
+      if session.resource_id:
+        return Response(self.get_serializer(session).data)
+      if session.received < session.size:
+        return Response(
+          {'detail': 'The upload is not complete.', 'offset': session.received},
+          status=status.HTTP_409_CONFLICT
+        )
+      try:
+        finalize_session(session)
+      except DjangoValidationError as error:
+        return Response({'detail': error.messages}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(self.get_serializer(session).data, status=status.HTTP_201_CREATED)
+
+  def perform_destroy(self, instance):
+    instance.delete()
+    discard_part(instance)
+
+
 class EnrollmentViewSet(viewsets.ModelViewSet):
   queryset = Enrollment.objects.none()
   serializer_class = EnrollmentSerializer
   permission_classes = [IsAuthenticated]
+  pagination_class = OptionalCursorPagination
+  cursor_ordering = ('-enrolled_at', '-id')
 
   def get_queryset(self):
-    return self.request.user.enrollments.all()
+    return (
+      self.request.user.enrollments.select_related('student')
+      .defer(*UserSummarySerializer.deferred_fields('student')).order_by(*self.cursor_ordering)
+    )
 
   def get_serializer_class(self):
     if self.action == 'create':
@@ -103,14 +467,24 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
   def perform_create(self, serializer):
     serializer.save(student=self.request.user)
 
+  @action(detail=False, methods=['POST'])
+  def progress(self, request):
+    serializer = ProgressBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return Response(ingest_progress(request.user, serializer.validated_data['events']))
+
 
 class CourseReviewViewSet(viewsets.ModelViewSet):
   queryset = CourseReview.objects.none()
   serializer_class = CourseReviewSerializer
   permission_classes = [IsAuthenticated]
+  pagination_class = OptionalCursorPagination
+  cursor_ordering = ('-created_at', '-id')
 
   def get_queryset(self):
-    return self.request.user.reviews.all()
+    return self.request.user.reviews.select_related('student').defer(
+      *UserSummarySerializer.deferred_fields('student')
+    )
 
   def create(self, request, *args, **kwargs):
     course_id = request.data.get('course')
@@ -121,4 +495,24 @@ class CourseReviewViewSet(viewsets.ModelViewSet):
     return super().create(request, *args, **kwargs)
 
   def perform_create(self, serializer):
-    serializer.save(student=self.request.user)
\ No newline at end of file
+    serializer.save(student=self.request.user)
+
+
+class InstructorAnalyticsView(APIView):
+  """Analytics for the current instructor's courses over the last ``?days=`` days."""
+  permission_classes = [IsInstructor]
+  max_days = 366
+
+  def get(self, request):
+    try:
+      days = int(request.query_params.get('days', 30))
+    except ValueError:
+      days = 0
+    if not 1 <= days <= self.max_days:
+      return Response(
+        {'days': f'Expected a whole number between 1 and {self.max_days}.'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    return Response(instructor_analytics(request.user, start, end))
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from base.authentication import forget_auth_state
+        from base.images import track_derivatives
+        from base.storage import track_files
+
+        user = self.get_model('User')
+        track_derivatives(user, 'profile_picture', 'profile_picture_derivatives')
+        track_files(user)
+        post_save.connect(forget_auth_state, sender=user, dispatch_uid='forget_auth_state_save')
+        post_delete.connect(forget_auth_state, sender=user, dispatch_uid='forget_auth_state_delete')
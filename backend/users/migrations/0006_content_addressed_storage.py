@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:58
+
+import base.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=base.storage.content_addressed_storage, upload_to='profile_pics/'),
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator, URLValidator, EmailValidator
 from django.db import models
+from base.storage import TrackedFilesMixin, content_addressed_storage
 import re  
 
 def validate_twitter_handle(value):
@@ -15,7 +16,7 @@ def validate_phone_number(value):
     )
     phone_validator(value)
 
-class User(AbstractUser):
+class User(TrackedFilesMixin, AbstractUser):
     class Role(models.TextChoices):
         STUDENT = 'student', 'Student'
         INSTRUCTOR = 'instructor', 'Instructor'
@@ -34,9 +35,12 @@ class User(AbstractUser):
 
     profile_picture = models.ImageField(
         upload_to='profile_pics/',
+        storage=content_addressed_storage,
         blank=True,
         null=True
     )
+    # Written by base.images once the resized copies exist.
+    profile_picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     date_of_birth = models.DateField(blank=True, null=True)
 
@@ -69,6 +73,13 @@ class User(AbstractUser):
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Users built from token claims (base.authentication) hold a handful
+        # of fields: the first deferred read loads all the others at once.
+        if fields is not None and self.__dict__.pop('_from_token_claims', False):
+            fields = {*fields, *self.get_deferred_fields()}
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'User'
@@ -1,9 +1,30 @@
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from base.authentication import TOKEN_CLAIMS
+from base.images import srcset
+from base.serializers import DynamicFieldsMixin
 from .models import User
 
-class UserSerializer(serializers.ModelSerializer):
+
+def profile_picture_url(user, request=None):
+    if not user.profile_picture:
+        return None
+    url = user.profile_picture.url
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def profile_picture_srcset(user, request=None):
+    if not user.profile_picture:
+        return {}
+    return srcset(user.profile_picture_derivatives, request)
+
+
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile_picture_url = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
     role_display = serializers.CharField(source='get_role_display', read_only=True)
     social_links = serializers.SerializerMethodField()
     age = serializers.SerializerMethodField()
@@ -21,6 +42,7 @@ class UserSerializer(serializers.ModelSerializer):
             'bio',
             'profile_picture',
             'profile_picture_url',
+            'profile_picture_srcset',
             'date_of_birth',
             'age',
             'phone_number',
@@ -46,9 +68,10 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
     def get_profile_picture_url(self, obj):
-        if obj.profile_picture:
-            return self.context['request'].build_absolute_uri(obj.profile_picture.url)
-        return None
+        return profile_picture_url(obj, self.context.get('request'))
+
+    def get_profile_picture_srcset(self, obj):
+        return profile_picture_srcset(obj, self.context.get('request'))
 
     def get_social_links(self, obj):
         return {
@@ -97,11 +120,51 @@ class PublicUserSerializer(UserSerializer):
             'role_display',
             'bio',
             'profile_picture_url',
+            'profile_picture_srcset',
             'social_links',
             'created_at'
         ]
 
 
+class UserSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact, public representation for users nested in other payloads
+    (course instructors, review authors). Reads only ``COLUMNS``, so
+    querysets can defer everything else with ``deferred_fields()``.
+    """
+    COLUMNS = (
+        'id', 'username', 'first_name', 'last_name', 'role',
+        'profile_picture', 'profile_picture_derivatives',
+    )
+
+    role_display = serializers.CharField(source='get_role_display', read_only=True)
+    profile_picture_url = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'first_name', 'last_name', 'role', 'role_display',
+            'profile_picture_url', 'profile_picture_srcset',
+        ]
+        read_only_fields = fields
+
+    def get_profile_picture_url(self, obj):
+        return profile_picture_url(obj, self.context.get('request'))
+
+    def get_profile_picture_srcset(self, obj):
+        return profile_picture_srcset(obj, self.context.get('request'))
+
+    @classmethod
+    def deferred_fields(cls, prefix):
+        """Lookups that defer every other user column under the ``prefix`` relation."""
+        return [
+            f'{prefix}__{field.name}'
+            for field in User._meta.concrete_fields
+            if field.name not in cls.COLUMNS
+        ]
+
+
 class PasswordSerializer(serializers.Serializer):
     new_password = serializers.CharField(
         required=True,
@@ -111,4 +174,35 @@ class PasswordSerializer(serializers.Serializer):
     )
 
     def validate_new_password(self, value):
-        return value
\ No newline at end of file
+        return value
+
+
+def add_token_claims(token, user):
+    for claim in TOKEN_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Adds ``TOKEN_CLAIMS`` so authentication can skip loading the user."""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_token_claims(super().get_token(user), user)
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    A refreshed access token copies the claims of the refresh token, which
+    lives for days: re-read them so a role change applies at the next refresh.
+    """
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'], verify=False)
+        user = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: access.get(jwt_settings.USER_ID_CLAIM)}
+        ).only(*TOKEN_CLAIMS).first()
+        if user is not None:
+            data['access'] = str(add_token_claims(access, user))
+        return data
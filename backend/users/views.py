@@ -11,6 +11,7 @@ from .serializers import (
     PasswordSerializer
 )
 from .permissions import IsSelfOrAdmin, IsAdminUser
+from base.async_views import AsyncReadMixin
 
 User = get_user_model()
 
@@ -71,7 +72,7 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class PublicProfileViewSet(viewsets.ReadOnlyModelViewSet):
+class PublicProfileViewSet(AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = PublicUserSerializer
     permission_classes = [permissions.AllowAny]
     queryset = User.objects.all()